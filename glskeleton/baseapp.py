@@ -34,6 +34,8 @@ class BaseApplication(QApplication):
         self.format.setSamples(samples)
         self.format.setVersion(major, minor)
         self.format.setProfile(QSurfaceFormat.CoreProfile)
+        # swap once per display refresh, continuous widgets of the RenderScheduler repaint at this pace
+        self.format.setSwapInterval(1)
         QSurfaceFormat.setDefaultFormat(self.format)
 
     def getOpenGLInformation(self) -> None:
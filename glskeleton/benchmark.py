@@ -0,0 +1,302 @@
+# Renders every demo offscreen for a number of frames and reports the timings as JSON, e.g.
+#   python benchmark.py --demo "cube instanced" --demo fractal --resolution 1280x720 --frames 300 --output result.json
+#   python benchmark.py --software --baseline result.json
+#   python benchmark.py --demo fractal --max-iter 100 1000 10000
+#   python benchmark.py --demo "cube far" --demo "cube far no mipmaps"
+#   python benchmark.py --demo "cube loop" --demo "cube instanced" --demo "cube multidraw" --cubes 3 1000 100000
+# --software runs on Mesa llvmpipe without a GPU or display, and makes Mesa report OpenGL 4.6,
+# since llvmpipe implements the features the demos use but may advertise an older version
+import argparse
+from contextlib import redirect_stdout
+import json
+import os
+import sys
+import time
+
+# the environment has to be set before Qt and the GL driver are loaded
+SOFTWARE_ENVIRONMENT = {"QT_QPA_PLATFORM": "offscreen", "LIBGL_ALWAYS_SOFTWARE": "1",
+                        "MESA_GL_VERSION_OVERRIDE": "4.6", "MESA_GLSL_VERSION_OVERRIDE": "460"}
+if "--software" in sys.argv:
+    for key, value in SOFTWARE_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+elif sys.platform.startswith("linux") and not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PySide6.QtGui import QOffscreenSurface, QOpenGLContext, QCloseEvent
+from OpenGL.GL import glGetString, glFinish, glViewport, glCheckNamedFramebufferStatus, GL_VERSION, GL_RENDERER, \
+    GL_VENDOR, GL_RGBA8, GL_DEPTH24_STENCIL8, GL_COLOR_ATTACHMENT0, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, \
+    GL_FRAMEBUFFER, GL_FRAMEBUFFER_COMPLETE
+
+from baseapp import BaseApplication
+from py3gl4.framebuffer import Framebuffer
+from py3gl4.renderbuffer import Renderbuffer
+from py3gl4.statecache import stateCache
+from glcubewidget import GLCubeWidget, LOOP, INSTANCED, MULTI_DRAW
+from glfractalwidget import GLFractalWidget
+from gltessellationwidget import GLTessellationWidget
+
+# the far cube demos look at a grid of cubes from far away, most of the screen samples the crate minified
+FAR_CUBES = 4096
+FAR_DISTANCE = 60.0
+
+
+def cubeReady(widget: GLCubeWidget) -> bool:
+    # the crate replaced its placeholder, so every frame samples the same texture
+    return widget.program is not None and widget.cube_tex.loaded
+
+
+def fractalReady(widget: GLFractalWidget) -> bool:
+    # a failed program never becomes ready, the widget would draw nothing or compute the fractal on the CPU
+    if widget.program_batch.hasFailed("fractal display program"):
+        raise RuntimeError(widget.program_batch.errors["fractal display program"])
+    if widget.cpu_backend:
+        raise RuntimeError(widget.compute_program.error)
+    return widget.program_batch.isDone() and widget.compute_program.isReady()
+
+
+# demo name: (widget factory of the --cubes count, True once the programs are linked and the frames show the demo)
+DEMOS = {
+    "cube loop": (lambda cubes: GLCubeWidget(LOOP, cubes), cubeReady),
+    "cube instanced": (lambda cubes: GLCubeWidget(INSTANCED, cubes), cubeReady),
+    "cube multidraw": (lambda cubes: GLCubeWidget(MULTI_DRAW, cubes), cubeReady),
+    "cube far": (lambda cubes: GLCubeWidget(cube_count=FAR_CUBES, distance=FAR_DISTANCE), cubeReady),
+    "cube far no mipmaps": (lambda cubes: GLCubeWidget(cube_count=FAR_CUBES, mipmaps=False,
+                                                       distance=FAR_DISTANCE), cubeReady),
+    "tessellation": (lambda cubes: GLTessellationWidget(), lambda widget: widget.program is not None),
+    "fractal": (lambda cubes: GLFractalWidget(), fractalReady),
+}
+# the demos which run once per --cubes count, the others ignore it
+CUBE_COUNT_DEMOS = ("cube loop", "cube instanced", "cube multidraw")
+
+
+def statistics(samples: list[float]) -> dict[str, float]:
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.size == 0:
+        return {}
+    return {"mean": float(samples.mean()), "p50": float(np.percentile(samples, 50)),
+            "p95": float(np.percentile(samples, 95)), "p99": float(np.percentile(samples, 99)),
+            "max": float(samples.max())}
+
+
+class OffscreenTarget:
+    # stands in for the framebuffer Qt gives a visible QOpenGLWidget
+    def __init__(self, width: int, height: int) -> None:
+        self.color = Renderbuffer(GL_RGBA8, width, height)
+        self.depth = Renderbuffer(GL_DEPTH24_STENCIL8, width, height)
+        self.fbo = Framebuffer()
+        self.fbo.attachRenderbuffer(GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+        self.fbo.attachRenderbuffer(GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        status = glCheckNamedFramebufferStatus(self.fbo.fbo_id, GL_FRAMEBUFFER)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.delete()
+            raise RuntimeError("the offscreen framebuffer is incomplete (0x%x)" % status)
+
+    def delete(self) -> None:
+        self.fbo.delete()
+        self.color.delete()
+        self.depth.delete()
+
+
+def runDemo(name: str, width: int, height: int, cubes: int, frames: int, warmup: int, timeout: float) -> dict:
+    # the widget is never shown, its GL callbacks are called with the benchmark context current
+    factory, isReady = DEMOS[name]
+    target = OffscreenTarget(width, height)
+    widget = factory(cubes)
+    widget.resize(width, height)
+    widget.defaultFramebufferObject = lambda: target.fbo.fbo_id.value
+
+    def paint() -> tuple[float, float]:
+        # (cpu ms of paintGL, ms until the GPU finished the frame)
+        target.fbo.bind()
+        begin = time.perf_counter()
+        widget.paintGL()
+        end = time.perf_counter()
+        glFinish()
+        return (end - begin) * 1000.0, (time.perf_counter() - begin) * 1000.0
+
+    begin = time.perf_counter()
+    target.fbo.bind()
+    widget.initializeGL()
+    widget.resizeGL(width, height)
+    glViewport(0, 0, width, height)
+    init_ms = (time.perf_counter() - begin) * 1000.0
+    try:
+        # the programs link in the background, the first frames only poll them
+        while not isReady(widget):
+            paint()
+            BaseApplication.processEvents()
+            if time.perf_counter() - begin > timeout:
+                raise RuntimeError("%s was not ready after %.1f seconds" % (name, timeout))
+    except RuntimeError:
+        widget.closeEvent(QCloseEvent())
+        target.delete()
+        raise
+    ready_ms = (time.perf_counter() - begin) * 1000.0
+    for _ in range(warmup):
+        paint()
+        BaseApplication.processEvents()
+    widget.profiler.reset()
+    widget.profiler.length = frames
+
+    cpu, wall, issued, skipped = [], [], [], []
+    for _ in range(frames):
+        cpu_ms, wall_ms = paint()
+        cpu.append(cpu_ms)
+        wall.append(wall_ms)
+        # the bind calls of the frame, the state cache counts the ones it issued and skipped,
+        # draw and dispatch calls are not counted
+        state = stateCache()
+        issued.append(state.issued)
+        skipped.append(state.skipped)
+        BaseApplication.processEvents()
+    widget.profiler.flush()
+    _, gpu = widget.profiler.samples("frame")
+    result = {"demo": name, "width": width, "height": height, "frames": frames, "init_ms": init_ms,
+              "ready_ms": ready_ms, "cpu_ms": statistics(cpu), "wall_ms": statistics(wall),
+              "gpu_ms": statistics(gpu.tolist()), "gpu_frames_dropped": widget.profiler.dropped,
+              "binds_issued_per_frame": float(np.mean(issued)), "binds_skipped_per_frame": float(np.mean(skipped)),
+              "scopes": {path: statistics(widget.profiler.samples(path)[1].tolist())
+                         for path, _ in widget.profiler.scopes()},
+              "programs": [{"name": program, "cached": hit, "ms": milliseconds}
+                           for program, hit, milliseconds in widget.program_cache.records]}
+    if isinstance(widget, GLCubeWidget):
+        # the mode actually drawn, it is LOOP when the program of the requested one failed
+        result.update(cubes=len(widget.cube_positions), draw_mode=widget.draw_mode, culling=widget.culling)
+    widget.closeEvent(QCloseEvent())
+    target.delete()
+    return result
+
+
+def runFractalIterations(width: int, height: int, max_iters: list[int], repeats: int, timeout: float) -> list[dict]:
+    # the time until the whole default view is computed at every max_iter, each frame waits for the GPU,
+    # the budget is lifted so the progressive renderer dispatches the view as soon as it knows the cost
+    target = OffscreenTarget(width, height)
+    widget = GLFractalWidget()
+    widget.resize(width, height)
+    widget.defaultFramebufferObject = lambda: target.fbo.fbo_id.value
+    target.fbo.bind()
+    widget.initializeGL()
+    widget.resizeGL(width, height)
+    glViewport(0, 0, width, height)
+    widget.progressive.budget_ms = 1000.0
+    results = []
+    try:
+        for max_iter in max_iters:
+            widget.max_iter = max_iter
+            views, frames = [], []
+            # the first view waits for the programs and teaches the progressive renderer the cost of a sample
+            for repeat in range(repeats + 1):
+                widget.view = None
+                count = 0
+                begin = time.perf_counter()
+                while widget.view is None or widget.progressive.pending():
+                    target.fbo.bind()
+                    widget.paintGL()
+                    glFinish()
+                    BaseApplication.processEvents()
+                    # raises when a program failed, nothing would time the compute shader
+                    fractalReady(widget)
+                    count += 1
+                    if time.perf_counter() - begin > timeout:
+                        raise RuntimeError("fractal max_iter %d took more than %.1f seconds" % (max_iter, timeout))
+                if repeat > 0:
+                    views.append((time.perf_counter() - begin) * 1000.0)
+                    frames.append(count)
+            results.append({"width": width, "height": height, "max_iter": max_iter, "view_ms": statistics(views),
+                            "frames_per_view": float(np.mean(frames))})
+    finally:
+        widget.closeEvent(QCloseEvent())
+        target.delete()
+    return results
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    # a regression is a mean cpu or gpu frame time more than tolerance slower than the baseline run
+    previous = {(run["demo"], run["width"], run["height"], run.get("cubes")): run for run in baseline["results"]}
+    regressions = []
+    for run in results:
+        old = previous.get((run["demo"], run["width"], run["height"], run.get("cubes")))
+        if old is None:
+            continue
+        for metric in ("cpu_ms", "gpu_ms"):
+            if "mean" in run[metric] and "mean" in old[metric] and \
+                    run[metric]["mean"] > old[metric]["mean"] * (1.0 + tolerance):
+                regressions.append(f"{run['demo']} {run['width']}x{run['height']} {metric}: "
+                                   f"{old[metric]['mean']:.3f} -> {run[metric]['mean']:.3f} ms")
+    return regressions
+
+
+def parseResolution(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Render the demos offscreen and report frame times as JSON")
+    parser.add_argument("--demo", action="append", choices=list(DEMOS), help="demo to run, all by default")
+    parser.add_argument("--resolution", action="append", type=parseResolution,
+                        help="WIDTHxHEIGHT, 1280x720 by default")
+    parser.add_argument("--cubes", type=int, nargs="+", default=[3],
+                        help="cube counts of the cube loop, instanced and multidraw demos")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the programs to link")
+    parser.add_argument("--gl-version", default="4.6", help="MAJOR.MINOR of the requested core profile")
+    parser.add_argument("--software", action="store_true", help="render with Mesa llvmpipe, no GPU needed")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--baseline", help="JSON of an earlier run, exit with 1 when a demo got slower")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    parser.add_argument("--max-iter", type=int, nargs="+",
+                        help="time a full recompute of the fractal view at each of these iteration limits")
+    parser.add_argument("--repeats", type=int, default=20, help="recomputes of the fractal view per --max-iter")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    # the shaders and textures are loaded relative to this directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    major, minor = (int(part) for part in args.gl_version.split("."))
+    app = BaseApplication(sys.argv[:1], samples=0, major=major, minor=minor)
+    surface = QOffscreenSurface()
+    surface.create()
+    context = QOpenGLContext()
+    if not context.create() or not context.makeCurrent(surface):
+        print("failed to create an OpenGL %s context" % args.gl_version, file=sys.stderr)
+        return 2
+    report = {"gl": {"version": glGetString(GL_VERSION).decode(), "renderer": glGetString(GL_RENDERER).decode(),
+                     "vendor": glGetString(GL_VENDOR).decode()},
+              "results": []}
+    # the demos print their own reports, keep stdout for the JSON
+    with redirect_stdout(sys.stderr):
+        for name in args.demo or list(DEMOS):
+            for width, height in args.resolution or [(1280, 720)]:
+                for cubes in args.cubes if name in CUBE_COUNT_DEMOS else [None]:
+                    print(f"benchmark: {name} {width}x{height}" + (f" {cubes} cubes" if cubes is not None else ""))
+                    report["results"].append(runDemo(name, width, height, cubes, args.frames, args.warmup,
+                                                     args.timeout))
+        if args.max_iter:
+            report["fractal_max_iter"] = []
+            for width, height in args.resolution or [(1280, 720)]:
+                print(f"benchmark: fractal max_iter {width}x{height}")
+                report["fractal_max_iter"] += runFractalIterations(width, height, args.max_iter, args.repeats,
+                                                                   args.timeout)
+    context.doneCurrent()
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+    if baseline:
+        with open(baseline) as file:
+            regressions = compare(report["results"], json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# The Mandelbrot set of shaders/fractal.comp computed on the CPU, for machines without compute shaders and
+# render nodes without any GL driver. Every tile iterates whole NumPy arrays and drops the escaped pixels
+# from the arrays, the tiles run in worker processes which write straight into one shared memory image.
+# Measure the throughput across process counts, and optionally save the image, e.g.
+#   python cpufractal.py --resolution 1920x1080 --max-iter 1000 --workers 1 2 4 8 --output fractal.png
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import json
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import os
+import sys
+import time
+
+import numpy as np
+
+# the image is RGBA32F like the texture of the compute shader, row 0 is the bottom row
+CHANNELS = 4
+# an orbit which comes back to within this fraction of a pixel is interior, like in shaders/fractal.comp
+PERIOD_TOLERANCE = 1e-3
+
+
+def hsv2rgb(hue: np.ndarray, saturation: float, value: float) -> np.ndarray:
+    # shaders/color.glsl for arrays of hue, (N, 3)
+    k = np.array([1.0, 2.0 / 3.0, 1.0 / 3.0], dtype=np.float32)
+    shifted = hue[:, None] + k
+    p = np.abs((shifted - np.floor(shifted)) * 6.0 - 3.0)
+    return value * (1.0 + (np.clip(p - 1.0, 0.0, 1.0) - 1.0) * saturation)
+
+
+def mapColor(iterations: np.ndarray, r: np.ndarray, c: np.ndarray, max_iter: int) -> np.ndarray:
+    # map_color of shaders/fractal.comp, smooth colouring by the escape count and the final |z|
+    zn = np.sqrt(r + c)
+    hue = (iterations + 1 - np.log(np.log2(np.abs(zn)))) / max_iter
+    return hsv2rgb(hue.astype(np.float32), 0.8, 1.0)
+
+
+def inCardioidOrBulb(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    # in_cardioid_or_bulb of shaders/fractal.comp, these points never escape
+    y2 = cy * cy
+    q = (cx - 0.25) * (cx - 0.25) + y2
+    return (q * (q + (cx - 0.25)) <= 0.25 * y2) | ((cx + 1) * (cx + 1) + y2 <= 0.0625)
+
+
+def mandelbrot(x: int, y: int, width: int, height: int, center: tuple[float, float], scale: float,
+               max_iter: int, dtype: type = np.float32, periodicity: bool = True) -> tuple[np.ndarray, int]:
+    # ((height, width, 4) RGBA of the pixels from (x, y), iterations spent), c = scale * (pixel - center)
+    # like the shader, float32 matches its default precision, float64 its DOUBLE_PRECISION build,
+    # periodicity drops the pixels whose orbit repeats like the Brent cycle detection of the shader
+    scale = dtype(scale)
+    columns = scale * (np.arange(x, x + width, dtype=dtype) - dtype(center[0]))
+    rows = scale * (np.arange(y, y + height, dtype=dtype) - dtype(center[1]))
+    cx, cy = (values.ravel() for values in np.meshgrid(columns, rows))
+    count = width * height
+    # the pixels still iterating, their positions in the tile and their z
+    outside = ~inCardioidOrBulb(cx, cy)
+    index = np.arange(count)[outside]
+    cx, cy = cx[outside], cy[outside]
+    zx = np.zeros(index.size, dtype=dtype)
+    zy = np.zeros(index.size, dtype=dtype)
+    escape_iter = np.full(count, max_iter, dtype=np.int32)
+    escape_x = np.zeros(count, dtype=dtype)
+    escape_y = np.zeros(count, dtype=dtype)
+    # z_1 = c is saved first, then z after 3, 7, 15, ... iterations, every pixel starts at the same iteration,
+    # so they share the schedule
+    saved_x, saved_y = cx, cy
+    power, steps = 2, 0
+    tolerance = dtype(PERIOD_TOLERANCE) * scale
+    spent = 0
+    for i in range(max_iter if index.size else 0):
+        xx = zx * zx
+        yy = zy * zy
+        escaped = xx + yy >= 4
+        if escaped.any():
+            done = index[escaped]
+            escape_iter[done] = i
+            escape_x[done] = zx[escaped]
+            escape_y[done] = zy[escaped]
+            alive = ~escaped
+            index, zx, zy, cx, cy, xx, yy, saved_x, saved_y = (
+                values[alive] for values in (index, zx, zy, cx, cy, xx, yy, saved_x, saved_y))
+            if index.size == 0:
+                break
+        spent += index.size
+        zy = 2 * zx * zy + cy
+        zx = xx - yy + cx
+        # z is z_(i + 1) now
+        if not periodicity or i == 0:
+            continue
+        periodic = (np.abs(zx - saved_x) <= tolerance) & (np.abs(zy - saved_y) <= tolerance)
+        if periodic.any():
+            # interior, escape_iter stays max_iter
+            alive = ~periodic
+            index, zx, zy, cx, cy, saved_x, saved_y = (
+                values[alive] for values in (index, zx, zy, cx, cy, saved_x, saved_y))
+            if index.size == 0:
+                break
+        steps += 1
+        if steps == power:
+            saved_x, saved_y = zx, zy
+            power *= 2
+            steps = 0
+    pixels = np.zeros((count, CHANNELS), dtype=np.float32)
+    pixels[:, 3] = 1.0
+    outside = escape_iter < max_iter
+    pixels[outside, :3] = mapColor(escape_iter[outside], escape_x[outside] * escape_x[outside],
+                                   escape_y[outside] * escape_y[outside], max_iter)
+    return pixels.reshape(height, width, CHANNELS), spent
+
+
+def renderTile(buffer_name: str, shape: tuple[int, int, int], tile: tuple[int, int, int, int],
+               center: tuple[float, float], scale: float, max_iter: int) -> int:
+    # runs in a worker process, writes the tile into the shared image and returns the iterations spent
+    memory = SharedMemory(name=buffer_name)
+    try:
+        image = np.ndarray(shape, dtype=np.float32, buffer=memory.buf)
+        x, y, width, height = tile
+        image[y:y + height, x:x + width], spent = mandelbrot(x, y, width, height, center, scale, max_iter)
+        # the view has to go before the memory can close
+        del image
+    finally:
+        memory.close()
+    return spent
+
+
+class CPUFractalRenderer:
+    # renders regions of the image in tiles on a process pool, finished() tells which tiles arrived,
+    # so a widget uploads them to its texture while the others are still computed
+    def __init__(self, workers: int = None, tile_size: int = 64) -> None:
+        self.workers = workers or os.cpu_count()
+        self.tile_size = tile_size
+        # forking would copy the threads of Qt and the GL driver, spawned workers start a new interpreter,
+        # which imports this module and runs the __main__ module of the parent again as __mp_main__,
+        # so app.py, benchmark.py and this file keep their work under if __name__ == '__main__'
+        self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"))
+        self.memory: SharedMemory = None
+        self.image: np.ndarray = None
+        # future -> tile of the current view
+        self.futures: dict = {}
+        # tiles of the current view which wait until no tile of an older view can write the image anymore
+        self.queue: list = []
+        self.stale: list = []
+        self.iterations = 0
+
+    def resize(self, width: int, height: int) -> None:
+        self.cancel()
+        wait(self.stale)
+        self.stale = []
+        self.release()
+        self.memory = SharedMemory(create=True, size=width * height * CHANNELS * 4)
+        self.image = np.ndarray((height, width, CHANNELS), dtype=np.float32, buffer=self.memory.buf)
+        self.image[:] = 0.0
+
+    def release(self) -> None:
+        if self.memory is not None:
+            self.image = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def submit(self, regions: list[tuple[int, int, int, int]], center: tuple[float, float], scale: float,
+               max_iter: int) -> None:
+        # replaces the work of the previous view
+        self.cancel()
+        self.iterations = 0
+        for x, y, width, height in regions:
+            for tile_y in range(y, y + height, self.tile_size):
+                for tile_x in range(x, x + width, self.tile_size):
+                    tile = (tile_x, tile_y, min(self.tile_size, x + width - tile_x),
+                            min(self.tile_size, y + height - tile_y))
+                    self.queue.append((tile, center, scale, max_iter))
+        self.start()
+
+    def cancel(self) -> None:
+        # tiles which already run can not be stopped, they finish before the next view starts
+        for future in self.futures:
+            if not future.cancel():
+                self.stale.append(future)
+        self.futures = {}
+        self.queue = []
+
+    def start(self) -> None:
+        self.stale = [future for future in self.stale if not future.done()]
+        if self.stale:
+            return
+        for tile, center, scale, max_iter in self.queue:
+            future = self.executor.submit(renderTile, self.memory.name, self.image.shape, tile, center, scale,
+                                          max_iter)
+            self.futures[future] = tile
+        self.queue = []
+
+    def pending(self) -> bool:
+        return bool(self.futures or self.queue)
+
+    def finished(self) -> list[tuple[int, int, int, int]]:
+        # the tiles which arrived in self.image since the last call, never waits
+        self.start()
+        tiles = []
+        for future in [future for future in self.futures if future.done()]:
+            tile = self.futures.pop(future)
+            self.iterations += future.result()
+            tiles.append(tile)
+        return tiles
+
+    def wait(self) -> list[tuple[int, int, int, int]]:
+        # blocks until every tile of the current view arrived
+        tiles = []
+        while self.pending():
+            wait(list(self.futures) + self.stale, return_when=FIRST_COMPLETED)
+            tiles += self.finished()
+        return tiles
+
+    def delete(self) -> None:
+        self.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.release()
+
+
+def saveImage(image: np.ndarray, file_path: str) -> None:
+    from PIL import Image
+    pixels = (np.clip(np.flipud(image[:, :, :3]), 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    Image.fromarray(pixels, "RGB").save(file_path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Render the Mandelbrot set on the CPU and report the throughput")
+    parser.add_argument("--resolution", default="1920x1080", help="WIDTHxHEIGHT")
+    parser.add_argument("--max-iter", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count()],
+                        help="process counts to measure")
+    parser.add_argument("--tile-size", type=int, default=64)
+    parser.add_argument("--output", help="save the image of the last run as PNG, needs Pillow")
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.resolution.lower().split("x"))
+    # the initial view of GLFractalWidget
+    center, scale = (width * 0.75, height * 0.5), 2.0 / height
+
+    results = []
+    for workers in args.workers:
+        renderer = CPUFractalRenderer(workers, args.tile_size)
+        renderer.resize(width, height)
+        # start the processes before the clock does
+        renderer.submit([(0, 0, min(width, workers * args.tile_size), 1)], center, scale, 1)
+        renderer.wait()
+        begin = time.perf_counter()
+        renderer.submit([(0, 0, width, height)], center, scale, args.max_iter)
+        renderer.wait()
+        seconds = time.perf_counter() - begin
+        results.append({"workers": workers, "width": width, "height": height, "max_iter": args.max_iter,
+                        "seconds": seconds, "iterations": renderer.iterations,
+                        "mpix_iter_per_s": renderer.iterations / seconds / 1000000.0})
+        print(f"{workers} process(es): {results[-1]['mpix_iter_per_s']:.1f} Mpix-iter/s", file=sys.stderr)
+        if args.output and workers == args.workers[-1]:
+            saveImage(renderer.image, args.output)
+        renderer.delete()
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# refer to https://en.wikipedia.org/wiki/Plotting_algorithms_for_the_Mandelbrot_set#Perturbation_theory_and_series_approximation
+# Deep zoom by perturbation: the orbit Z of one reference point is iterated on the CPU with Python integers
+# as fixed point numbers of any precision, the pixels only iterate their small difference to it in float.
+# With c = reference + scale * dc and z = Z + scale * d, where dc and d are in pixels,
+#   d' = 2 Z d + scale * d^2 + dc
+# keeps d in float range for a scale far below float precision, down to about MIN_SCALE.
+# When |z| < |scale * d| the pixel continues from Z_0 = 0 with d = z / scale (rebasing), so the reference
+# never has to stay close to the pixels and no glitch detection is needed
+import math
+
+import numpy as np
+from OpenGL.GL import GL_DYNAMIC_STORAGE_BIT
+
+from py3gl4.storagebuffer import ShaderStorageBuffer
+
+# the vec2 orbit[] of shaders/fractal.comp built with PERTURBATION
+ORBIT_DTYPE = np.dtype((np.float32, (2,)))
+ORBIT_BINDING = 0
+# z / scale of an orbit of |z| < 2 must fit in a float
+MIN_SCALE = 1e-36
+# series coefficients above this are too large for the float uniforms
+FLOAT_LIMIT = 1e30
+# fractional bits beyond the pixel size, an origin is kept until half of them are used up by zooming
+SPARE_BITS = 64
+
+
+def precisionBits(scale: float) -> int:
+    # fractional bits which resolve a pixel of scale with SPARE_BITS to spare
+    return max(64, math.ceil(-math.log2(scale)) + SPARE_BITS)
+
+
+def hasPrecision(scale: float, bits: int) -> bool:
+    # an origin with bits fractional bits still resolves pixels of scale
+    return bits >= precisionBits(scale) - SPARE_BITS // 2
+
+
+def toFixed(value: float, bits: int) -> int:
+    # exact, a double is a fraction with a power of two denominator
+    numerator, denominator = value.as_integer_ratio()
+    return (numerator << bits) // denominator
+
+
+def referenceOrbit(x: int, y: int, bits: int, max_iter: int) -> np.ndarray:
+    # Z_0 = 0 up to the first |Z| > 2 or Z_max_iter of c = (x + iy) / 2**bits, as complex128
+    orbit = np.zeros(max_iter + 1, dtype=np.complex128)
+    one = 1 << bits
+    escape = 4 << bits
+    zx = zy = 0
+    for n in range(max_iter + 1):
+        orbit[n] = complex(zx / one, zy / one)
+        xx = (zx * zx) >> bits
+        yy = (zy * zy) >> bits
+        if xx + yy > escape:
+            return orbit[:n + 1]
+        zx, zy = xx - yy + x, ((zx * zy) >> (bits - 1)) + y
+    return orbit
+
+
+def seriesApproximation(orbit: np.ndarray, scale: float, radius: float,
+                        tolerance: float = 1e-4) -> tuple[int, complex, complex, complex]:
+    # (skip, a, b, c) with d = a dc + b dc^2 + c dc^3 after skip iterations for every |dc| <= radius pixels,
+    # it stops before the cubic term matters, before d could rebase or escape, skip 0 skips nothing
+    a = b = c = 0j
+    skip = 0
+    zs = orbit.tolist()
+    for n in range(len(zs) - 1):
+        z2 = 2.0 * zs[n]
+        next_a = z2 * a + 1.0
+        next_b = z2 * b + scale * a * a
+        next_c = z2 * c + 2.0 * scale * a * b
+        linear, square, cube = abs(next_a) * radius, abs(next_b) * radius ** 2, abs(next_c) * radius ** 3
+        delta = scale * (linear + square + cube)
+        reference = abs(zs[n + 1])
+        if cube > tolerance * max(linear, square) or delta > 0.01 * reference or reference + delta >= 2.0 or \
+                max(abs(next_a), abs(next_b), abs(next_c)) > FLOAT_LIMIT:
+            break
+        a, b, c = next_a, next_b, next_c
+        skip = n + 1
+    return skip, a, b, c
+
+
+class ReferenceOrbit:
+    # the orbit of the reference point in a shader storage buffer and the series of the view around it,
+    # update() recomputes only what the changed parameters invalidate
+    def __init__(self) -> None:
+        self.buffer: ShaderStorageBuffer = None
+        self.orbit: np.ndarray = None
+        self.orbit_key = None
+        self.series_key = None
+        self.radius = 0.0
+        self.series = (0, 0j, 0j, 0j)
+
+    @property
+    def length(self) -> int:
+        return 0 if self.orbit is None else len(self.orbit)
+
+    def update(self, x: int, y: int, bits: int, scale: float, max_iter: int, radius: float) -> None:
+        # (x, y) is the reference point in fixed point with bits fractional bits, radius is the distance
+        # in pixels from it to the farthest pixel which will be computed
+        orbit_key = (x, y, bits, max_iter)
+        if orbit_key != self.orbit_key:
+            self.orbit_key = orbit_key
+            self.orbit = referenceOrbit(x, y, bits, max_iter)
+            data = np.stack((self.orbit.real, self.orbit.imag), axis=1).astype(np.float32)
+            if self.buffer is None or self.buffer.count < len(data):
+                if self.buffer is not None:
+                    self.buffer.delete()
+                self.buffer = ShaderStorageBuffer(dtype=ORBIT_DTYPE, count=max_iter + 1,
+                                                  flags=GL_DYNAMIC_STORAGE_BIT)
+            self.buffer.write(data)
+            self.series_key = None
+        # a series valid for a larger radius is valid for a smaller one, panning only extends it
+        if self.series_key != (orbit_key, scale) or radius > self.radius:
+            self.series_key = (orbit_key, scale)
+            self.radius = radius
+            self.series = seriesApproximation(self.orbit, scale, radius)
+
+    def bind(self) -> None:
+        self.buffer.bindBase(ORBIT_BINDING)
+
+    def delete(self) -> None:
+        if self.buffer is not None:
+            self.buffer.delete()
+            self.buffer = None
@@ -0,0 +1,147 @@
+# Renders a demo at any size, e.g. a 32768x32768 poster of the fractal, tile by tile into an offscreen
+# framebuffer. The tiles are read back through a PixelPackBuffer without waiting for the GPU and written band by
+# band from the top into a PNG or TIFF file, so only one band of tiles is ever held in memory.
+# A demo takes part with beginExport(tile_width, tile_height), exportTile(x, y, width, height, image_width,
+# image_height), which draws that rectangle of the image into the bound framebuffer, and endExport().
+# Every step of the event loop renders one tile, so the window stays responsive and the export can be cancelled
+from OpenGL.GL import glViewport, glCheckNamedFramebufferStatus, GL_RGBA8, GL_DEPTH24_STENCIL8, \
+    GL_COLOR_ATTACHMENT0, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, GL_FRAMEBUFFER, GL_FRAMEBUFFER_COMPLETE
+from OpenGL.error import GLError
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
+import numpy as np
+
+from py3gl4.framebuffer import Framebuffer
+from py3gl4.renderbuffer import Renderbuffer
+from py3gl4.pixelpackbuffer import PixelPackBuffer
+from py3gl4.statecache import stateCache
+from imagewriter import ImageWriter, openImageWriter
+
+
+class TiledExporter(QObject):
+    # (tiles written, tiles)
+    progress = Signal(int, int)
+    # the path of the complete file
+    finished = Signal(str)
+    # the reason, the incomplete file is removed
+    failed = Signal(str)
+
+    def __init__(self, widget: QOpenGLWidget, file_path: str, width: int, height: int,
+                 tile_size: int = 512) -> None:
+        super().__init__()
+        self.widget = widget
+        self.file_path = file_path
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        # (x, y, width, height) of the tiles band by band from the top, a band is read back in this order,
+        # so it is complete before the next one starts
+        self.tiles = []
+        for top in range(height, 0, -tile_size):
+            bottom = max(top - tile_size, 0)
+            for x in range(0, width, tile_size):
+                self.tiles.append((x, bottom, min(tile_size, width - x), top - bottom))
+        self.tiles_per_band = (width + tile_size - 1) // tile_size
+        self.next_tile = 0
+        self.written = 0
+        # the band which is read back, its rows go bottom to top like the framebuffer
+        self.band: np.ndarray = None
+        self.band_tiles = 0
+        self.writer: ImageWriter = None
+        self.color: Renderbuffer = None
+        self.depth: Renderbuffer = None
+        self.fbo: Framebuffer = None
+        self.readback: PixelPackBuffer = None
+        self.exporting = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.step)
+
+    def isRunning(self) -> bool:
+        return self.timer.isActive()
+
+    def start(self) -> None:
+        self.widget.makeCurrent()
+        try:
+            self.writer = openImageWriter(self.file_path, self.width, self.height)
+            self.color = Renderbuffer(GL_RGBA8, self.tile_size, self.tile_size)
+            self.depth = Renderbuffer(GL_DEPTH24_STENCIL8, self.tile_size, self.tile_size)
+            self.fbo = Framebuffer()
+            self.fbo.attachRenderbuffer(GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+            self.fbo.attachRenderbuffer(GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+            status = glCheckNamedFramebufferStatus(self.fbo.fbo_id, GL_FRAMEBUFFER)
+            if status != GL_FRAMEBUFFER_COMPLETE:
+                raise RuntimeError("the export framebuffer is incomplete (0x%x)" % status)
+            self.readback = PixelPackBuffer(self.tile_size * self.tile_size * 4)
+            self.widget.beginExport(self.tile_size, self.tile_size)
+            self.exporting = True
+        except (OSError, RuntimeError, ValueError, GLError) as error:
+            self.finish(str(error))
+            return
+        self.timer.start(0)
+
+    def cancel(self) -> None:
+        if self.isRunning():
+            self.finish("cancelled")
+
+    def step(self) -> None:
+        self.widget.makeCurrent()
+        # the widget painted and Qt bound its framebuffer since the last step
+        stateCache().invalidate()
+        try:
+            if self.next_tile < len(self.tiles):
+                x, y, width, height = self.tiles[self.next_tile]
+                self.fbo.bind()
+                glViewport(0, 0, self.tile_size, self.tile_size)
+                # every tile is rendered whole, so all of them see the image at the same pixel size,
+                # the pixels beyond the image are not read back
+                self.widget.exportTile(x, y, self.tile_size, self.tile_size, self.width, self.height)
+                self.readback.readPixels(0, 0, width, height, self.next_tile)
+                self.next_tile += 1
+            # nothing else is rendered while the last tiles are read back
+            for index, pixels in self.readback.poll(wait=self.next_tile == len(self.tiles)):
+                self.store(self.tiles[index], pixels)
+        except (OSError, RuntimeError, ValueError, GLError) as error:
+            self.finish(str(error))
+            return
+        self.progress.emit(self.written, len(self.tiles))
+        if self.written == len(self.tiles):
+            self.finish()
+
+    def store(self, tile: tuple[int, int, int, int], pixels: np.ndarray) -> None:
+        x, _, width, height = tile
+        if self.band is None:
+            self.band = np.empty((height, self.width, 3), dtype=np.uint8)
+        self.band[:, x:x + width] = pixels[:, :, :3]
+        self.band_tiles += 1
+        self.written += 1
+        if self.band_tiles == self.tiles_per_band:
+            # the file starts with the top row
+            self.writer.writeRows(self.band[::-1])
+            self.band = None
+            self.band_tiles = 0
+
+    def finish(self, error: str = None) -> None:
+        self.timer.stop()
+        self.widget.makeCurrent()
+        if self.exporting:
+            self.widget.endExport()
+            self.exporting = False
+        for resource in (self.readback, self.fbo, self.color, self.depth):
+            if resource is not None:
+                resource.delete()
+        self.readback = self.fbo = self.color = self.depth = None
+        stateCache().invalidate()
+        if self.writer is not None:
+            if error is None:
+                try:
+                    self.writer.close()
+                except (OSError, ValueError) as close_error:
+                    error = str(close_error)
+            else:
+                self.writer.abort()
+            self.writer = None
+        self.band = None
+        if error is None:
+            self.finished.emit(self.file_path)
+        else:
+            self.failed.emit(error)
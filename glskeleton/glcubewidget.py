@@ -5,74 +5,110 @@ import time
 
 import numpy as np
 from PySide6.QtOpenGLWidgets import QOpenGLWidget
-from PySide6.QtCore import QTimerEvent
 from PySide6.QtGui import QCloseEvent, QSurfaceFormat
 from OpenGL.GL import *
-import glm
 
-from py3gl4.program import Program
-from py3gl4.shader import VertexShader, FragmentShader
+from py3gl4.programcache import ProgramCache
+from py3gl4.programbatch import ProgramBatch
+from py3gl4.shader import VertexShader, FragmentShader, ComputeShader
+from py3gl4.preprocessor import ShaderPreprocessor
 from py3gl4.vertexarrayobject import VertexArrayObject, VertexAttribute
 from py3gl4.vertexbufferobject import VertexBufferObject
 from py3gl4.elementbufferobject import ElementBufferObject
+from py3gl4.streamingbuffer import StreamingVertexBuffer
+from py3gl4.meshpool import MeshPool
 from py3gl4.uniform import Uniform
+from py3gl4.uniformbuffer import UniformBuffer
 from py3gl4.texture import Texture2D
+from py3gl4.textureloader import TextureLoader
 from py3gl4.framebuffer import Framebuffer
+from py3gl4.statecache import stateCache
+from py3gl4.transform import Camera, translation, rotation, compose, transformPoints, columnMajor
 from py3gl4.renderbuffer import Renderbuffer
+from py3gl4.culling import GPUCuller, DepthPyramid
+from py3gl4.profiler import GPUProfiler
+from renderscheduler import renderScheduler, CONTINUOUS
 from baseapp import BaseApplication
 
+# below this many cubes the two compute passes and the depth pyramid cost more than drawing every cube
+CULLING_MIN_INSTANCES = 1024
+# anisotropic filtering of the crate when it has mipmaps
+CRATE_ANISOTROPY = 8.0
+# a model uniform and a glDrawElements per cube
+LOOP = "loop"
+# one glDrawElementsInstanced reading the model matrices from an instance attribute
+INSTANCED = "instanced"
+# one MeshPool mesh drawn once per cube by a single glMultiDrawElementsIndirect
+MULTI_DRAW = "multidraw"
+DRAW_MODES = (LOOP, INSTANCED, MULTI_DRAW)
 
-vertex_shader_code = """
-#version 460 core
-in layout(location = 0) vec3 position;
-in layout(location = 1) vec2 textCoords;
-uniform mat4 vp;
-uniform mat4 model;
-out vec2 outText;
-void main()
-{
-    gl_Position =  vp * model * vec4(position, 1.0f);
-    outText = textCoords;
-}
-"""
-
-fragment_shader_code = """
-#version 460 core
-in vec2 outText;
-out vec4 outColor;
-uniform sampler2D renderedTexture;
-void main()
-{
-    outColor = texture(renderedTexture, outText);
-}
-"""
+
+def cubeGrid(count: int, spacing: float = 1.5) -> np.ndarray:
+    # (count, 3) positions filling a cube shaped grid around the origin
+    side = int(np.ceil(count ** (1.0 / 3.0)))
+    cells = np.indices((side, side, side)).reshape(3, -1).T[:count]
+    return ((cells - (side - 1) / 2.0) * spacing).astype(np.float32)
 
 
 class GLCubeWidget(QOpenGLWidget):
-    def __init__(self) -> None:
+    def __init__(self, draw_mode: str = INSTANCED, cube_count: int = 3, culling: bool = None,
+                 mipmaps: bool = True, distance: float = 5.0) -> None:
+        # draw_mode is one of DRAW_MODES, a mode whose program fails to build falls back to LOOP,
+        # culling lets a compute pass pick the visible instances and draw them indirectly, only when instanced,
+        # None culls from CULLING_MIN_INSTANCES cubes on,
+        # without mipmaps the crate is one level sampled bilinearly, distance is the camera's from the origin
+        if draw_mode not in DRAW_MODES:
+            raise ValueError("unknown draw mode %s, use one of %s" % (draw_mode, ", ".join(DRAW_MODES)))
         super().__init__()
-        self.startTimer(20)
-        self.cube_positions = [
-            (1.0, 1.0, 0.0), (0.0, 0.0, 0.0), (2.0, 0.0, 0.0)]
-        self.plane_position = glm.translate(
-            glm.mat4(1.0), glm.vec3(-3.0, 1.0, 0.0))
-
-    def timerEvent(self, event: QTimerEvent) -> None:
-        self.update()
+        # the cubes move every frame
+        renderScheduler().register(self, CONTINUOUS)
+        self.draw_mode = draw_mode
+        self.mipmaps = mipmaps
+        self.distance = distance
+        if culling is None:
+            culling = cube_count >= CULLING_MIN_INSTANCES
+        self.culling = draw_mode == INSTANCED and culling
+        if cube_count == 3:
+            self.cube_positions = np.array([
+                (1.0, 1.0, 0.0), (0.0, 0.0, 0.0), (2.0, 0.0, 0.0)], dtype=np.float32)
+        else:
+            self.cube_positions = cubeGrid(cube_count)
+        # every third cube orbits the origin and spins, like the first of the 3 default cubes
+        self.cube_spinning = np.arange(cube_count) % 3 == 0
+        self.plane_position = columnMajor(translation([(-3.0, 1.0, 0.0)])[0])
 
     def initializeGL(self) -> None:
         self.elapsedTime = 0.0
         self.last_time = time.time()
-        self.aspect = float(self.size().width()) / self.size().height()
+        # the projection is only rebuilt when resizeGL changes the aspect ratio
+        self.camera = Camera(np.radians(45.0), float(self.size().width()) / self.size().height(), 0.1, 100.0,
+                             view=translation([(0.0, 0.0, -self.distance)])[0])
+        self.camera_revision = -1
+        # GPU and CPU time of every pass, benchmark.py reports them
+        self.profiler = GPUProfiler()
 
         # initialize opengl pipeline
-        vertex_shader = VertexShader(vertex_shader_code)
-        fragment_shader = FragmentShader(fragment_shader_code)
-        self.program = Program([vertex_shader, fragment_shader])
-        self.program.addUniform(Uniform("vp", GL_FLOAT_MAT4))
-        self.program.addUniform(Uniform("model", GL_FLOAT_MAT4))
-        vertex_shader.delete()
-        fragment_shader.delete
+        # the programs compile in the background, they are set up in initializeProgram once linked
+        self.program = None
+        self.preprocessor = ShaderPreprocessor()
+        self.program_cache = ProgramCache()
+        self.program_batch = ProgramBatch(self.program_cache)
+        self.program_batch.submit("cube program", [
+            (VertexShader, self.preprocessor.load("shaders/cube.vert")),
+            (FragmentShader, self.preprocessor.load("shaders/cube.frag"))])
+        if self.draw_mode == INSTANCED:
+            self.program_batch.submit("cube instanced program", [
+                (VertexShader, self.preprocessor.load("shaders/cube.vert", {"INSTANCED": None})),
+                (FragmentShader, self.preprocessor.load("shaders/cube.frag"))])
+        elif self.draw_mode == MULTI_DRAW:
+            self.program_batch.submit("cube multi draw program", [
+                (VertexShader, self.preprocessor.load("shaders/cube.vert", {"MULTI_DRAW": None})),
+                (FragmentShader, self.preprocessor.load("shaders/cube.frag"))])
+        if self.culling:
+            self.program_batch.submit("cull program", [
+                (ComputeShader, self.preprocessor.load("shaders/cull.comp"))])
+            self.program_batch.submit("depth pyramid program", [
+                (ComputeShader, self.preprocessor.load("shaders/depthpyramid.comp"))])
 
         # initialize vao, vbo
         cube = np.array([
@@ -134,7 +170,29 @@ class GLCubeWidget(QOpenGLWidget):
         self.cube_vao.setVertexAttribute(0, attribute_position)
         self.cube_vao.setVertexAttribute(0, attribute_textCoords)
         self.cube_vao.setElementBuffer(self.cube_ebo)
-        self.cube_tex = Texture2D(file_path="textures/crate.jpg")
+        self.mesh_pool = None
+        if self.draw_mode == INSTANCED:
+            # the model matrices are rewritten every frame into the next segment of a persistently mapped ring
+            instanceBindingPoint = 1
+            matrix_size = 16 * sizeof(GLfloat)
+            self.instance_vbo = StreamingVertexBuffer(len(self.cube_positions) * matrix_size)
+            self.cube_vao.setVertexBuffer(self.instance_vbo, instanceBindingPoint, 0, matrix_size)
+            for column in range(4):
+                self.cube_vao.setVertexAttribute(instanceBindingPoint, VertexAttribute(
+                    "instanceModel", 2 + column, 4, GL_FLOAT, False, column * 4 * sizeof(GLfloat)))
+            self.cube_vao.setBindingDivisor(instanceBindingPoint, 1)
+        elif self.draw_mode == MULTI_DRAW:
+            # the cube is one mesh of the pool, every cube is one draw command of it
+            self.mesh_pool = MeshPool([attribute_position, attribute_textCoords], 5 * sizeof(GLfloat),
+                                      len(cube) // 5, len(self.cube_indices), max_draws=len(self.cube_positions))
+            self.mesh_pool.add("cube", cube, self.cube_indices)
+            self.cube_commands = self.mesh_pool.buildCommands([self.mesh_pool["cube"]] * len(self.cube_positions))
+        # the crate is decoded in the background and shows a checker until it is uploaded,
+        # mipmaps and anisotropic filtering keep it from shimmering when the cube is small or oblique
+        self.texture_loader = TextureLoader()
+        self.cube_tex = self.texture_loader.load(
+            "textures/crate.jpg", self.onTextureLoaded, mipmaps=self.mipmaps,
+            anisotropy=CRATE_ANISOTROPY if self.mipmaps else None)
 
         self.plane_vao = VertexArrayObject()
         self.plane_vbo = VertexBufferObject(plane)
@@ -148,55 +206,164 @@ class GLCubeWidget(QOpenGLWidget):
         self.plane_tex.SetFiltering(GL_LINEAR, GL_LINEAR)
         self.plane_tex.setWrapMode(GL_REPEAT, GL_REPEAT)
         self.rbo = Renderbuffer(GL_DEPTH24_STENCIL8, self.width(), self.height())
+        self.viewport_size = (self.width(), self.height())
         self.fbo = Framebuffer()
         self.fbo.attachTexture2D(GL_COLOR_ATTACHMENT0, self.plane_tex, 0)
         self.fbo.attachRenderbuffer(
             GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, self.rbo)
 
-        self.view = glm.translate(glm.mat4(1.0), glm.vec3(0.0, 0.0, -5.0))
 
-    def drawCube(self) -> None:
+    def onTextureLoaded(self, texture: Texture2D) -> None:
+        renderScheduler().invalidate(self)
+
+    def initializeProgram(self) -> None:
+        self.program = self.program_batch["cube program"]
+        self.program.addUniform(Uniform("model", GL_FLOAT_MAT4))
+        if self.draw_mode == INSTANCED and self.program_batch.hasFailed("cube instanced program"):
+            # draw the cubes one by one with the model uniform
+            self.instance_vbo.delete()
+            self.draw_mode = LOOP
+        if self.draw_mode == MULTI_DRAW and self.program_batch.hasFailed("cube multi draw program"):
+            self.mesh_pool.delete()
+            self.mesh_pool = None
+            self.draw_mode = LOOP
+        if self.draw_mode == MULTI_DRAW:
+            self.multi_draw_program = self.program_batch["cube multi draw program"]
+        if self.culling and (self.draw_mode != INSTANCED or self.program_batch.hasFailed("cull program") or
+                             self.program_batch.hasFailed("depth pyramid program")):
+            # draw every instance without culling
+            for name in ("cull program", "depth pyramid program"):
+                if self.program_batch.isReady(name):
+                    self.program_batch[name].delete()
+            self.culling = False
+        if self.draw_mode == INSTANCED:
+            self.instanced_program = self.program_batch["cube instanced program"]
+        if self.culling:
+            # one culler per pass, the screen pass also drops the cubes hidden in the depth of the FBO pass
+            cull_program = self.program_batch["cull program"]
+            self.cullers = [GPUCuller(cull_program, len(self.cube_positions), len(self.cube_indices),
+                                      bounding_sphere=(0.0, 0.0, 0.0, np.sqrt(3.0) / 2.0)) for _ in range(2)]
+            self.depth_pyramid = DepthPyramid(
+                self.program_batch["depth pyramid program"], self.rbo.width, self.rbo.height)
+        cameraBindingPoint = 0
+        self.camera_block = UniformBuffer(
+            self.program.getUniformBlock("Camera"), cameraBindingPoint)
+
+    def cubeMatrices(self) -> np.ndarray:
+        # (N, 4, 4) model matrices of all cubes at once, column-major like the mat4 attribute reads them
+        angles = np.where(self.cube_spinning, -self.elapsedTime * 2, 0.0)
+        # rotate the position around the Y axis, then translate to it and spin the cube by the same angle
+        rotations = rotation(angles, (0.0, 1.0, 0.0))
+        positions = transformPoints(rotations, self.cube_positions)
+        return columnMajor(compose(translation(positions), rotations))
+
+    def drawCube(self, culler: GPUCuller = None) -> None:
+        if culler is not None:
+            self.drawCubeCulled(culler)
+            return
+        if self.draw_mode == INSTANCED:
+            self.drawCubeInstanced()
+            return
+        if self.draw_mode == MULTI_DRAW:
+            self.drawCubeMultiDraw()
+            return
         self.cube_vao.bind()
         self.cube_tex.bind(0)
-        for i in range(len(self.cube_positions)):
-            model = glm.translate(
-                glm.mat4(1.0), glm.vec3(self.cube_positions[i]))
-            if i == 0:
-                pos = self.cube_positions[i]
-                pos = glm.rotateY(pos, -self.elapsedTime * 2)
-                model = glm.translate(glm.mat4(1.0), pos)
-                model = glm.rotate(model, -self.elapsedTime *
-                                   2, glm.vec3(0.0, 1.0, 0.0))
-                self.program.uniforms["model"].setMat4(glm.value_ptr(model))
-            elif i == 1:
-                self.program.uniforms["model"].setMat4(glm.value_ptr(model))
-            else:
-                self.program.uniforms["model"].setMat4(glm.value_ptr(model))
+        for model in self.cubeMatrices():
+            self.program.uniforms["model"].setMat4(model)
             glDrawElements(GL_TRIANGLES, len(
                 self.cube_indices), GL_UNSIGNED_INT, None)
-        self.cube_vao.unbind()
-        self.cube_tex.unbind(0)
+
+    def drawCubeInstanced(self) -> None:
+        # the FBO pass and the screen pass draw from the same segment
+        self.instanced_program.use()
+        self.cube_vao.bind()
+        self.cube_tex.bind(0)
+        glDrawElementsInstanced(GL_TRIANGLES, len(self.cube_indices), GL_UNSIGNED_INT, None,
+                                len(self.cube_positions))
+        self.program.use()
+
+    def drawCubeMultiDraw(self) -> None:
+        # one indirect call draws every cube, the model matrices are streamed with the commands
+        self.multi_draw_program.use()
+        self.cube_tex.bind(0)
+        self.mesh_pool.draw(self.cube_commands, self.cubeMatrices())
+        self.program.use()
+
+    def drawCubeCulled(self, culler: GPUCuller) -> None:
+        # the instance attributes read the visible matrices, their number never leaves the GPU
+        self.instanced_program.use()
+        self.cube_vao.setVertexBuffer(culler.visible, 1, 0, 16 * sizeof(GLfloat))
+        self.cube_vao.bind()
+        self.cube_tex.bind(0)
+        culler.draw()
+        self.program.use()
 
     def paintGL(self) -> None:
         self.deltaTime = time.time() - self.last_time
         self.elapsedTime += self.deltaTime
         self.last_time = time.time()
-
+        # Qt bound its framebuffer since the last frame, objects are not unbound after drawing,
+        # the state cache skips the binds which are already in place
+        self.state = stateCache()
+        self.state.beginFrame()
+        self.texture_loader.update()
+
+        if self.program is None:
+            self.program_batch.poll()
+            # nothing is drawn without the cube program, its error was reported by the batch
+            if not self.program_batch.isDone() or self.program_batch.hasFailed("cube program"):
+                glClearColor(0.9, 0.9, 0.9, 1.0)
+                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+                return
+            self.initializeProgram()
+
+        self.profiler.beginFrame()
         self.program.use()
-        self.projection = glm.perspective(
-            glm.radians(45.0), self.aspect, 0.1, 100.0)
-        self.vp = self.projection * self.view
-        self.program.uniforms["vp"].setMat4(glm.value_ptr(self.vp))
+        if self.camera_revision != self.camera.revision:
+            self.camera_block["view"] = self.camera.view
+            self.camera_block["proj"] = self.camera.projection
+            self.camera_block["vp"] = self.camera.viewProjection
+            self.camera_revision = self.camera.revision
+        self.camera_block.upload()
+        culler = None
+        if self.draw_mode == INSTANCED:
+            offset = self.instance_vbo.write(self.cubeMatrices())
+            if not self.culling:
+                self.cube_vao.setVertexBuffer(self.instance_vbo, 1, offset, 16 * sizeof(GLfloat))
+        if self.culling:
+            # the streamed matrices are only read by the compute pass
+            culler = self.cullers[0]
+            self.profiler.begin("cull")
+            culler.cull(self.instance_vbo.buffer_id, offset, len(self.cube_positions), self.camera.frustumPlanes)
+            self.profiler.end()
 
         # draw the cube to the texture in the custom frame buffer
+        self.profiler.begin("fbo pass")
         self.fbo.bind()
         glClearColor(0.0, 0.0, 0.0, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glEnable(GL_DEPTH_TEST)
-        self.drawCube()
+        self.drawCube(culler)
+        self.profiler.end()
+
+        if self.culling:
+            # the FBO pass drew the same cubes with the same camera, its depth occludes the screen pass
+            pyramid = None
+            if self.depth_pyramid.matches(*self.viewport_size):
+                self.profiler.begin("depth pyramid")
+                self.depth_pyramid.build(self.fbo)
+                self.profiler.end()
+                pyramid = self.depth_pyramid
+            culler = self.cullers[1]
+            self.profiler.begin("occlusion cull")
+            culler.cull(self.instance_vbo.buffer_id, offset, len(self.cube_positions), self.camera.frustumPlanes,
+                        pyramid)
+            self.profiler.end()
 
         # now, back to draw to the default frame buffer
-        glBindFramebuffer(GL_FRAMEBUFFER, self.defaultFramebufferObject())
+        self.profiler.begin("screen pass")
+        self.state.bindFramebuffer(GL_FRAMEBUFFER, self.defaultFramebufferObject())
 
         # draw the plane on the screend, the contents of the plane are from the texture of above frame buffer
         glClearColor(0.9, 0.9, 0.9, 1.0)
@@ -204,26 +371,52 @@ class GLCubeWidget(QOpenGLWidget):
         self.plane_tex.bind(0)
         self.plane_vao.bind()
         self.program.uniforms["model"].setMat4(
-            glm.value_ptr(self.plane_position))
+            self.plane_position)
         glDrawElements(GL_TRIANGLES, len(
             self.plane_indices), GL_UNSIGNED_INT, None)
-        self.plane_vao.unbind()
-        self.plane_tex.unbind(0)
 
         # draw the cube on the screend
-        self.drawCube()
+        self.drawCube(culler)
+        if self.draw_mode == INSTANCED:
+            self.instance_vbo.lockSegment()
+        self.profiler.end()
+        self.profiler.endFrame()
 
     def resizeGL(self, w: int, h: int) -> None:
         self.makeCurrent()
-        self.aspect = float(w) / h
+        self.camera.resize(w, h)
+        self.viewport_size = (w, h)
         glViewport(0, 0, w, h)
 
     def closeEvent(self, event: QCloseEvent) -> None:
         self.makeCurrent()
-        self.program.delete()
+        self.profiler.delete()
+        self.program_batch.delete()
+        if self.program is not None:
+            self.program.delete()
+            self.camera_block.delete()
+            if self.draw_mode == INSTANCED:
+                self.instanced_program.delete()
+            if self.culling:
+                self.cullers[0].program.delete()
+                for culler in self.cullers:
+                    culler.delete()
+                self.depth_pyramid.program.delete()
+                self.depth_pyramid.delete()
+        else:
+            # the cube program failed, the other programs were never handed out
+            for program in self.program_batch.programs.values():
+                program.delete()
+        if self.draw_mode == INSTANCED:
+            self.instance_vbo.delete()
+        if self.mesh_pool is not None:
+            if self.program is not None:
+                self.multi_draw_program.delete()
+            self.mesh_pool.delete()
         self.cube_vao.delete()
         self.cube_ebo.delete()
         self.cube_vbo.delete()
+        self.texture_loader.delete()
         self.cube_tex.delete()
         self.plane_vao.delete()
         self.plane_vbo.delete()
@@ -4,24 +4,40 @@ import sys
 
 import numpy as np
 from PySide6.QtOpenGLWidgets import QOpenGLWidget
-from PySide6.QtCore import QTimerEvent, QPoint, Qt
+from PySide6.QtCore import QPoint, Qt
 from PySide6.QtGui import QCloseEvent, QSurfaceFormat, QMouseEvent, QWheelEvent
 from OpenGL.GL import *
 import imgui
 
-from py3gl4.program import Program
+from py3gl4.programcache import ProgramCache
+from py3gl4.programbatch import ProgramBatch
 from py3gl4.shader import VertexShader, FragmentShader, ComputeShader
+from py3gl4.preprocessor import ShaderPreprocessor
 from py3gl4.vertexarrayobject import VertexArrayObject
 from py3gl4.texture import Texture2D
+from py3gl4.statecache import stateCache
+from py3gl4.profiler import GPUProfiler
 from qtimgui.pyside6 import PySide6Renderer
+from reloadableprogram import ReloadableProgram
+from profilerpanel import profilerPanel
+from renderscheduler import renderScheduler, ON_DEMAND
+from deepzoom import ReferenceOrbit, precisionBits, hasPrecision, toFixed, MIN_SCALE
+from progressive import ProgressiveRenderer
+from cpufractal import CPUFractalRenderer
 from baseapp import BaseApplication
 
 
 class GLFractalWidget(QOpenGLWidget):
     def __init__(self) -> None:
         super().__init__()
-        self.startTimer(20)
+        # the fractal only changes with the mouse controls and the settings, idle otherwise
+        renderScheduler().register(self, ON_DEMAND)
         self.tex = None
+        # a pan copies the image from self.tex into self.back_tex, then they swap
+        self.back_tex = None
+        # (panX, panY, scale, max_iter, deep_zoom, origin, cpu_backend) which self.tex shows,
+        # None when it has to be computed again
+        self.view = None
         self.size_changed = False
         self.scale = 0.0
         self.panX = 0.0
@@ -29,47 +45,86 @@ class GLFractalWidget(QOpenGLWidget):
         self.lastPos = QPoint()
         self.centerPos = QPoint()
         self.max_iter = 100
-
-    def timerEvent(self, event: QTimerEvent) -> None:
-        self.update()
+        # the deep zoom measures the view from origin, a point in fixed point with origin_bits fractional
+        # bits, c = origin + scale * (pixel - pan), the reference orbit is iterated from origin
+        self.deep_zoom = False
+        self.origin = (0, 0)
+        self.origin_bits = 64
+        # the texture of an export tile, see beginExport
+        self.export_tex = None
+        # tiles computed by NumPy in worker processes instead of fractal.comp, the processes start on first use
+        self.cpu_backend = False
+        self.cpu_renderer: CPUFractalRenderer = None
 
     def initializeGL(self) -> None:
         # initialize opengl pipeline
-        vertex_shader = VertexShader(None, "shaders/fractal.vert")
-        fragment_shader = FragmentShader(None, "shaders/fractal.frag")
-        self.program = Program([vertex_shader, fragment_shader])
-        vertex_shader.delete()
-        fragment_shader.delete()
-
-        compute_shader = ComputeShader(None, "shaders/fractal.comp")
-        self.compute_program = Program([compute_shader])
-        compute_shader.delete()
+        # both programs compile in the background, paintGL waits until they are linked
+        self.preprocessor = ShaderPreprocessor()
+        self.program_cache = ProgramCache()
+        self.program_batch = ProgramBatch(self.program_cache)
+        self.program_batch.submit("fractal display program", [
+            (VertexShader, self.preprocessor.load("shaders/fractal.vert")),
+            (FragmentShader, self.preprocessor.load("shaders/fractal.frag"))])
+        # edit shaders/fractal.comp or a file it includes while the demo runs,
+        # the program is rebuilt on the next frame
+        self.compute_program = ReloadableProgram(
+            [(ComputeShader, "shaders/fractal.comp")], "fractal compute program", self.preprocessor)
+        self.compute_program.sourceChanged.connect(lambda path: renderScheduler().invalidate(self))
+        self.perturbation_program = ReloadableProgram(
+            [(ComputeShader, "shaders/fractal.comp")], "fractal perturbation program", self.preprocessor,
+            {"PERTURBATION": True})
+        self.perturbation_program.sourceChanged.connect(lambda path: renderScheduler().invalidate(self))
+        self.reference = ReferenceOrbit()
+        # the view is refined over several frames, each frame computes what fits the GPU budget
+        self.progressive = ProgressiveRenderer()
 
         # initialize vao
         self.vao = VertexArrayObject()
+        self.profiler = GPUProfiler()
 
         # initialize imgui
         imgui.create_context()
         self.impl = PySide6Renderer(self)
 
     def paintGL(self) -> None:
-        self.compute_program.use()
-        loc = glGetUniformLocation(self.compute_program.program_id, "center")
-        glUniform2f(loc, self.panX, self.panY)
-        loc = glGetUniformLocation(self.compute_program.program_id, "scale")
-        glUniform1f(loc, self.scale)
-        loc = glGetUniformLocation(self.compute_program.program_id, "max_iter")
-        glUniform1i(loc, self.max_iter)
-        lsize = np.zeros(3, dtype=np.int32)
-        glGetProgramiv(self.compute_program.program_id,
-                       GL_COMPUTE_WORK_GROUP_SIZE, lsize)
-        ngroups = [0] * 3
-        ngroups[0] = int((self.width() + lsize[0]-1) / lsize[0])
-        ngroups[1] = int((self.height() + lsize[1]-1) / lsize[1])
-        ngroups[2] = 1
-        glDispatchCompute(ngroups[0], ngroups[1], ngroups[2])
-        glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
+        self.state = stateCache()
+        self.state.beginFrame()
+        if self.program_batch.poll():
+            self.program = self.program_batch["fractal display program"]
+        for compute_program in (self.compute_program, self.perturbation_program):
+            if compute_program.update():
+                self.view = None
+        compute_program = self.perturbation_program if self.deep_zoom else self.compute_program
+        if not self.cpu_backend and compute_program.error is not None and not compute_program.isReady() and \
+                not compute_program.isPending():
+            # e.g. ComputeShader refuses to build on macOS
+            print(f"{compute_program.name} is not available, the fractal is computed on the CPU")
+            self.setCPUBackend(True)
+        # nothing else asks for a frame while the programs are linking
+        if not self.program_batch.isDone() or self.compute_program.isPending() or \
+                self.perturbation_program.isPending():
+            renderScheduler().invalidate(self)
+        # the display program may have failed, its error was reported by the batch
+        if not self.program_batch.isReady("fractal display program") or \
+                not (self.cpu_backend or compute_program.isReady()):
+            glClear(GL_COLOR_BUFFER_BIT)
+            return
+        self.profiler.beginFrame()
+        self.profiler.begin("compute")
+        if self.cpu_backend:
+            self.updateCPU()
+        else:
+            regions = self.computeRegions()
+            if regions:
+                self.progressive.add(regions)
+            if self.progressive.pending():
+                self.dispatch(compute_program)
+                if self.progressive.pending():
+                    # the next frame refines the view further
+                    renderScheduler().invalidate(self)
+        self.profiler.end()
 
+        self.profiler.begin("display")
         self.program.use()
         loc = glGetUniformLocation(self.program.program_id, "u_Texture")
         glUniform1i(loc, 0)
@@ -77,8 +132,10 @@ class GLFractalWidget(QOpenGLWidget):
 
         self.vao.bind()
         glDrawArrays(GL_TRIANGLE_FAN, 0, 4)
+        self.profiler.end()
 
         # define imgui elements
+        self.profiler.begin("imgui")
         self.impl.process_inputs()
         imgui.new_frame()
 
@@ -89,21 +146,240 @@ class GLFractalWidget(QOpenGLWidget):
         imgui.text("Press the left mouse button and move to pan")
         imgui.text("Press the right mouse button and move to zoom")
         imgui.text("Use the mouse wheel to zoom")
+        # deeper zooms need more iterations to show any detail
         changed, iter = imgui.slider_int(
-            "Maximum Iterations", self.max_iter, 50, 1000)
+            "Maximum Iterations", self.max_iter, 50, 20000 if self.deep_zoom else 1000)
         self.max_iter = iter
+        cpu_changed, cpu_backend = imgui.checkbox("CPU backend (NumPy processes)", self.cpu_backend)
+        if cpu_changed:
+            self.setCPUBackend(cpu_backend)
+        deep_changed = False
+        if not self.cpu_backend:
+            deep_changed, deep_zoom = imgui.checkbox("Deep zoom (perturbation)", self.deep_zoom)
+            if deep_changed:
+                self.setDeepZoom(deep_zoom)
+        if changed or cpu_changed or deep_changed:
+            # the fractal of this frame was computed with the old value
+            renderScheduler().invalidate(self)
+        if self.deep_zoom:
+            imgui.text(f"pixel size: {self.scale:.3e}, reference orbit: {self.reference.length} iterations, "
+                       f"series skips {self.reference.series[0]}")
+        if self.cpu_backend:
+            imgui.text(f"{self.cpu_renderer.workers} processes, pending tiles: "
+                       f"{len(self.cpu_renderer.futures) + len(self.cpu_renderer.queue)}")
+        else:
+            _, self.progressive.budget_ms = imgui.slider_float(
+                "GPU Budget (ms)", self.progressive.budget_ms, 1.0, 33.0)
+            imgui.text(f"computed samples: {self.progressive.samples}, "
+                       f"pending tiles: {self.progressive.pendingTiles()}")
+        imgui.text(self.state.report())
+        imgui.text(self.program_cache.report())
+        if self.compute_program.error is not None:
+            imgui.text_colored(self.compute_program.error, 1.0, 0.3, 0.3)
         imgui.end()
+        imgui.set_next_window_position(1, 185, condition=imgui.FIRST_USE_EVER)
+        profilerPanel(self.profiler)
 
         # render imgui
         imgui.render()
         self.impl.render(imgui.get_draw_data())
+        # the imgui renderer binds its own program, vertex array and texture
+        self.state.invalidate()
+        self.profiler.endFrame()
+
+    def computeRegions(self) -> list[tuple[int, int, int, int]]:
+        # (x, y, width, height) rectangles of self.tex which the current view still needs,
+        # nothing when the view is unchanged, the exposed strips when it only moved by whole pixels
+        view = (self.panX, self.panY, self.scale, self.max_iter, self.deep_zoom, self.origin, self.cpu_backend)
+        width, height = self.tex.width, self.tex.height
+        previous, self.view = self.view, view
+        if previous is None or previous[2:] != view[2:]:
+            self.progressive.clear()
+            return [(0, 0, width, height)]
+        shift_x, shift_y = round(view[0] - previous[0]), round(view[1] - previous[1])
+        if abs(view[0] - previous[0] - shift_x) > 1e-3 or abs(view[1] - previous[1] - shift_y) > 1e-3 or \
+                abs(shift_x) >= width or abs(shift_y) >= height:
+            self.progressive.clear()
+            return [(0, 0, width, height)]
+        # the image stays where it was computed, so rounding never accumulates
+        self.view = (previous[0] + shift_x, previous[1] + shift_y) + view[2:]
+        if shift_x == 0 and shift_y == 0:
+            return []
+        # pixel p of the new image is pixel p - shift of the old one, glCopyImageSubData can not copy
+        # between overlapping rectangles of one image, so the pixels move into the other texture
+        kept_width, kept_height = width - abs(shift_x), height - abs(shift_y)
+        glCopyImageSubData(self.tex.tex_id, GL_TEXTURE_2D, 0, max(-shift_x, 0), max(-shift_y, 0), 0,
+                           self.back_tex.tex_id, GL_TEXTURE_2D, 0, max(shift_x, 0), max(shift_y, 0), 0,
+                           kept_width, kept_height, 1)
+        self.tex, self.back_tex = self.back_tex, self.tex
+        self.progressive.shift(shift_x, shift_y, width, height)
+        regions = []
+        if shift_x != 0:
+            regions.append((0 if shift_x > 0 else width + shift_x, 0, abs(shift_x), height))
+        if shift_y != 0:
+            regions.append((max(shift_x, 0), 0 if shift_y > 0 else height + shift_y, kept_width, abs(shift_y)))
+        return regions
+
+    def dispatch(self, compute_program: ReloadableProgram) -> None:
+        compute_program.use()
+        loc = glGetUniformLocation(compute_program.program_id, "center")
+        glUniform2f(loc, self.view[0], self.view[1])
+        loc = glGetUniformLocation(compute_program.program_id, "scale")
+        glUniform1f(loc, self.scale)
+        loc = glGetUniformLocation(compute_program.program_id, "max_iter")
+        glUniform1i(loc, self.max_iter)
+        if self.deep_zoom:
+            self.updateReference(compute_program, self.view[:2], self.scale, self.tex.width, self.tex.height)
+        lsize = np.zeros(3, dtype=np.int32)
+        glGetProgramiv(compute_program.program_id,
+                       GL_COMPUTE_WORK_GROUP_SIZE, lsize)
+        loc = glGetUniformLocation(compute_program.program_id, "grid_origin")
+        glUniform2i(loc, *self.progressive.grid)
+        origin = glGetUniformLocation(compute_program.program_id, "region_origin")
+        size = glGetUniformLocation(compute_program.program_id, "region_size")
+        step = glGetUniformLocation(compute_program.program_id, "step_shift")
+        coarser = glGetUniformLocation(compute_program.program_id, "coarser_shift")
+        self.tex.bingImage(0, 0, GL_WRITE_ONLY)
+        self.progressive.beginFrame()
+        for step_shift, coarser_shift, x, y, width, height, blocks_x, blocks_y in self.progressive.tiles():
+            glUniform2i(origin, x, y)
+            glUniform2i(size, width, height)
+            glUniform1i(step, step_shift)
+            glUniform1i(coarser, coarser_shift)
+            glDispatchCompute((blocks_x + lsize[0] - 1) // lsize[0], (blocks_y + lsize[1] - 1) // lsize[1], 1)
+        self.progressive.endFrame()
+        # sampled by the display program, copied by the next pan
+        glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT | GL_TEXTURE_FETCH_BARRIER_BIT |
+                        GL_TEXTURE_UPDATE_BARRIER_BIT)
+
+    def updateCPU(self) -> None:
+        pending = self.cpu_renderer.pending()
+        regions = self.computeRegions()
+        if regions and pending and regions != [(0, 0, self.tex.width, self.tex.height)]:
+            # the tiles still on their way belong to the image before the pan, start over
+            self.view = None
+            regions = self.computeRegions()
+        if regions:
+            self.cpu_renderer.submit(regions, self.view[:2], self.scale, self.max_iter)
+        for x, y, width, height in self.cpu_renderer.finished():
+            self.tex.uploadRegion(x, y, self.cpu_renderer.image[y:y + height, x:x + width])
+        if self.cpu_renderer.pending():
+            # nothing else asks for a frame while the processes work
+            renderScheduler().invalidate(self)
+
+    def beginExport(self, tile_width: int, tile_height: int) -> None:
+        compute_program = self.perturbation_program if self.deep_zoom else self.compute_program
+        if not self.program_batch.isReady("fractal display program") or not compute_program.isReady():
+            # e.g. the CPU backend took over because the compute shader failed
+            raise RuntimeError(compute_program.error or self.program_batch.errors.get(
+                "fractal display program", "the fractal programs are still linking"))
+        self.export_tex = Texture2D(1, GL_RGBA32F, tile_width, tile_height)
+
+    def exportTile(self, x: int, y: int, width: int, height: int, image_width: int, image_height: int) -> None:
+        # the tile at (x, y) of the view rendered at image size into the bound framebuffer, the view keeps
+        # its middle and its height, so the pixels get image_height / widget height times smaller
+        compute_program = self.perturbation_program if self.deep_zoom else self.compute_program
+        scale = self.scale * self.height() / image_height
+        middle_x = self.scale * (self.width() / 2.0 - self.panX)
+        middle_y = self.scale * (self.height() / 2.0 - self.panY)
+        center = (image_width / 2.0 - middle_x / scale - x, image_height / 2.0 - middle_y / scale - y)
+        compute_program.use()
+        loc = glGetUniformLocation(compute_program.program_id, "center")
+        glUniform2f(loc, *center)
+        loc = glGetUniformLocation(compute_program.program_id, "scale")
+        glUniform1f(loc, scale)
+        loc = glGetUniformLocation(compute_program.program_id, "max_iter")
+        glUniform1i(loc, self.max_iter)
+        loc = glGetUniformLocation(compute_program.program_id, "step_shift")
+        glUniform1i(loc, 0)
+        loc = glGetUniformLocation(compute_program.program_id, "coarser_shift")
+        glUniform1i(loc, -1)
+        loc = glGetUniformLocation(compute_program.program_id, "grid_origin")
+        glUniform2i(loc, 0, 0)
+        loc = glGetUniformLocation(compute_program.program_id, "region_origin")
+        glUniform2i(loc, 0, 0)
+        loc = glGetUniformLocation(compute_program.program_id, "region_size")
+        glUniform2i(loc, width, height)
+        if self.deep_zoom:
+            self.updateReference(compute_program, center, scale, width, height)
+        lsize = np.zeros(3, dtype=np.int32)
+        glGetProgramiv(compute_program.program_id, GL_COMPUTE_WORK_GROUP_SIZE, lsize)
+        self.export_tex.bingImage(0, 0, GL_WRITE_ONLY)
+        glDispatchCompute((width + lsize[0] - 1) // lsize[0], (height + lsize[1] - 1) // lsize[1], 1)
+        glMemoryBarrier(GL_TEXTURE_FETCH_BARRIER_BIT)
+        self.program.use()
+        loc = glGetUniformLocation(self.program.program_id, "u_Texture")
+        glUniform1i(loc, 0)
+        self.export_tex.bind(0)
+        self.vao.bind()
+        glDrawArrays(GL_TRIANGLE_FAN, 0, 4)
+
+    def endExport(self) -> None:
+        self.export_tex.delete()
+        self.export_tex = None
+
+    def setCPUBackend(self, cpu_backend: bool) -> None:
+        # the CPU iterates float32 like fractal.comp, it has no perturbation path
+        if cpu_backend:
+            self.setDeepZoom(False)
+            if self.cpu_renderer is None:
+                self.cpu_renderer = CPUFractalRenderer()
+                self.cpu_renderer.resize(self.tex.width, self.tex.height)
+        elif self.cpu_renderer is not None:
+            self.cpu_renderer.cancel()
+        self.cpu_backend = cpu_backend
+
+    def updateReference(self, compute_program: ReloadableProgram, center: tuple[float, float], scale: float,
+                        width: int, height: int) -> None:
+        # the series has to hold for the pixel of the width x height image farthest from the reference,
+        # the pixel at center, with pixels of scale, an export renders smaller pixels than the view
+        radius = float(np.hypot(max(center[0], width - center[0]), max(center[1], height - center[1])))
+        self.reference.update(*self.origin, self.origin_bits, scale, self.max_iter, radius)
+        self.reference.bind()
+        skip, a, b, c = self.reference.series
+        loc = glGetUniformLocation(compute_program.program_id, "orbit_length")
+        glUniform1i(loc, self.reference.length)
+        loc = glGetUniformLocation(compute_program.program_id, "skip")
+        glUniform1i(loc, skip)
+        for name, value in (("series_a", a), ("series_b", b), ("series_c", c)):
+            loc = glGetUniformLocation(compute_program.program_id, name)
+            glUniform2f(loc, value.real, value.imag)
+
+    def setDeepZoom(self, deep_zoom: bool) -> None:
+        if deep_zoom:
+            self.origin = (0, 0)
+            self.origin_bits = 64
+            self.deep_zoom = True
+            self.recenter()
+        else:
+            # fold the origin back into the pan, as far as a double can hold it
+            one = 1 << self.origin_bits
+            self.panX -= self.origin[0] / one / self.scale
+            self.panY -= self.origin[1] / one / self.scale
+            self.origin = (0, 0)
+            self.deep_zoom = False
+
+    def recenter(self) -> None:
+        # moves the origin to the middle of the view with enough bits for the scale,
+        # the reference orbit is iterated from there
+        bits = max(self.origin_bits, precisionBits(self.scale))
+        x, y = (value << (bits - self.origin_bits) for value in self.origin)
+        middle_x, middle_y = self.width() / 2.0, self.height() / 2.0
+        self.origin = (x + toFixed(self.scale * (middle_x - self.panX), bits),
+                       y + toFixed(self.scale * (middle_y - self.panY), bits))
+        self.origin_bits = bits
+        self.panX, self.panY = middle_x, middle_y
 
     def resizeGL(self, w: int, h: int) -> None:
         self.makeCurrent()
-        if self.tex is not None:
-            self.tex.delete()
+        for tex in (self.tex, self.back_tex):
+            if tex is not None:
+                tex.delete()
         self.tex = Texture2D(1, GL_RGBA32F, w, h)
-        self.tex.bingImage(0, 0, GL_WRITE_ONLY)
+        self.back_tex = Texture2D(1, GL_RGBA32F, w, h)
+        self.view = None
+        if self.cpu_renderer is not None:
+            self.cpu_renderer.resize(w, h)
         glViewport(0, 0, w, h)
         if not self.size_changed:
             self.panX = w * 0.75
@@ -128,14 +404,25 @@ class GLFractalWidget(QOpenGLWidget):
         elif button & Qt.LeftButton:
             self.panX += deltaX
             self.panY -= deltaY
+            self.checkOrigin()
         self.lastPos = event.position()
 
     def zoom(self, delta: float) -> None:
         cx = self.scale * (self.centerPos.x() - self.panX)
         cy = self.scale * (self.centerPos.y() - self.panY)
         self.scale *= pow(1.01, delta)
+        if self.deep_zoom:
+            self.scale = max(self.scale, MIN_SCALE)
         self.panX = (self.scale * self.centerPos.x() - cx) / self.scale
         self.panY = (self.scale * self.centerPos.y() - cy) / self.scale
+        self.checkOrigin()
+
+    def checkOrigin(self) -> None:
+        # the origin is the pixel at the pan, its orbit is reused while it stays in the view and precise enough,
+        # farther away the pixels' offsets from it grow and the series skips fewer iterations
+        if self.deep_zoom and not (0.0 <= self.panX <= self.width() and 0.0 <= self.panY <= self.height() and
+                                   hasPrecision(self.scale, self.origin_bits)):
+            self.recenter()
 
     def wheelEvent(self, event: QWheelEvent) -> None:
         self.centerPos = QPoint(event.pixelDelta().x(),
@@ -144,11 +431,20 @@ class GLFractalWidget(QOpenGLWidget):
 
     def closeEvent(self, event: QCloseEvent) -> None:
         self.makeCurrent()
+        self.profiler.delete()
         self.vao.delete()
-        self.program.delete()
+        self.program_batch.delete()
+        if self.program_batch.isReady("fractal display program"):
+            self.program.delete()
         self.compute_program.delete()
-        if self.tex is not None:
-            self.tex.delete()
+        self.perturbation_program.delete()
+        self.reference.delete()
+        self.progressive.delete()
+        if self.cpu_renderer is not None:
+            self.cpu_renderer.delete()
+        for tex in (self.tex, self.back_tex, self.export_tex):
+            if tex is not None:
+                tex.delete()
         return super().closeEvent(event)
 
 
@@ -0,0 +1,134 @@
+# refer to http://www.libpng.org/pub/png/spec/1.2/PNG-Contents.html
+# refer to https://www.itu.int/itudoc/itu-t/com16/tiff-fx/docs/tiff6.pdf
+# 8 bit RGB image files written row by row from the top, so an image larger than the memory can be saved
+# band by band. PNG deflates the rows as they come, TIFF stores them uncompressed and indexes them at the end
+import os
+import struct
+import zlib
+
+import numpy as np
+
+TIFF_SHORT = 3
+TIFF_LONG = 4
+
+
+class ImageWriter:
+    def __init__(self, file_path: str, width: int, height: int) -> None:
+        if width < 1 or height < 1:
+            raise ValueError("an image of %dx%d pixels can not be saved" % (width, height))
+        self.file_path = file_path
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.file = open(file_path, "wb")
+
+    def writeRows(self, rows: np.ndarray) -> None:
+        # (count, width, 3) uint8 rows, the first is the top row of the band
+        if rows.ndim != 3 or rows.shape[1:] != (self.width, 3):
+            raise ValueError("rows of shape %s do not fit an image %d pixels wide" % (rows.shape, self.width))
+        if self.rows + len(rows) > self.height:
+            raise ValueError("the image has only %d rows" % self.height)
+        self.write(np.ascontiguousarray(rows, dtype=np.uint8))
+        self.rows += len(rows)
+
+    def write(self, rows: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        if self.rows != self.height:
+            self.abort()
+            raise ValueError("%d of %d rows were written" % (self.rows, self.height))
+        self.finish()
+        self.file.close()
+
+    def finish(self) -> None:
+        raise NotImplementedError
+
+    def abort(self) -> None:
+        # closes and removes the incomplete file
+        self.file.close()
+        os.remove(self.file_path)
+
+
+class PNGWriter(ImageWriter):
+    def __init__(self, file_path: str, width: int, height: int, level: int = 6) -> None:
+        super().__init__(file_path, width, height)
+        self.compressor = zlib.compressobj(level)
+        # the Up filter stores every row as its difference to the row above
+        self.previous = np.zeros((width * 3,), dtype=np.uint8)
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bit truecolor, deflate, adaptive filtering, no interlace
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def chunk(self, kind: bytes, data: bytes) -> None:
+        crc = zlib.crc32(data, zlib.crc32(kind))
+        self.file.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc))
+
+    def write(self, rows: np.ndarray) -> None:
+        rows = rows.reshape(len(rows), -1)
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        # uint8 arithmetic wraps modulo 256 as the filter requires
+        filtered[0, 1:] = rows[0] - self.previous
+        filtered[1:, 1:] = rows[1:] - rows[:-1]
+        self.previous = rows[-1].copy()
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.chunk(b"IDAT", data)
+
+    def finish(self) -> None:
+        self.chunk(b"IDAT", self.compressor.flush())
+        self.chunk(b"IEND", b"")
+
+
+class TIFFWriter(ImageWriter):
+    # baseline TIFF with one strip per row, the offsets are 32 bit, so the pixels have to stay below 4 GiB,
+    # e.g. 32768x32768 RGB are 3 GiB
+    def __init__(self, file_path: str, width: int, height: int) -> None:
+        row_size = width * 3
+        # header, pixels and the two strip tables at the end
+        if 8 + row_size * height + 8 * height + 256 > 1 << 32:
+            raise ValueError("%dx%d pixels are too large for a TIFF file, save it as PNG" % (width, height))
+        super().__init__(file_path, width, height)
+        self.row_size = row_size
+        # little endian, the offset of the first IFD is written by finish()
+        self.file.write(b"II*\x00" + struct.pack("<I", 0))
+
+    def write(self, rows: np.ndarray) -> None:
+        self.file.write(rows.tobytes())
+
+    def finish(self) -> None:
+        offsets = 8 + np.arange(self.height, dtype=np.uint64) * self.row_size
+        entries = [(256, TIFF_LONG, [self.width]), (257, TIFF_LONG, [self.height]),
+                   (258, TIFF_SHORT, [8, 8, 8]), (259, TIFF_SHORT, [1]), (262, TIFF_SHORT, [2]),
+                   (273, TIFF_LONG, offsets), (277, TIFF_SHORT, [3]), (278, TIFF_LONG, [1]),
+                   (279, TIFF_LONG, np.full(self.height, self.row_size)), (284, TIFF_SHORT, [1])]
+        # the IFD starts on a word boundary, the values which do not fit into an entry follow it
+        if self.file.tell() % 2:
+            self.file.write(b"\x00")
+        ifd = self.file.tell()
+        values_offset = ifd + 2 + 12 * len(entries) + 4
+        table = [struct.pack("<H", len(entries))]
+        values = []
+        for tag, kind, data in entries:
+            packed = np.asarray(data, dtype="<u2" if kind == TIFF_SHORT else "<u4").tobytes()
+            if len(packed) <= 4:
+                table.append(struct.pack("<HHI", tag, kind, len(data)) + packed.ljust(4, b"\x00"))
+            else:
+                table.append(struct.pack("<HHII", tag, kind, len(data), values_offset))
+                values.append(packed)
+                values_offset += len(packed)
+        table.append(struct.pack("<I", 0))
+        self.file.write(b"".join(table + values))
+        self.file.seek(4)
+        self.file.write(struct.pack("<I", ifd))
+
+
+def openImageWriter(file_path: str, width: int, height: int) -> ImageWriter:
+    # picks the format by the extension
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".png":
+        return PNGWriter(file_path, width, height)
+    if extension in (".tif", ".tiff"):
+        return TIFFWriter(file_path, width, height)
+    raise ValueError("unknown image format %s, save as .png, .tif or .tiff" % extension)
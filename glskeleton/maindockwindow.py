@@ -10,6 +10,7 @@ from gltessellationwidget import GLTessellationWidget
 from glcubewidget import GLCubeWidget
 from glfractalwidget import GLFractalWidget
 from about import AboutDialog
+from exporter import TiledExporter
 
 
 class MainDockWindow(QMainWindow):
@@ -19,6 +20,11 @@ class MainDockWindow(QMainWindow):
         self.icons_path = os.path.abspath(
             os.path.dirname(__file__)) + '/images/'
         self.filters = "Any File (*)"
+        self.image_filters = "PNG Image (*.png);;TIFF Image (*.tif *.tiff)"
+        # Save exports the current demo again with the file and size of the last Save As
+        self.export_path = None
+        self.export_size = None
+        self.exporter = None
         self.tess_widget = GLTessellationWidget()
         self.cube_widget = GLCubeWidget()
         self.fractal_widget = GLFractalWidget()
@@ -40,6 +46,18 @@ class MainDockWindow(QMainWindow):
         self.create_dockWidget()
         self.create_tabWidget()
         self.statusBar().showMessage('Ready', 10000)
+        self.create_export_progress()
+
+    def create_export_progress(self) -> None:
+        # shown in the status bar while a demo is exported
+        self.export_bar = QProgressBar()
+        self.export_bar.setMaximumWidth(200)
+        self.export_bar.hide()
+        self.cancel_export_button = QPushButton("Cancel")
+        self.cancel_export_button.clicked.connect(self.cancel_export)
+        self.cancel_export_button.hide()
+        self.statusBar().addPermanentWidget(self.export_bar)
+        self.statusBar().addPermanentWidget(self.cancel_export_button)
 
     def create_tabWidget(self) -> None:
         self.tabs = QTabWidget(self)
@@ -118,11 +136,11 @@ class MainDockWindow(QMainWindow):
                                    triggered=self.open_file)
         self.save_action = QAction(QIcon(self.icons_path + 'save.png'), 'Save',
                                    self, shortcut=QKeySequence.Save,
-                                   statusTip="Save to a file",
+                                   statusTip="Export the current demo again to the last image file",
                                    triggered=self.save_file)
         self.saveas_action = QAction(QIcon(self.icons_path + 'saveas.png'), 'Save As',
                                      self, shortcut=QKeySequence.SaveAs,
-                                     statusTip="Save to a file",
+                                     statusTip="Export the current demo to an image file of any size",
                                      triggered=self.saveas_file)
         self.undo_action = QAction(QIcon(self.icons_path + 'undo.png'), 'Undo',
                                    self, shortcut=QKeySequence.Undo,
@@ -143,10 +161,67 @@ class MainDockWindow(QMainWindow):
                                                                        filter=self.filters)
 
     def save_file(self) -> None:
-        pass
+        if self.export_path is None:
+            self.saveas_file()
+            return
+        self.export_demo(self.export_path, *self.export_size)
 
     def saveas_file(self) -> None:
-        pass
+        widget = self.tabs.currentWidget()
+        if not hasattr(widget, "exportTile"):
+            self.statusBar().showMessage(f"{self.tabs.tabText(self.tabs.currentIndex())} can not be exported", 10000)
+            return
+        size, ok = QInputDialog.getText(self, "Export size", "Width x height in pixels:",
+                                        text=f"{widget.width() * 4}x{widget.height() * 4}")
+        if not ok:
+            return
+        try:
+            width, height = (int(part) for part in size.lower().split("x"))
+        except ValueError:
+            self.statusBar().showMessage(f"{size} is not a size like 7680x4320", 10000)
+            return
+        file_name, filter_name = QFileDialog.getSaveFileName(self, caption="Export image", filter=self.image_filters)
+        if not file_name:
+            return
+        if not os.path.splitext(file_name)[1]:
+            file_name += ".png" if filter_name.startswith("PNG") else ".tif"
+        self.export_path = file_name
+        self.export_size = (width, height)
+        self.export_demo(file_name, width, height)
+
+    def export_demo(self, file_name: str, width: int, height: int) -> None:
+        widget = self.tabs.currentWidget()
+        if self.exporter is not None:
+            self.statusBar().showMessage("Wait for the running export or cancel it", 10000)
+            return
+        if not hasattr(widget, "exportTile"):
+            self.statusBar().showMessage(f"{self.tabs.tabText(self.tabs.currentIndex())} can not be exported", 10000)
+            return
+        self.exporter = TiledExporter(widget, file_name, width, height)
+        self.exporter.progress.connect(
+            lambda written, tiles: self.export_progress(file_name, written, tiles))
+        self.exporter.finished.connect(lambda path: self.export_done(f"Saved {path}"))
+        self.exporter.failed.connect(lambda error: self.export_done(f"Export of {file_name} failed: {error}"))
+        self.export_bar.setValue(0)
+        self.export_bar.show()
+        self.cancel_export_button.show()
+        self.exporter.start()
+
+    def export_progress(self, file_name: str, written: int, tiles: int) -> None:
+        self.export_bar.setMaximum(tiles)
+        self.export_bar.setValue(written)
+        self.statusBar().showMessage(f"Exporting {file_name}: {written}/{tiles} tiles")
+
+    def export_done(self, message: str) -> None:
+        self.export_bar.hide()
+        self.cancel_export_button.hide()
+        self.exporter.deleteLater()
+        self.exporter = None
+        self.statusBar().showMessage(message, 10000)
+
+    def cancel_export(self) -> None:
+        if self.exporter is not None:
+            self.exporter.cancel()
 
     def edit_undo(self) -> None:
         pass
@@ -0,0 +1,21 @@
+import imgui
+
+from py3gl4.profiler import GPUProfiler
+
+
+def profilerPanel(profiler: GPUProfiler, trace_path: str = "trace.json") -> None:
+    # an imgui window with the mean times of every scope and a rolling histogram of its GPU time,
+    # call between imgui.new_frame() and imgui.render()
+    imgui.set_next_window_size(320, 300, condition=imgui.FIRST_USE_EVER)
+    imgui.begin("Profiler")
+    for path, depth in profiler.scopes():
+        cpu, gpu = profiler.samples(path)
+        imgui.text(f"{'  ' * depth}{path.rsplit('/', 1)[-1]}: cpu {cpu.mean():.2f} ms, gpu {gpu.mean():.2f} ms")
+        imgui.plot_histogram(f"##{path}", gpu, scale_min=0.0, scale_max=max(float(gpu.max()), 0.001),
+                             graph_size=(0, 32))
+    if profiler.dropped:
+        imgui.text(f"{profiler.dropped} frame(s) dropped while the GPU was behind")
+    if imgui.button("Export Chrome trace"):
+        profiler.exportChromeTrace(trace_path)
+        print(f"profiler: wrote {trace_path}")
+    imgui.end()
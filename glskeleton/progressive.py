@@ -0,0 +1,132 @@
+# refer to https://www.khronos.org/opengl/wiki/Query_Object#Timer_queries
+# Progressive rendering of an image computed by a compute shader: every region is cut into tiles and refined
+# coarse to fine, first one pixel per 8x8 block fills its block, then per 4x4, 2x2 and finally every pixel.
+# Each frame dispatches only the tiles which fit a GPU time budget, so an expensive view never stalls the
+# frame, and the coarse image of the whole view comes before any detail. The cost of a sample is learned
+# from GL_TIME_ELAPSED queries of earlier frames, read without waiting for the GPU
+from collections import deque
+
+from OpenGL.GL import glCreateQueries, glDeleteQueries, glBeginQuery, glEndQuery, glGetQueryObjectiv, \
+    glGetQueryObjectui64v, GL_TIME_ELAPSED, GL_QUERY_RESULT, GL_QUERY_RESULT_AVAILABLE
+import numpy as np
+
+# log2 of the block sizes from coarse to fine, 8x8, 4x4, 2x2 and 1x1 pixels
+STEP_SHIFTS = (3, 2, 1, 0)
+
+
+def blocks(start: int, size: int, grid: int, shift: int) -> tuple[int, int]:
+    # (first block, block count) of the blocks of 1 << shift pixels anchored at grid which cover size pixels
+    # from start, >> floors, so pixels left of the grid belong to negative blocks
+    first = (start - grid) >> shift
+    return first, ((start + size - 1 - grid) >> shift) - first + 1
+
+
+class ProgressiveRenderer:
+    def __init__(self, budget_ms: float = 4.0, tile_size: int = 128) -> None:
+        self.budget_ms = budget_ms
+        self.tile_size = tile_size
+        # pending (x, y, width, height) tiles of every step, coarse first
+        self.levels: list[deque] = [deque() for _ in STEP_SHIFTS]
+        # the blocks of every step are anchored here, it moves with the image when it is shifted,
+        # so a finer step can skip the pixels which a coarser step already computed
+        self.grid = (0, 0)
+        # learned GPU time of one sample, None until the first query came back
+        self.ns_per_sample: float = None
+        # (query, samples) of the frames in flight, oldest first
+        self.in_flight: deque = deque()
+        self.free_queries: list[int] = []
+        self.samples = 0
+
+    def pending(self) -> bool:
+        return any(self.levels)
+
+    def pendingTiles(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def clear(self) -> None:
+        for level in self.levels:
+            level.clear()
+
+    def add(self, regions: list[tuple[int, int, int, int]]) -> None:
+        # regions which have to be computed from scratch, at every step, a tile of a coarser step covers
+        # more pixels, so every tile holds about tile_size * tile_size samples
+        for level, shift in zip(self.levels, STEP_SHIFTS):
+            size = self.tile_size << shift
+            for x, y, width, height in regions:
+                for tile_y in range(y, y + height, size):
+                    for tile_x in range(x, x + width, size):
+                        level.append((tile_x, tile_y, min(size, x + width - tile_x), min(size, y + height - tile_y)))
+
+    def shift(self, shift_x: int, shift_y: int, width: int, height: int) -> None:
+        # the image moved by whole pixels, the pending tiles move along and lose what left the image
+        for level in self.levels:
+            tiles = list(level)
+            level.clear()
+            for x, y, tile_width, tile_height in tiles:
+                left, bottom = max(x + shift_x, 0), max(y + shift_y, 0)
+                right = min(x + shift_x + tile_width, width)
+                top = min(y + shift_y + tile_height, height)
+                if left < right and bottom < top:
+                    level.append((left, bottom, right - left, top - bottom))
+        # every block size divides 8, the anchor only matters modulo the largest block
+        size = 1 << STEP_SHIFTS[0]
+        self.grid = ((self.grid[0] + shift_x) % size, (self.grid[1] + shift_y) % size)
+
+    def tiles(self):
+        # yields (step shift, coarser step shift or -1, x, y, width, height, group count x, group count y)
+        # of the tiles of this frame, group counts are in blocks, at least one tile per frame
+        spent = 0.0
+        budget = self.budget_ms * 1000000.0
+        for index, level in enumerate(self.levels):
+            shift = STEP_SHIFTS[index]
+            coarser = STEP_SHIFTS[index - 1] if index > 0 else -1
+            while level:
+                x, y, width, height = level[0]
+                _, count_x = blocks(x, width, self.grid[0], shift)
+                _, count_y = blocks(y, height, self.grid[1], shift)
+                cost = count_x * count_y * (self.ns_per_sample or 0.0)
+                if spent > 0.0 and (spent + cost > budget or self.ns_per_sample is None):
+                    return
+                level.popleft()
+                spent += max(cost, 1.0)
+                self.samples += count_x * count_y
+                yield shift, coarser, x, y, width, height, count_x, count_y
+
+    def beginFrame(self) -> None:
+        # wraps the dispatches of tiles() in a timer query
+        self.collect()
+        if not self.free_queries:
+            query = np.zeros(1, dtype=np.uint32)
+            glCreateQueries(GL_TIME_ELAPSED, 1, query)
+            self.free_queries.append(int(query[0]))
+        self.query = self.free_queries.pop()
+        self.samples = 0
+        glBeginQuery(GL_TIME_ELAPSED, self.query)
+
+    def endFrame(self) -> None:
+        glEndQuery(GL_TIME_ELAPSED)
+        self.in_flight.append((self.query, self.samples))
+
+    def collect(self) -> None:
+        # reads the queries which finished, the estimate follows the cost of the latest frames
+        available = np.zeros(1, dtype=np.int32)
+        elapsed = np.zeros(1, dtype=np.uint64)
+        while self.in_flight:
+            query, samples = self.in_flight[0]
+            glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, available)
+            if not available[0]:
+                return
+            self.in_flight.popleft()
+            self.free_queries.append(query)
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, elapsed)
+            if samples == 0:
+                continue
+            cost = float(elapsed[0]) / samples
+            self.ns_per_sample = cost if self.ns_per_sample is None else 0.5 * (self.ns_per_sample + cost)
+
+    def delete(self) -> None:
+        queries = self.free_queries + [query for query, _ in self.in_flight]
+        if queries:
+            glDeleteQueries(len(queries), np.array(queries, dtype=np.uint32))
+        self.free_queries = []
+        self.in_flight.clear()
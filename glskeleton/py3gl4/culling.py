@@ -0,0 +1,134 @@
+# refer to https://www.khronos.org/opengl/wiki/Compute_Shader
+# refer to https://www.khronos.org/opengl/wiki/Atomic_Counter
+# refer to https://www.khronos.org/opengl/wiki/Vertex_Rendering#Indirect_rendering
+# Many instances of one mesh are culled on the GPU: shaders/cull.comp tests the bounding sphere of every
+# object against the frustum and optionally a depth pyramid, appends the visible model matrices to an
+# instance buffer and counts them with an atomic counter placed on the instanceCount of the indirect
+# command, glDrawElementsIndirect then draws exactly the visible ones without the CPU reading anything back
+from ctypes import c_uint
+
+from OpenGL.GL import glNamedBufferStorage, glBindBuffer, glBindBufferBase, glBindBufferRange, \
+    glDispatchCompute, glMemoryBarrier, glDrawElementsIndirect, glGetProgramiv, glBlitNamedFramebuffer, \
+    GL_SHADER_STORAGE_BUFFER, GL_DRAW_INDIRECT_BUFFER, GL_UNSIGNED_INT, GL_TRIANGLES, GL_COMMAND_BARRIER_BIT, \
+    GL_VERTEX_ATTRIB_ARRAY_BARRIER_BIT, GL_SHADER_IMAGE_ACCESS_BARRIER_BIT, GL_TEXTURE_FETCH_BARRIER_BIT, GL_COMPUTE_WORK_GROUP_SIZE, \
+    GL_DEPTH24_STENCIL8, GL_R32F, GL_DEPTH_ATTACHMENT, GL_DEPTH_BUFFER_BIT, GL_NEAREST, \
+    GL_NEAREST_MIPMAP_NEAREST, GL_READ_ONLY, GL_WRITE_ONLY, GL_FLOAT_VEC4, GL_INT, GL_BOOL
+import numpy as np
+
+from py3gl4.program import Program
+from py3gl4.uniform import Uniform
+from py3gl4.vertexbufferobject import VertexBufferObject
+from py3gl4.storagebuffer import AtomicCounterBuffer
+from py3gl4.texture import Texture2D
+from py3gl4.framebuffer import Framebuffer
+from py3gl4.meshpool import DRAW_ELEMENTS_INDIRECT_COMMAND
+from py3gl4.textureformat import mipLevels
+
+# binding points used by shaders/cull.comp and shaders/depthpyramid.comp
+OBJECTS_BINDING = 2
+VISIBLE_BINDING = 3
+COUNTER_BINDING = 0
+PYRAMID_UNIT = 1
+MATRIX_SIZE = 64
+
+
+class DepthPyramid:
+    # the depth of a framebuffer reduced to a full mipmap chain of farthest depths, build it after
+    # the occluders were drawn and pass it to GPUCuller.cull for the objects drawn later
+    def __init__(self, program: Program, width: int, height: int) -> None:
+        # program is linked from shaders/depthpyramid.comp
+        self.program = program
+        self.program.addUniform(Uniform("level", GL_INT))
+        self.width = width
+        self.height = height
+        # renderbuffers can not be sampled, the depth is blitted into a texture of the same format
+        self.depth = Texture2D(1, GL_DEPTH24_STENCIL8, width, height)
+        self.depth.SetFiltering(GL_NEAREST, GL_NEAREST)
+        self.depth_fbo = Framebuffer()
+        self.depth_fbo.attachTexture2D(GL_DEPTH_ATTACHMENT, self.depth, 0)
+        self.texture = Texture2D(mipLevels(width, height), GL_R32F, width, height)
+        self.texture.SetFiltering(GL_NEAREST_MIPMAP_NEAREST, GL_NEAREST)
+
+    def build(self, framebuffer: Framebuffer) -> None:
+        # framebuffer has a GL_DEPTH24_STENCIL8 depth attachment of the size of the pyramid
+        glBlitNamedFramebuffer(framebuffer.fbo_id, self.depth_fbo.fbo_id, 0, 0, self.width, self.height,
+                               0, 0, self.width, self.height, GL_DEPTH_BUFFER_BIT, GL_NEAREST)
+        self.program.use()
+        self.depth.bind(PYRAMID_UNIT)
+        width, height = self.width, self.height
+        for level in range(self.texture.levels):
+            self.program.uniforms["level"].setInt(level)
+            if level > 0:
+                self.texture.bingImage(0, level - 1, GL_READ_ONLY)
+            self.texture.bingImage(1, level, GL_WRITE_ONLY)
+            glDispatchCompute((width + 7) // 8, (height + 7) // 8, 1)
+            glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
+            width, height = max(width // 2, 1), max(height // 2, 1)
+        glMemoryBarrier(GL_TEXTURE_FETCH_BARRIER_BIT)
+
+    def matches(self, width: int, height: int) -> bool:
+        # the pyramid only describes a viewport which covers the whole depth attachment
+        return (width, height) == (self.width, self.height)
+
+    def delete(self) -> None:
+        self.depth_fbo.delete()
+        self.depth.delete()
+        self.texture.delete()
+
+
+class GPUCuller:
+    # culls up to capacity instances of the mesh drawn by (index_count, first_index, base_vertex),
+    # visible is a vertex buffer of visible model matrices for the per-instance attributes of the VAO,
+    # one culler per pass, so a later pass never overwrites what an earlier draw still reads
+    def __init__(self, program: Program, capacity: int, index_count: int, first_index: int = 0,
+                 base_vertex: int = 0, bounding_sphere: tuple = (0.0, 0.0, 0.0, 1.0)) -> None:
+        # program is linked from shaders/cull.comp, bounding_sphere is (x, y, z, radius) in model space
+        self.program = program
+        for uniform in (Uniform("objectCount", GL_INT), Uniform("planes", GL_FLOAT_VEC4),
+                        Uniform("boundingSphere", GL_FLOAT_VEC4), Uniform("occlusion", GL_BOOL)):
+            self.program.addUniform(uniform)
+        self.capacity = capacity
+        self.bounding_sphere = bounding_sphere
+        work_group_size = np.zeros(3, dtype=np.int32)
+        glGetProgramiv(self.program.program_id, GL_COMPUTE_WORK_GROUP_SIZE, work_group_size)
+        self.work_group_size = int(work_group_size[0])
+        # the draw command is also the counter buffer, its instanceCount is the counter at offset 4
+        self.command = AtomicCounterBuffer(data=np.array(
+            [(index_count, 0, first_index, base_vertex, 0)], dtype=DRAW_ELEMENTS_INDIRECT_COMMAND))
+        # written and read by the GPU only
+        self.visible = VertexBufferObject()
+        glNamedBufferStorage(self.visible.vbo_id, capacity * MATRIX_SIZE, None, 0)
+
+    def cull(self, objects_id: c_uint, offset: int, count: int, planes: np.ndarray,
+             pyramid: DepthPyramid = None) -> None:
+        # objects_id is a buffer of count column-major model matrices starting at offset, e.g. a segment of
+        # a StreamingVertexBuffer, planes come from Camera.frustumPlanes, the Camera block must be bound
+        if count > self.capacity:
+            raise ValueError("%d objects exceed the %d objects of the culler" % (count, self.capacity))
+        # instanceCount starts at 0, cleared on the GPU
+        self.command.clear(0, 4, 4)
+        if count == 0:
+            return
+        self.program.use()
+        self.program.uniforms["objectCount"].setInt(count)
+        self.program.uniforms["planes"].setVec4List(np.ascontiguousarray(planes, dtype=np.float32))
+        self.program.uniforms["boundingSphere"].setVec4(*self.bounding_sphere)
+        self.program.uniforms["occlusion"].setBool(pyramid is not None)
+        if pyramid is not None:
+            pyramid.texture.bind(PYRAMID_UNIT)
+        glBindBufferRange(GL_SHADER_STORAGE_BUFFER, OBJECTS_BINDING, objects_id, offset, count * MATRIX_SIZE)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER, VISIBLE_BINDING, self.visible.vbo_id)
+        self.command.bindBase(COUNTER_BINDING)
+        glDispatchCompute((count + self.work_group_size - 1) // self.work_group_size, 1, 1)
+        # the draw reads the count as a command and the matrices as vertex attributes
+        glMemoryBarrier(GL_COMMAND_BARRIER_BIT | GL_VERTEX_ATTRIB_ARRAY_BARRIER_BIT)
+
+    def draw(self, mode: int = GL_TRIANGLES) -> None:
+        # the VAO of the mesh is bound and reads its instance attributes from self.visible
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, self.command.buffer_id)
+        glDrawElementsIndirect(mode, GL_UNSIGNED_INT, None)
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, 0)
+
+    def delete(self) -> None:
+        self.command.delete()
+        self.visible.delete()
@@ -0,0 +1,15 @@
+# refer to https://www.khronos.org/opengl/wiki/OpenGL_Extension
+from functools import lru_cache
+
+from OpenGL.GL import glGetIntegerv, glGetStringi, GL_NUM_EXTENSIONS, GL_EXTENSIONS
+
+
+@lru_cache(maxsize=None)
+def supportedExtensions() -> frozenset[str]:
+    # requires a current context, all contexts of this application are created by the same driver
+    count = int(glGetIntegerv(GL_NUM_EXTENSIONS))
+    return frozenset(glGetStringi(GL_EXTENSIONS, i).decode() for i in range(count))
+
+
+def hasExtension(name: str) -> bool:
+    return name in supportedExtensions()
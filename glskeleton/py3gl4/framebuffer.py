@@ -1,11 +1,12 @@
 # refer to https://registry.khronos.org/OpenGL/specs/gl/glspec46.core.pdf
 from ctypes import c_uint, c_int
 
-from OpenGL.GL import glCreateFramebuffers, glBindFramebuffer, GL_FRAMEBUFFER, glIsFramebuffer, \
+from OpenGL.GL import glCreateFramebuffers, GL_FRAMEBUFFER, glIsFramebuffer, \
     glDeleteFramebuffers, glNamedFramebufferTexture, glNamedFramebufferRenderbuffer
 
 from py3gl4.texture import Texture2D
 from py3gl4.renderbuffer import Renderbuffer
+from py3gl4.statecache import stateCache
 
 
 class Framebuffer:
@@ -14,14 +15,15 @@ class Framebuffer:
         glCreateFramebuffers(1, self.fbo_id)
 
     def bind(self) -> None:
-        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo_id)
+        stateCache().bindFramebuffer(GL_FRAMEBUFFER, self.fbo_id)
 
     def unbind(self) -> None:
-        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        stateCache().bindFramebuffer(GL_FRAMEBUFFER, 0)
 
     def delete(self) -> None:
         if glIsFramebuffer(self.fbo_id):
             glDeleteFramebuffers(1, self.fbo_id)
+            stateCache().invalidate()
 
     def attachTexture2D(self, attachment: c_uint, texture: Texture2D,	level: c_int) -> None:
         glNamedFramebufferTexture(
@@ -0,0 +1,114 @@
+# refer to https://www.khronos.org/opengl/wiki/Vertex_Rendering#Indirect_rendering
+# refer to https://www.khronos.org/opengl/wiki/Built-in_Variable_(GLSL)#Vertex_shader_inputs
+# Many meshes with the same vertex format share one vertex buffer, one element buffer and one VAO,
+# a scene is one array of DrawElementsIndirectCommand drawn by a single glMultiDrawElementsIndirect,
+# each draw finds its own data, e.g. its model matrix, at gl_DrawID in a shader storage buffer
+from ctypes import c_void_p
+
+from OpenGL.GL import glNamedBufferSubData, glMultiDrawElementsIndirect, GL_DRAW_INDIRECT_BUFFER, \
+    GL_SHADER_STORAGE_BUFFER, GL_TRIANGLES, GL_UNSIGNED_INT
+import numpy as np
+
+from py3gl4.vertexarrayobject import VertexArrayObject, VertexAttribute
+from py3gl4.vertexbufferobject import VertexBufferObject
+from py3gl4.elementbufferobject import ElementBufferObject
+from py3gl4.streamingbuffer import StreamingBuffer
+
+# the layout glMultiDrawElementsIndirect reads, 20 bytes per command
+DRAW_ELEMENTS_INDIRECT_COMMAND = np.dtype([
+    ("count", np.uint32),
+    ("instanceCount", np.uint32),
+    ("firstIndex", np.uint32),
+    ("baseVertex", np.int32),
+    ("baseInstance", np.uint32)])
+# the shader storage binding point of the per-draw data, see shaders/drawdata.glsl
+DRAW_DATA_BINDING = 1
+
+
+class Mesh:
+    def __init__(self, name: str, base_vertex: int, vertex_count: int, first_index: int, index_count: int) -> None:
+        self.name = name
+        self.base_vertex = base_vertex
+        self.vertex_count = vertex_count
+        self.first_index = first_index
+        self.index_count = index_count
+
+
+class MeshPool:
+    def __init__(self, attributes: list[VertexAttribute], stride: int, vertex_capacity: int, index_capacity: int,
+                 max_draws: int = 1024, draw_data_size: int = 64, segments: int = 3) -> None:
+        # capacities are in vertices and indices, draw_data_size is the bytes of the data of one draw
+        self.stride = stride
+        self.vertex_capacity = vertex_capacity
+        self.index_capacity = index_capacity
+        self.vertex_count = 0
+        self.index_count = 0
+        self.meshes: dict[str, Mesh] = {}
+        self.vbo = VertexBufferObject(np.zeros(vertex_capacity * stride, dtype=np.uint8))
+        self.ebo = ElementBufferObject(np.zeros(index_capacity, dtype=np.uint32))
+        self.vao = VertexArrayObject()
+        self.vao.setVertexBuffer(self.vbo, 0, 0, stride)
+        for attribute in attributes:
+            self.vao.setVertexAttribute(0, attribute)
+        self.vao.setElementBuffer(self.ebo)
+        # commands and per-draw data change every frame, they are streamed like the cube instances
+        self.max_draws = max_draws
+        self.commands = StreamingBuffer(GL_DRAW_INDIRECT_BUFFER,
+                                        max_draws * DRAW_ELEMENTS_INDIRECT_COMMAND.itemsize, segments)
+        self.draw_data = StreamingBuffer(GL_SHADER_STORAGE_BUFFER, max_draws * draw_data_size, segments)
+
+    def add(self, name: str, vertices: np.ndarray, indices: np.ndarray) -> Mesh:
+        # vertices are interleaved like the attributes describe them, indices start at 0 for every mesh
+        vertex_count = vertices.nbytes // self.stride
+        if self.vertex_count + vertex_count > self.vertex_capacity:
+            raise ValueError("mesh %s does not fit, %d of %d vertices are used"
+                             % (name, self.vertex_count, self.vertex_capacity))
+        if self.index_count + indices.size > self.index_capacity:
+            raise ValueError("mesh %s does not fit, %d of %d indices are used"
+                             % (name, self.index_count, self.index_capacity))
+        mesh = Mesh(name, self.vertex_count, vertex_count, self.index_count, indices.size)
+        vertices = np.ascontiguousarray(vertices)
+        glNamedBufferSubData(self.vbo.vbo_id, self.vertex_count * self.stride, vertices.nbytes, vertices)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        glNamedBufferSubData(self.ebo.ebo_id, self.index_count * 4, indices.nbytes, indices)
+        self.vertex_count += vertex_count
+        self.index_count += indices.size
+        self.meshes[name] = mesh
+        return mesh
+
+    def __getitem__(self, name: str) -> Mesh:
+        return self.meshes[name]
+
+    def command(self, mesh: Mesh, instance_count: int = 1, base_instance: int = 0) -> tuple:
+        # one record of DRAW_ELEMENTS_INDIRECT_COMMAND
+        return (mesh.index_count, instance_count, mesh.first_index, mesh.base_vertex, base_instance)
+
+    def buildCommands(self, meshes: list[Mesh]) -> np.ndarray:
+        # one draw of one instance per entry, draw i reads its data at gl_DrawID == i
+        return np.array([self.command(mesh) for mesh in meshes], dtype=DRAW_ELEMENTS_INDIRECT_COMMAND)
+
+    def draw(self, commands: np.ndarray, draw_data: np.ndarray = None, mode: int = GL_TRIANGLES) -> None:
+        # the whole array of commands is one call, draw_data holds one element per command,
+        # e.g. the column major model matrices read by drawModel in shaders/drawdata.glsl
+        if len(commands) > self.max_draws:
+            raise ValueError("%d draws exceed the %d draws of the pool" % (len(commands), self.max_draws))
+        if len(commands) == 0:
+            return
+        if draw_data is not None:
+            offset = self.draw_data.write(draw_data)
+            self.draw_data.bindRange(DRAW_DATA_BINDING, offset, draw_data.nbytes)
+        offset = self.commands.write(commands)
+        self.vao.bind()
+        self.commands.bind()
+        glMultiDrawElementsIndirect(mode, GL_UNSIGNED_INT, c_void_p(offset), len(commands), 0)
+        self.commands.unbind()
+        self.commands.lockSegment()
+        if draw_data is not None:
+            self.draw_data.lockSegment()
+
+    def delete(self) -> None:
+        self.vao.delete()
+        self.vbo.delete()
+        self.ebo.delete()
+        self.commands.delete()
+        self.draw_data.delete()
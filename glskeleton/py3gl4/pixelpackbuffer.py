@@ -0,0 +1,103 @@
+# refer to https://www.khronos.org/opengl/wiki/Pixel_Buffer_Object
+# refer to https://registry.khronos.org/OpenGL/specs/gl/glspec46.core.pdf
+# Asynchronous readback: glReadPixels into a GL_PIXEL_PACK_BUFFER returns at once and the GPU copies the pixels
+# once it rendered them. The buffer is persistently mapped and split into segments like a StreamingBuffer,
+# each read is guarded by a fence, so the CPU takes the pixels of earlier reads while the GPU renders the next
+from collections import deque
+from ctypes import c_uint, c_ubyte, c_void_p, POINTER, cast
+
+from OpenGL.GL import glCreateBuffers, glBindBuffer, glNamedBufferStorage, glMapNamedBufferRange, \
+    glUnmapNamedBuffer, glIsBuffer, glDeleteBuffers, glFenceSync, glClientWaitSync, glDeleteSync, glFlush, \
+    glReadPixels, \
+    GL_PIXEL_PACK_BUFFER, GL_MAP_READ_BIT, GL_MAP_PERSISTENT_BIT, GL_MAP_COHERENT_BIT, \
+    GL_SYNC_GPU_COMMANDS_COMPLETE, GL_SYNC_FLUSH_COMMANDS_BIT, GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED, \
+    GL_WAIT_FAILED, GL_RGBA, GL_UNSIGNED_BYTE
+import numpy as np
+
+from py3gl4.streamingbuffer import SEGMENT_ALIGNMENT, FENCE_TIMEOUT
+
+
+class PixelPackBuffer:
+    def __init__(self, segment_size: int, segments: int = 3) -> None:
+        # segment_size is the largest read in bytes, more segments let more reads overlap the rendering
+        if segments < 1:
+            raise ValueError("PixelPackBuffer needs at least one segment")
+        self.buffer_id = c_uint()
+        self.segment_size = (segment_size + SEGMENT_ALIGNMENT - 1) // SEGMENT_ALIGNMENT * SEGMENT_ALIGNMENT
+        self.segments = segments
+        self.size = self.segment_size * segments
+        self.free = deque(range(segments))
+        # (segment, fence, tag, shape) of the reads in flight, oldest first
+        self.in_flight: deque = deque()
+        # reads which finished while readPixels waited for a free segment
+        self.ready: list = []
+        # how many times readPixels had to wait for the GPU, more segments avoid it
+        self.stalls = 0
+        flags = GL_MAP_READ_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+        glCreateBuffers(1, self.buffer_id)
+        glNamedBufferStorage(self.buffer_id, self.size, None, flags)
+        pointer = glMapNamedBufferRange(self.buffer_id, 0, self.size, flags)
+        if not pointer:
+            self.delete()
+            raise RuntimeError("glMapNamedBufferRange failed to map the pixel pack buffer")
+        self.memory = np.ctypeslib.as_array(
+            cast(c_void_p(pointer), POINTER(c_ubyte)), shape=(self.size,))
+
+    def delete(self) -> None:
+        for _, fence, _, _ in self.in_flight:
+            glDeleteSync(fence)
+        self.in_flight.clear()
+        self.memory = None
+        if glIsBuffer(self.buffer_id):
+            glUnmapNamedBuffer(self.buffer_id)
+            glDeleteBuffers(1, self.buffer_id)
+
+    def pending(self) -> int:
+        return len(self.in_flight) + len(self.ready)
+
+    def readPixels(self, x: int, y: int, width: int, height: int, tag=None) -> None:
+        # RGBA bytes of the rectangle of the bound read framebuffer, poll() returns them with tag
+        size = width * height * 4
+        if size > self.segment_size:
+            raise ValueError("%dx%d pixels (%d bytes) do not fit into a segment (%d bytes)"
+                             % (width, height, size, self.segment_size))
+        if not self.free:
+            self.stalls += 1
+            self.ready += self.collect(True, 1)
+        segment = self.free.popleft()
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffer_id)
+        # with a pack buffer bound the pointer is the byte offset into it
+        glReadPixels(x, y, width, height, GL_RGBA, GL_UNSIGNED_BYTE, c_void_p(segment * self.segment_size))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.in_flight.append((segment, glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0), tag, (height, width, 4)))
+        # poll() does not flush, the fence has to reach the GPU even when nothing else is submitted
+        glFlush()
+
+    def poll(self, wait: bool = False) -> list[tuple[object, np.ndarray]]:
+        # (tag, (height, width, 4) rows bottom to top) of the finished reads in the order they were issued,
+        # never waits unless wait is True, then every read in flight is returned
+        ready = self.ready + self.collect(wait, len(self.in_flight))
+        self.ready = []
+        return ready
+
+    def collect(self, wait: bool, count: int) -> list[tuple[object, np.ndarray]]:
+        done = []
+        while self.in_flight and len(done) < count:
+            segment, fence, tag, shape = self.in_flight[0]
+            flags = 0
+            while True:
+                result = glClientWaitSync(fence, flags, 0 if flags == 0 else FENCE_TIMEOUT)
+                if result in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                    break
+                if result == GL_WAIT_FAILED:
+                    raise RuntimeError("glClientWaitSync failed while waiting for a pixel readback")
+                if not wait:
+                    return done
+                flags = GL_SYNC_FLUSH_COMMANDS_BIT
+            glDeleteSync(fence)
+            self.in_flight.popleft()
+            start = segment * self.segment_size
+            # a copy, the segment is written again by a later read
+            done.append((tag, self.memory[start:start + int(np.prod(shape))].reshape(shape).copy()))
+            self.free.append(segment)
+        return done
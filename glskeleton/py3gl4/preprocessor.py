@@ -0,0 +1,141 @@
+# refer to https://registry.khronos.org/OpenGL/specs/gl/GLSLangSpec.4.60.pdf, section 3.3 Preprocessor
+# GLSL has no #include, it is resolved here on the CPU before glShaderSource, #define variants are
+# injected after #version and #line directives keep driver errors pointing at the original files
+import os
+import re
+
+from py3gl4.shader import loadSource
+
+DEFAULT_VERSION = "#version 460 core"
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s+"([^"]+)"\s*$')
+VERSION_PATTERN = re.compile(r"^\s*#\s*version\b")
+# "0:12(3): error" (Mesa), "0(12) : error" (NVIDIA), "ERROR: 0:12:" (AMD, Intel)
+LOG_PATTERN = re.compile(r"(^|: )(\d+)([:(])(\d+)", re.MULTILINE)
+
+
+def defineKey(defines: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in (defines or {}).items()))
+
+
+def defineLines(defines: dict) -> list[str]:
+    # a value of None or True defines the name without a value
+    lines = []
+    for name, value in (defines or {}).items():
+        if value is None or value is True:
+            lines.append("#define %s" % name)
+        else:
+            lines.append("#define %s %s" % (name, value))
+    return lines
+
+
+class ShaderPreprocessor:
+    def __init__(self, include_dir: str = "shaders", version: str = DEFAULT_VERSION) -> None:
+        self.include_dir = os.path.abspath(include_dir)
+        # prepended to sources without a #version line
+        self.version = version
+        # source string numbers used in #line directives, number -> file path
+        self.files: list[str] = []
+        # path -> (mtime, source with includes expanded, {dependency path: mtime})
+        self.includes: dict[str, tuple[float, str, dict[str, float]]] = {}
+        # (path, defines, mtime) -> (final source, {dependency path: mtime})
+        self.sources: dict[tuple, tuple[str, dict[str, float]]] = {}
+        # how many files were read from disk, permutations of one shader share the reads
+        self.reads = 0
+
+    def fileNumber(self, path: str) -> int:
+        if path not in self.files:
+            self.files.append(path)
+        return self.files.index(path)
+
+    def fileName(self, number: int) -> str:
+        path = self.files[number]
+        if path.startswith(self.include_dir + os.sep):
+            return os.path.relpath(path, self.include_dir)
+        return path
+
+    def resolve(self, name: str) -> str:
+        return os.path.abspath(os.path.join(self.include_dir, name))
+
+    def isCurrent(self, dependencies: dict[str, float]) -> bool:
+        try:
+            return all(os.path.getmtime(path) == mtime for path, mtime in dependencies.items())
+        except OSError:
+            return False
+
+    def load(self, file_path: str, defines: dict = None) -> str:
+        # return the source of file_path ready for glShaderSource, memoized by (path, defines, mtime)
+        path = os.path.abspath(file_path)
+        key = (path, defineKey(defines), os.path.getmtime(path))
+        cached = self.sources.get(key)
+        if cached is not None and self.isCurrent(cached[1]):
+            return cached[0]
+        text, dependencies = self.expandFile(path, ())
+        source = self.addDefines(text, defines, self.fileNumber(path))
+        self.sources[key] = (source, dependencies)
+        return source
+
+    def process(self, source: str, defines: dict = None, name: str = "<string>") -> str:
+        # same as load() for a source kept in memory, included files are still memoized
+        text, _ = self.expandText(source, name, ())
+        return self.addDefines(text, defines, self.fileNumber(name))
+
+    def dependencies(self, file_path: str) -> set[str]:
+        # every file the last expansion of file_path read, including file_path itself
+        path = os.path.abspath(file_path)
+        if path not in self.includes:
+            return {path}
+        return set(self.includes[path][2])
+
+    def addDefines(self, text: str, defines: dict, number: int) -> str:
+        lines = text.split("\n")
+        for index, line in enumerate(lines):
+            if VERSION_PATTERN.match(line):
+                header, body, first = lines[:index + 1], lines[index + 1:], index + 2
+                break
+        else:
+            header, body, first = [self.version], lines, 1
+        return "\n".join(header + defineLines(defines) + ["#line %d %d" % (first, number)] + body)
+
+    def expandFile(self, path: str, stack: tuple) -> tuple[str, dict[str, float]]:
+        if path in stack:
+            raise RuntimeError("#include cycle: %s" % " -> ".join(stack + (path,)))
+        mtime = os.path.getmtime(path)
+        cached = self.includes.get(path)
+        if cached is not None and cached[0] == mtime and self.isCurrent(cached[2]):
+            return cached[1], cached[2]
+        self.reads += 1
+        text, dependencies = self.expandText(loadSource(path), path, stack + (path,))
+        dependencies[path] = mtime
+        self.includes[path] = (mtime, text, dependencies)
+        return text, dependencies
+
+    def expandText(self, source: str, path: str, stack: tuple) -> tuple[str, dict[str, float]]:
+        # includes inside #if blocks are expanded too, the driver evaluates the conditions later
+        number = self.fileNumber(path)
+        lines = []
+        dependencies: dict[str, float] = {}
+        for index, line in enumerate(source.splitlines(), 1):
+            match = INCLUDE_PATTERN.match(line)
+            if match is None:
+                lines.append(line)
+                continue
+            include_path = self.resolve(match.group(1))
+            if not os.path.isfile(include_path):
+                raise FileNotFoundError(
+                    '%s(%d): #include "%s" not found in %s' % (path, index, match.group(1), self.include_dir))
+            text, included = self.expandFile(include_path, stack)
+            dependencies.update(included)
+            lines.append("#line 1 %d" % self.fileNumber(include_path))
+            lines.append(text)
+            lines.append("#line %d %d" % (index + 1, number))
+        return "\n".join(lines), dependencies
+
+    def translateLog(self, log: str) -> str:
+        # replace the source string numbers in a compile log with the file names,
+        # not every driver reports them for all errors, the line numbers always follow #line
+        def replace(match: re.Match) -> str:
+            number = int(match.group(2))
+            if number >= len(self.files):
+                return match.group(0)
+            return match.group(1) + self.fileName(number) + match.group(3) + match.group(4)
+        return LOG_PATTERN.sub(replace, log)
@@ -0,0 +1,178 @@
+# refer to https://www.khronos.org/opengl/wiki/Query_Object#Timer_queries
+# Named, nested scopes timed on the CPU with perf_counter and on the GPU with GL_TIMESTAMP queries.
+# GL_TIME_ELAPSED queries can not nest, so every scope writes a timestamp where it begins and ends.
+# The queries of a frame are read frames - 1 frames later, when the GPU finished them long ago,
+# a frame whose results are still pending is dropped instead of waiting for it
+from collections import deque
+from contextlib import contextmanager
+import json
+import time
+
+from OpenGL.GL import glCreateQueries, glDeleteQueries, glQueryCounter, glGetQueryObjectiv, \
+    glGetQueryObjectui64v, glGetInteger64v, GL_TIMESTAMP, GL_QUERY_RESULT, GL_QUERY_RESULT_AVAILABLE
+import numpy as np
+
+FRAME_SCOPE = "frame"
+
+
+class ProfileFrame:
+    def __init__(self) -> None:
+        # query names of this slot, reused every time the slot comes around
+        self.queries = np.zeros(0, dtype=np.uint32)
+        self.used = 0
+        # (path, depth, cpu begin, cpu end, begin query, end query) of every scope in the order they began,
+        # queries are positions in self.queries
+        self.scopes: list[list] = []
+
+    def timestamp(self) -> int:
+        # records the GPU time once the commands issued so far finished, returns the position of the query
+        if self.used == len(self.queries):
+            more = np.zeros(max(len(self.queries), 8), dtype=np.uint32)
+            glCreateQueries(GL_TIMESTAMP, len(more), more)
+            self.queries = np.concatenate((self.queries, more))
+        glQueryCounter(int(self.queries[self.used]), GL_TIMESTAMP)
+        self.used += 1
+        return self.used - 1
+
+    def delete(self) -> None:
+        if len(self.queries):
+            glDeleteQueries(len(self.queries), self.queries)
+        self.queries = np.zeros(0, dtype=np.uint32)
+
+
+class GPUProfiler:
+    def __init__(self, frames: int = 3, history: int = 240, enabled: bool = True) -> None:
+        # frames of queries in flight, history is the number of frames kept per scope and in the trace
+        self.enabled = enabled
+        self.frames = [ProfileFrame() for _ in range(frames)]
+        self.index = frames - 1
+        self.stack: list[list] = []
+        # scope path -> rolling (cpu ms, gpu ms) samples
+        self.history: dict[str, deque] = {}
+        self.depths: dict[str, int] = {}
+        self.length = history
+        # finished frames as Chrome trace events
+        self.trace: deque = deque(maxlen=history)
+        # frames whose GPU results were not ready in time
+        self.dropped = 0
+        self.calibrate()
+
+    def calibrate(self) -> None:
+        # pairs the GPU clock with perf_counter so both timelines line up in the trace
+        self.cpu_origin = time.perf_counter()
+        self.gpu_origin = int(glGetInteger64v(GL_TIMESTAMP))
+
+    def beginFrame(self) -> None:
+        if not self.enabled:
+            return
+        self.index = (self.index + 1) % len(self.frames)
+        frame = self.frames[self.index]
+        if frame.scopes:
+            self.collect(frame)
+        frame.scopes = []
+        frame.used = 0
+        self.begin(FRAME_SCOPE)
+
+    def endFrame(self) -> None:
+        # closes the scopes left open, the frame scope included
+        if not self.enabled:
+            return
+        while self.stack:
+            self.end()
+
+    def begin(self, name: str) -> None:
+        if not self.enabled:
+            return
+        frame = self.frames[self.index]
+        path = name if not self.stack else self.stack[-1][0] + "/" + name
+        scope = [path, len(self.stack), time.perf_counter(), 0.0, frame.timestamp(), 0]
+        frame.scopes.append(scope)
+        self.stack.append(scope)
+
+    def end(self) -> None:
+        if not self.enabled:
+            return
+        scope = self.stack.pop()
+        scope[3] = time.perf_counter()
+        scope[5] = self.frames[self.index].timestamp()
+
+    @contextmanager
+    def scope(self, name: str):
+        # with profiler.scope("fbo pass"): ...
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def collect(self, frame: ProfileFrame) -> None:
+        # queries finish in order, if the last one is available all of them are
+        available = np.zeros(1, dtype=np.int32)
+        glGetQueryObjectiv(int(frame.queries[frame.used - 1]), GL_QUERY_RESULT_AVAILABLE, available)
+        if not available[0]:
+            self.dropped += 1
+            return
+        timestamps = np.zeros(frame.used, dtype=np.uint64)
+        result = np.zeros(1, dtype=np.uint64)
+        for i in range(frame.used):
+            glGetQueryObjectui64v(int(frame.queries[i]), GL_QUERY_RESULT, result)
+            timestamps[i] = result[0]
+        events = []
+        for path, depth, cpu_begin, cpu_end, begin, end in frame.scopes:
+            gpu_begin, gpu_end = int(timestamps[begin]), int(timestamps[end])
+            cpu_ms = (cpu_end - cpu_begin) * 1000.0
+            gpu_ms = (gpu_end - gpu_begin) / 1000000.0
+            if path not in self.history:
+                self.history[path] = deque(maxlen=self.length)
+                self.depths[path] = depth
+            self.history[path].append((cpu_ms, gpu_ms))
+            name = path.rsplit("/", 1)[-1]
+            events.append({"name": name, "cat": "cpu", "ph": "X", "pid": 0, "tid": "CPU",
+                           "ts": (cpu_begin - self.cpu_origin) * 1000000.0, "dur": cpu_ms * 1000.0})
+            events.append({"name": name, "cat": "gpu", "ph": "X", "pid": 0, "tid": "GPU",
+                           "ts": (gpu_begin - self.gpu_origin) / 1000.0, "dur": gpu_ms * 1000.0})
+        self.trace.append(events)
+
+    def flush(self) -> None:
+        # collects the frames still in flight, oldest first, call after endFrame() and glFinish()
+        for i in range(1, len(self.frames) + 1):
+            frame = self.frames[(self.index + i) % len(self.frames)]
+            if frame.scopes:
+                self.collect(frame)
+                frame.scopes = []
+
+    def reset(self) -> None:
+        # forgets the history, e.g. after warmup frames
+        self.history = {}
+        self.depths = {}
+        self.trace.clear()
+        self.dropped = 0
+
+    def scopes(self) -> list[tuple[str, int]]:
+        # (path, depth) of every scope seen so far in the order they first began, parents before their children
+        return list(self.depths.items())
+
+    def samples(self, path: str) -> tuple[np.ndarray, np.ndarray]:
+        # (cpu ms, gpu ms) of the frames in the history, oldest first
+        samples = np.array(self.history.get(path, ()), dtype=np.float32).reshape(-1, 2)
+        return np.ascontiguousarray(samples[:, 0]), np.ascontiguousarray(samples[:, 1])
+
+    def report(self) -> str:
+        lines = []
+        for path, depth in self.scopes():
+            cpu, gpu = self.samples(path)
+            lines.append(f"{'  ' * depth}{path.rsplit('/', 1)[-1]}: cpu {cpu.mean():.3f} ms, "
+                         f"gpu {gpu.mean():.3f} ms (max {gpu.max():.3f} ms)")
+        if self.dropped:
+            lines.append(f"{self.dropped} frame(s) dropped while the GPU was behind")
+        return "\n".join(lines)
+
+    def exportChromeTrace(self, file_path: str) -> None:
+        # open the file in chrome://tracing or https://ui.perfetto.dev
+        events = [event for frame in self.trace for event in frame]
+        with open(file_path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def delete(self) -> None:
+        for frame in self.frames:
+            frame.delete()
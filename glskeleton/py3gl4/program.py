@@ -2,25 +2,57 @@
 # refer to https://www.khronos.org/opengl/wiki/Shader_Compilation
 
 from OpenGL.GL import glCreateProgram, glAttachShader, glLinkProgram, \
-    glGetProgramiv, glGetProgramInfoLog, glDeleteProgram, glUseProgram, \
-    GL_LINK_STATUS
+    glGetProgramiv, glGetProgramInfoLog, glDeleteProgram, \
+    glGetUniformBlockIndex, glGetActiveUniformBlockiv, glGetActiveUniformsiv, \
+    glGetActiveUniformName, glUniformBlockBinding, glProgramParameteri, glGetProgramBinary, \
+    glProgramBinary, GLsizei, GLenum, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_PROGRAM_BINARY_LENGTH, GL_TRUE, \
+    GL_LINK_STATUS, GL_INVALID_INDEX, GL_UNIFORM_BLOCK_DATA_SIZE, GL_UNIFORM_BLOCK_ACTIVE_UNIFORMS, \
+    GL_UNIFORM_BLOCK_ACTIVE_UNIFORM_INDICES, GL_UNIFORM_TYPE, GL_UNIFORM_SIZE, GL_UNIFORM_OFFSET, \
+    GL_UNIFORM_ARRAY_STRIDE, GL_UNIFORM_MATRIX_STRIDE, GL_UNIFORM_NAME_LENGTH
+from OpenGL.GL import GLint
+from OpenGL.GL.KHR.parallel_shader_compile import GL_COMPLETION_STATUS_KHR
+import numpy as np
+
+from py3gl4.extensions import hasExtension
+from py3gl4.statecache import stateCache
 
 from py3gl4.shader import Shader
 from py3gl4.vertexarrayobject import VertexAttribute
 from py3gl4.uniform import Uniform
+from py3gl4.uniformbuffer import blockLayout
 
 
 class Program:
-    def __init__(self, shaders: list[Shader]) -> None:
+    def __init__(self, shaders: list[Shader] = None, retrievable: bool = False, check: bool = True) -> None:
         self.program_id = glCreateProgram()
         self.attributes: dict[str, VertexAttribute] = {}
         self.uniforms: dict[str, Uniform] = {}
         if self.program_id == 0:
             raise ValueError(
                 "glCreateProgram failed to create a valid  program object")
+        if shaders is not None:
+            self.link(shaders, retrievable, check)
+
+    def link(self, shaders: list[Shader], retrievable: bool = False, check: bool = True) -> None:
+        if retrievable:
+            # allow glGetProgramBinary after linking, see ProgramCache
+            glProgramParameteri(self.program_id, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
         for shader in shaders:
             glAttachShader(self.program_id, shader.shader_id)
         glLinkProgram(self.program_id)
+        if check:
+            self.checkStatus()
+
+    def isCompleted(self) -> bool:
+        # without GL_KHR_parallel_shader_compile glLinkProgram already finished the work
+        if not hasExtension("GL_KHR_parallel_shader_compile"):
+            return True
+        # PyOpenGL does not know the result size of this query, pass the output explicitly
+        status = GLint()
+        glGetProgramiv(self.program_id, GL_COMPLETION_STATUS_KHR, status)
+        return bool(status.value)
+
+    def checkStatus(self) -> None:
         result = glGetProgramiv(self.program_id, GL_LINK_STATUS)
         if not result:
             error = glGetProgramInfoLog(self.program_id)
@@ -29,8 +61,21 @@ class Program:
             raise RuntimeError(
                 "glLinkProgram failed to link (%s): %s", result, error)
 
+    def getBinary(self) -> tuple[int, bytes]:
+        length = int(glGetProgramiv(self.program_id, GL_PROGRAM_BINARY_LENGTH))
+        binary = np.zeros(length, dtype=np.uint8)
+        written = GLsizei()
+        format = GLenum()
+        glGetProgramBinary(self.program_id, length, written, format, binary)
+        return format.value, binary[:written.value].tobytes()
+
+    def loadBinary(self, format: int, binary: bytes) -> bool:
+        # a driver update may reject an old binary, the caller then links from source
+        glProgramBinary(self.program_id, format, binary, len(binary))
+        return bool(glGetProgramiv(self.program_id, GL_LINK_STATUS))
+
     def use(self) -> None:
-        glUseProgram(self.program_id)
+        stateCache().useProgram(self.program_id)
 
     def addVertexAttribute(self, attribute: VertexAttribute) -> None:
         self.attributes[attribute.name] = attribute
@@ -39,7 +84,46 @@ class Program:
         uniform.getLocation(self.program_id)
         self.uniforms[uniform.name] = uniform
 
+    def getUniformBlockIndex(self, name: str) -> int:
+        index = glGetUniformBlockIndex(self.program_id, name)
+        if index == GL_INVALID_INDEX:
+            raise ValueError("uniform block %s is not active in the program" % name)
+        return index
+
+    def getUniformBlock(self, name: str) -> np.dtype:
+        # introspect the block, the result is the layout for a UniformBuffer
+        index = self.getUniformBlockIndex(name)
+        value = np.zeros(1, dtype=np.int32)
+        glGetActiveUniformBlockiv(self.program_id, index, GL_UNIFORM_BLOCK_DATA_SIZE, value)
+        size = int(value[0])
+        glGetActiveUniformBlockiv(self.program_id, index, GL_UNIFORM_BLOCK_ACTIVE_UNIFORMS, value)
+        count = int(value[0])
+        indices = np.zeros(count, dtype=np.int32)
+        glGetActiveUniformBlockiv(self.program_id, index, GL_UNIFORM_BLOCK_ACTIVE_UNIFORM_INDICES, indices)
+        params = {}
+        for pname in (GL_UNIFORM_TYPE, GL_UNIFORM_SIZE, GL_UNIFORM_OFFSET, GL_UNIFORM_ARRAY_STRIDE,
+                      GL_UNIFORM_MATRIX_STRIDE, GL_UNIFORM_NAME_LENGTH):
+            params[pname] = np.zeros(count, dtype=np.int32)
+            glGetActiveUniformsiv(self.program_id, count, indices, pname, params[pname])
+        members = []
+        for i in range(count):
+            length, name_buffer = glGetActiveUniformName(
+                self.program_id, int(indices[i]), int(params[GL_UNIFORM_NAME_LENGTH][i]) + 1)
+            # arrays are reported as "name[0]"
+            member_name = bytes(name_buffer[:length]).decode().removesuffix("[0]")
+            members.append((member_name, int(params[GL_UNIFORM_TYPE][i]), int(params[GL_UNIFORM_SIZE][i]),
+                            int(params[GL_UNIFORM_OFFSET][i]), int(params[GL_UNIFORM_ARRAY_STRIDE][i]),
+                            int(params[GL_UNIFORM_MATRIX_STRIDE][i])))
+        members.sort(key=lambda member: member[3])
+        return blockLayout(members, size)
+
+    def setUniformBlockBinding(self, name: str, binding: int) -> None:
+        glUniformBlockBinding(self.program_id, self.getUniformBlockIndex(name), binding)
+
     def delete(self) -> None:
         if self.program_id > -1:
             glDeleteProgram(self.program_id)
+            self.program_id = -1
+            # the name may be reused by the next program
+            stateCache().invalidate()
 
@@ -0,0 +1,98 @@
+# refer to https://registry.khronos.org/OpenGL/extensions/KHR/KHR_parallel_shader_compile.txt
+# All shaders and programs are submitted up front without querying their status, the driver
+# compiles them on its own threads and poll() hands out every program as soon as it is linked,
+# a program which fails to build is logged and kept in errors, the caller falls back without it
+import logging
+import time
+from pathlib import Path
+
+from OpenGL.GL.KHR.parallel_shader_compile import glMaxShaderCompilerThreadsKHR
+
+from py3gl4.extensions import hasExtension
+from py3gl4.shader import Shader, errorMessage
+from py3gl4.program import Program
+from py3gl4.programcache import ProgramCache
+
+logger = logging.getLogger(__name__)
+
+# let the driver choose how many compiler threads to use
+DRIVER_THREADS = 0xFFFFFFFF
+
+
+class ProgramBatch:
+    def __init__(self, program_cache: ProgramCache = None, threads: int = DRIVER_THREADS) -> None:
+        self.program_cache = program_cache
+        self.parallel = hasExtension("GL_KHR_parallel_shader_compile")
+        if self.parallel:
+            glMaxShaderCompilerThreadsKHR(threads)
+        self.pending: dict[str, tuple[Program, list[Shader], Path, float]] = {}
+        self.programs: dict[str, Program] = {}
+        # programs restored from the cache, reported by the next poll()
+        self.loaded: list[str] = []
+        # name -> compile or link log of the programs which failed, they are never handed out
+        self.errors: dict[str, str] = {}
+
+    def submit(self, name: str, stages: list[tuple[type, str]]) -> None:
+        # stages are (shader class, source) pairs like ProgramCache.createProgram takes
+        start = time.perf_counter()
+        path = None
+        if self.program_cache is not None:
+            path = self.program_cache.programPath(stages)
+            program = self.program_cache.loadProgram(path)
+            if program is not None:
+                self.program_cache.record(name, True, start)
+                self.programs[name] = program
+                self.loaded.append(name)
+                return
+        shaders = [shader_class(source, check=False) for shader_class, source in stages]
+        program = Program(shaders, retrievable=path is not None, check=False)
+        self.pending[name] = (program, shaders, path, start)
+
+    def poll(self) -> list[str]:
+        # never blocks, returns the names of the programs which became ready with this call
+        ready, self.loaded = self.loaded, []
+        for name, (program, shaders, path, start) in list(self.pending.items()):
+            if not program.isCompleted():
+                continue
+            del self.pending[name]
+            try:
+                # report the compile log of the broken stage rather than the link log
+                for shader in shaders:
+                    shader.checkStatus()
+                program.checkStatus()
+            except RuntimeError as error:
+                program.delete()
+                self.reportError(name, error)
+                continue
+            finally:
+                for shader in shaders:
+                    shader.delete()
+            if self.program_cache is not None:
+                self.program_cache.storeProgram(program, path)
+                self.program_cache.record(name, False, start)
+            self.programs[name] = program
+            ready.append(name)
+        return ready
+
+    def reportError(self, name: str, error: Exception) -> None:
+        self.errors[name] = f"{name}: {errorMessage(error)}"
+        logger.error(self.errors[name])
+
+    def isReady(self, name: str) -> bool:
+        return name in self.programs
+
+    def hasFailed(self, name: str) -> bool:
+        return name in self.errors
+
+    def isDone(self) -> bool:
+        return not self.pending
+
+    def __getitem__(self, name: str) -> Program:
+        return self.programs[name]
+
+    def delete(self) -> None:
+        for program, shaders, _, _ in self.pending.values():
+            for shader in shaders:
+                shader.delete()
+            program.delete()
+        self.pending = {}
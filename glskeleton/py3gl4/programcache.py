@@ -0,0 +1,126 @@
+# refer to https://www.khronos.org/opengl/wiki/Shader_Compilation#Binary_upload
+# Linked programs are saved with glGetProgramBinary and reloaded with glProgramBinary,
+# the cache key covers every stage source, the driver identity and the binary formats it accepts
+import hashlib
+import os
+import time
+from pathlib import Path
+
+from OpenGL.GL import glGetString, glGetIntegerv, GL_VENDOR, GL_RENDERER, GL_VERSION, \
+    GL_NUM_PROGRAM_BINARY_FORMATS, GL_PROGRAM_BINARY_FORMATS
+import numpy as np
+
+from py3gl4.shader import Shader
+from py3gl4.program import Program
+
+
+def defaultCacheDir() -> Path:
+    root = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(root) / "glskeleton" / "programs"
+
+
+class ProgramCache:
+    def __init__(self, cache_dir: str = None) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else defaultCacheDir()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        # (name, loaded from cache, milliseconds) for every created program
+        self.records: list[tuple[str, bool, float]] = []
+        # queried once from the first current context, a cache serves the programs of one driver
+        self.formats: list[int] = None
+        self.driver_key: str = None
+
+    def binaryFormats(self) -> list[int]:
+        if self.formats is None:
+            count = int(glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS))
+            formats = np.zeros(count, dtype=np.int32)
+            if count > 0:
+                glGetIntegerv(GL_PROGRAM_BINARY_FORMATS, formats)
+            self.formats = [int(format) for format in formats]
+        return self.formats
+
+    def driverKey(self) -> str:
+        # requires a current context, binaries are only valid for the driver which produced them
+        if self.driver_key is None:
+            names = [glGetString(GL_VENDOR), glGetString(GL_RENDERER), glGetString(GL_VERSION)]
+            self.driver_key = "|".join([name.decode() for name in names] +
+                                       [str(format) for format in self.binaryFormats()])
+        return self.driver_key
+
+    def key(self, stages: list[tuple[type, str]]) -> str:
+        digest = hashlib.sha256(self.driverKey().encode())
+        for shader_class, source in stages:
+            digest.update(shader_class.__name__.encode())
+            digest.update(source.encode())
+        return digest.hexdigest()
+
+    def programPath(self, stages: list[tuple[type, str]]) -> Path:
+        # None when the driver offers no binary format, programs are then always linked from source
+        if not self.binaryFormats():
+            return None
+        return self.cache_dir / (self.key(stages) + ".bin")
+
+    def createProgram(self, stages: list[tuple[type, str]], name: str = "program") -> Program:
+        # stages are (shader class, source) pairs, e.g. (VertexShader, vertex_shader_code)
+        start = time.perf_counter()
+        path = self.programPath(stages)
+        program = self.loadProgram(path)
+        hit = program is not None
+        if not hit:
+            program = self.linkProgram(stages, path)
+        self.record(name, hit, start)
+        return program
+
+    def record(self, name: str, hit: bool, start: float) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.records.append((name, hit, (time.perf_counter() - start) * 1000.0))
+
+    def loadProgram(self, path: Path) -> Program:
+        if path is None or not path.is_file():
+            return None
+        content = path.read_bytes()
+        format = int.from_bytes(content[:4], "little")
+        if format in self.binaryFormats():
+            program = Program()
+            if program.loadBinary(format, content[4:]):
+                return program
+            program.delete()
+        # the driver rejected the binary, drop it and link from source
+        self.rejected += 1
+        path.unlink(missing_ok=True)
+        return None
+
+    def linkProgram(self, stages: list[tuple[type, str]], path: Path) -> Program:
+        shaders: list[Shader] = []
+        try:
+            for shader_class, source in stages:
+                shaders.append(shader_class(source))
+            program = Program(shaders, retrievable=path is not None)
+        finally:
+            for shader in shaders:
+                shader.delete()
+        self.storeProgram(program, path)
+        return program
+
+    def storeProgram(self, program: Program, path: Path) -> None:
+        # the program must be linked with retrievable=True
+        if path is None:
+            return
+        format, binary = program.getBinary()
+        if binary:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so a crash never leaves a truncated binary behind
+            temporary = path.with_suffix(".tmp")
+            temporary.write_bytes(format.to_bytes(4, "little") + binary)
+            os.replace(temporary, path)
+
+    def report(self) -> str:
+        lines = []
+        for name, hit, milliseconds in self.records:
+            state = "warm (binary cache hit)" if hit else "cold (compiled from source)"
+            lines.append(f"{name}: {state} in {milliseconds:.2f} ms")
+        return "\n".join(lines)
@@ -9,6 +9,8 @@ class Renderbuffer:
     def __init__(self, internalFormat: c_int, width: c_uint, height: c_uint) -> None:
         self.rbo_id = c_uint()
         self.internalFormat = internalFormat
+        self.width = width
+        self.height = height
         glCreateRenderbuffers(1, self.rbo_id)
         glNamedRenderbufferStorage(self.rbo_id, internalFormat, width, height)
 
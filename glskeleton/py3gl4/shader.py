@@ -8,30 +8,63 @@ from OpenGL.GL import glCreateShader, glShaderSource, \
     GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, GL_COMPILE_STATUS, \
     GL_TESS_CONTROL_SHADER, GL_TESS_EVALUATION_SHADER, GL_GEOMETRY_SHADER, \
     GL_COMPUTE_SHADER
+from OpenGL.GL import GLint
+from OpenGL.GL.KHR.parallel_shader_compile import GL_COMPLETION_STATUS_KHR
+
+from py3gl4.extensions import hasExtension
+
+
+def loadSource(file_path: str) -> str:
+    file = open(file_path)
+    content = file.read()
+    file.close()
+    return content
+
+
+def errorMessage(error: Exception) -> str:
+    # Shader and Program raise RuntimeError(format, status, info log)
+    args = [arg.decode(errors="replace") if isinstance(arg, bytes) else arg for arg in error.args]
+    if len(args) > 1 and isinstance(args[0], str):
+        return args[0] % tuple(args[1:])
+    return str(error)
 
 
 class Shader:
-    def __init__(self, type: c_uint, source: str=None, file_path:str = None) -> None:
+    def __init__(self, type: c_uint, source: str=None, file_path:str = None, check: bool = True) -> None:
         self.type = type
         self.shader_id = glCreateShader(type)
         if self.shader_id == 0:
             raise ValueError(
                 "glCreateShader failed to create a valid shader object")
         if source is not None:
-            self.createShader(source)
+            self.createShader(source, check)
         if file_path is not None:
-            file = open(file_path)
-            content = file.read()
-            file.close()
-            self.createShader(content)
+            self.createShader(loadSource(file_path), check)
 
     def delete(self)-> None:
         if self.shader_id > -1:
             glDeleteShader(self.shader_id)
+            self.shader_id = -1
 
-    def createShader(self, source:str)->None:
+    def createShader(self, source:str, check: bool = True)->None:
+        # with check=False the compile status is not queried, so the driver may compile
+        # in the background, poll isCompleted() and call checkStatus() later
+        self.source = source
         glShaderSource(self.shader_id, source)
         glCompileShader(self.shader_id)
+        if check:
+            self.checkStatus()
+
+    def isCompleted(self) -> bool:
+        # without GL_KHR_parallel_shader_compile glCompileShader already finished the work
+        if not hasExtension("GL_KHR_parallel_shader_compile"):
+            return True
+        # PyOpenGL does not know the result size of this query, pass the output explicitly
+        status = GLint()
+        glGetShaderiv(self.shader_id, GL_COMPLETION_STATUS_KHR, status)
+        return bool(status.value)
+
+    def checkStatus(self) -> None:
         result = glGetShaderiv(self.shader_id, GL_COMPILE_STATUS)
         if not result:
             error = glGetShaderInfoLog(self.shader_id)
@@ -41,31 +74,31 @@ class Shader:
                 "glCompileShader failed to compile (%s): %s", result, error)
 
 class VertexShader(Shader):
-    def __init__(self, source: str=None, file_path:str = None) -> None:
-        super().__init__(GL_VERTEX_SHADER, source, file_path)
+    def __init__(self, source: str=None, file_path:str = None, check: bool = True) -> None:
+        super().__init__(GL_VERTEX_SHADER, source, file_path, check)
 
 # refer to https://www.khronos.org/opengl/wiki/Tessellation
 # Tessellation control shader and Tessellation evaluation shader are indtroduced in in OpenGL 4.0
 
 
 class TessellationControlShader(Shader):
-    def __init__(self, source: str=None, file_path:str = None) -> None:
-        super().__init__(GL_TESS_CONTROL_SHADER, source, file_path)
+    def __init__(self, source: str=None, file_path:str = None, check: bool = True) -> None:
+        super().__init__(GL_TESS_CONTROL_SHADER, source, file_path, check)
 
 
 class TessellationEvaluationShader(Shader):
-    def __init__(self, source: str=None, file_path:str = None) -> None:
-        super().__init__(GL_TESS_EVALUATION_SHADER, source, file_path)
+    def __init__(self, source: str=None, file_path:str = None, check: bool = True) -> None:
+        super().__init__(GL_TESS_EVALUATION_SHADER, source, file_path, check)
 
 
 class GeometryShader(Shader):
-    def __init__(self, source: str=None, file_path:str = None) -> None:
-        super().__init__(GL_GEOMETRY_SHADER, source, file_path)
+    def __init__(self, source: str=None, file_path:str = None, check: bool = True) -> None:
+        super().__init__(GL_GEOMETRY_SHADER, source, file_path, check)
 
 
 class FragmentShader(Shader):
-    def __init__(self, source: str=None, file_path:str = None) -> None:
-        super().__init__(GL_FRAGMENT_SHADER, source, file_path)
+    def __init__(self, source: str=None, file_path:str = None, check: bool = True) -> None:
+        super().__init__(GL_FRAGMENT_SHADER, source, file_path, check)
 
 # refert to https://www.khronos.org/opengl/wiki/Compute_Shader
 # Compute Shader is introduced in OpenGL 4.3, and macOS only supports OpenGL 4.1
@@ -73,8 +106,8 @@ class FragmentShader(Shader):
 
 
 class ComputeShader(Shader):
-    def __init__(self, source: str=None, file_path:str = None) -> None:
-        super().__init__(GL_COMPUTE_SHADER, source, file_path)
+    def __init__(self, source: str=None, file_path:str = None, check: bool = True) -> None:
+        super().__init__(GL_COMPUTE_SHADER, source, file_path, check)
         os = platform.system()
         if os == "Darwin":
             raise RuntimeError("Can't run compute shader on macOS!")
@@ -0,0 +1,114 @@
+# refer to https://www.khronos.org/opengl/wiki/Common_Mistakes#Unnecessary_state_changes
+# Every PyOpenGL call costs several microseconds of Python, so the bindings of the current context are
+# remembered and calls which would not change them are skipped. Qt binds its own framebuffer and may
+# touch other state between frames, call beginFrame() at the start of paintGL to forget everything,
+# set stateCache().debug = True to check the cache against glGetIntegerv while hunting a stale binding
+from OpenGL import contextdata
+from OpenGL.GL import glUseProgram, glBindVertexArray, glBindTextureUnit, glBindFramebuffer, glGetIntegerv, \
+    glGetIntegeri_v, GL_CURRENT_PROGRAM, GL_VERTEX_ARRAY_BINDING, GL_DRAW_FRAMEBUFFER_BINDING, \
+    GL_READ_FRAMEBUFFER_BINDING, GL_FRAMEBUFFER, GL_DRAW_FRAMEBUFFER, GL_READ_FRAMEBUFFER, GL_TEXTURE_2D, \
+    GL_TEXTURE_2D_ARRAY, GL_TEXTURE_BINDING_2D, GL_TEXTURE_BINDING_2D_ARRAY
+
+STATE_CACHE_KEY = "py3gl4.statecache"
+TEXTURE_BINDINGS = {GL_TEXTURE_2D: GL_TEXTURE_BINDING_2D, GL_TEXTURE_2D_ARRAY: GL_TEXTURE_BINDING_2D_ARRAY}
+
+
+def objectName(name) -> int:
+    # the wrappers keep their names as int or c_uint
+    return int(getattr(name, "value", name))
+
+
+class StateCache:
+    def __init__(self, debug: bool = False) -> None:
+        # debug compares the cache with glGetIntegerv before every skipped call
+        self.debug = debug
+        self.issued = 0
+        self.skipped = 0
+        # (issued, skipped) of the previous frame
+        self.last_frame = (0, 0)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        # None means unknown, the next call is always issued
+        self.program: int = None
+        self.vertex_array: int = None
+        self.textures: dict[int, tuple[int, int]] = {}
+        self.draw_framebuffer: int = None
+        self.read_framebuffer: int = None
+
+    def beginFrame(self) -> None:
+        # only the bindings made through the cache are known, code which binds on its own,
+        # e.g. the imgui renderer or Qt, has to be followed by invalidate() before the cache is used again
+        self.last_frame = (self.issued, self.skipped)
+        self.issued = 0
+        self.skipped = 0
+        self.invalidate()
+
+    def skip(self, name: str, cached: int, actual: int) -> None:
+        if self.debug and cached != actual:
+            raise RuntimeError("StateCache: %s is %d, the cache assumed %d" % (name, actual, cached))
+        self.skipped += 1
+
+    def useProgram(self, program_id) -> None:
+        program_id = objectName(program_id)
+        if self.program == program_id:
+            self.skip("GL_CURRENT_PROGRAM", program_id,
+                      int(glGetIntegerv(GL_CURRENT_PROGRAM)) if self.debug else program_id)
+            return
+        glUseProgram(program_id)
+        self.program = program_id
+        self.issued += 1
+
+    def bindVertexArray(self, vao_id) -> None:
+        vao_id = objectName(vao_id)
+        if self.vertex_array == vao_id:
+            self.skip("GL_VERTEX_ARRAY_BINDING", vao_id,
+                      int(glGetIntegerv(GL_VERTEX_ARRAY_BINDING)) if self.debug else vao_id)
+            return
+        glBindVertexArray(vao_id)
+        self.vertex_array = vao_id
+        self.issued += 1
+
+    def bindTextureUnit(self, unit: int, tex_id, target: int = GL_TEXTURE_2D) -> None:
+        # unbinding passes 0, it clears the unit for every target
+        tex_id = objectName(tex_id)
+        cached = self.textures.get(unit)
+        if cached is not None and cached[0] == tex_id and (tex_id == 0 or cached[1] == target):
+            actual = tex_id
+            if self.debug and target in TEXTURE_BINDINGS:
+                actual = int(glGetIntegeri_v(TEXTURE_BINDINGS[target], unit))
+            self.skip("texture unit %d" % unit, tex_id, actual)
+            return
+        glBindTextureUnit(unit, tex_id)
+        self.textures[unit] = (tex_id, target)
+        self.issued += 1
+
+    def bindFramebuffer(self, target: int, fbo_id) -> None:
+        fbo_id = objectName(fbo_id)
+        draw = target in (GL_FRAMEBUFFER, GL_DRAW_FRAMEBUFFER)
+        read = target in (GL_FRAMEBUFFER, GL_READ_FRAMEBUFFER)
+        if (not draw or self.draw_framebuffer == fbo_id) and (not read or self.read_framebuffer == fbo_id):
+            actual = fbo_id
+            if self.debug:
+                actual = int(glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING if draw else GL_READ_FRAMEBUFFER_BINDING))
+            self.skip("framebuffer binding", fbo_id, actual)
+            return
+        glBindFramebuffer(target, fbo_id)
+        if draw:
+            self.draw_framebuffer = fbo_id
+        if read:
+            self.read_framebuffer = fbo_id
+        self.issued += 1
+
+    def report(self) -> str:
+        issued, skipped = self.last_frame
+        return f"binds issued: {issued}, skipped: {skipped}"
+
+
+def stateCache() -> StateCache:
+    # the cache of the current context, every QOpenGLWidget has its own context
+    cache = contextdata.getValue(STATE_CACHE_KEY)
+    if cache is None:
+        cache = StateCache()
+        contextdata.setValue(STATE_CACHE_KEY, cache)
+    return cache
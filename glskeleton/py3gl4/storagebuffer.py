@@ -0,0 +1,164 @@
+# refer to https://www.khronos.org/opengl/wiki/Shader_Storage_Buffer_Object
+# refer to https://www.khronos.org/opengl/wiki/Atomic_Counter
+# std430 rules are in section 7.6.2.2 of https://registry.khronos.org/OpenGL/specs/gl/glspec46.core.pdf
+# Buffers of structured elements which shaders read and write, the elements are described by a NumPy dtype,
+# so writes, reads and mapped views keep the fields of every element. After a shader wrote the buffer,
+# call glMemoryBarrier(GL_BUFFER_UPDATE_BARRIER_BIT) before read() or map()
+from ctypes import c_uint, c_ubyte
+
+from OpenGL.GL import glCreateBuffers, glBindBuffer, glBindBufferBase, glBindBufferRange, glNamedBufferStorage, \
+    glNamedBufferSubData, glGetNamedBufferSubData, glMapNamedBufferRange, glUnmapNamedBuffer, \
+    glClearNamedBufferSubData, glIsBuffer, glDeleteBuffers, GL_SHADER_STORAGE_BUFFER, GL_ATOMIC_COUNTER_BUFFER, \
+    GL_DYNAMIC_STORAGE_BIT, GL_MAP_READ_BIT, GL_R8UI, GL_R32UI, GL_R32I, GL_R32F, GL_RED, GL_RED_INTEGER, \
+    GL_UNSIGNED_BYTE, GL_UNSIGNED_INT, GL_INT, GL_FLOAT
+import numpy as np
+
+from py3gl4.uniformbuffer import UNIFORM_TYPES, blockLayout
+
+# element type: (internal format, pixel format, pixel type) of glClearNamedBufferSubData
+CLEAR_FORMATS = {
+    np.dtype(np.uint8): (GL_R8UI, GL_RED_INTEGER, GL_UNSIGNED_BYTE),
+    np.dtype(np.uint32): (GL_R32UI, GL_RED_INTEGER, GL_UNSIGNED_INT),
+    np.dtype(np.int32): (GL_R32I, GL_RED_INTEGER, GL_INT),
+    np.dtype(np.float32): (GL_R32F, GL_RED, GL_FLOAT),
+}
+
+
+def std430Layout(members: list[tuple[str, int, int]]) -> np.dtype:
+    # members are (name, type, array size) in declaration order like std140Layout, the result is the dtype
+    # of one element of an unsized array, e.g. struct Particle { vec3 position; float life; };
+    # unlike std140, scalar and vec2 arrays and the element itself are not rounded up to 16 bytes
+    described = []
+    offset = 0
+    largest = 4
+    for name, type, count in members:
+        scalar, rows, columns = UNIFORM_TYPES[type]
+        # a matrix is an array of column vectors, vec3 is aligned like vec4
+        alignment = 4 * (4 if rows == 3 else rows)
+        if columns > 1:
+            stride = alignment * columns
+            size = stride * count
+        else:
+            stride = alignment
+            size = stride * (count - 1) + 4 * rows
+        offset = (offset + alignment - 1) // alignment * alignment
+        described.append((name, type, count, offset,
+                          stride if count > 1 else 0, alignment if columns > 1 else 0))
+        offset += size
+        largest = max(largest, alignment)
+    return blockLayout(described, (offset + largest - 1) // largest * largest)
+
+
+class StorageBuffer:
+    def __init__(self, target: c_uint, data: np.ndarray = None, dtype: np.dtype = None, count: int = 0,
+                 binding: int = None, flags: int = GL_DYNAMIC_STORAGE_BIT | GL_MAP_READ_BIT) -> None:
+        # data fills the buffer, otherwise count elements of dtype are left for the GPU to write,
+        # flags without GL_MAP_READ_BIT give the driver the most freedom but rule out map()
+        self.buffer_id = c_uint()
+        self.target = target
+        if data is not None:
+            # the first axis counts the elements, e.g. (N, 4, 4) model matrices are N elements of 64 bytes
+            data = np.ascontiguousarray(data)
+            dtype, count = np.dtype((data.dtype, data.shape[1:])), len(data)
+        if dtype is None:
+            raise ValueError("StorageBuffer needs data or a dtype")
+        self.dtype = np.dtype(dtype)
+        self.count = count
+        self.nbytes = self.dtype.itemsize * count
+        # the element view of the mapped range, only valid until unmap()
+        self.mapped: np.ndarray = None
+        glCreateBuffers(1, self.buffer_id)
+        glNamedBufferStorage(self.buffer_id, self.nbytes, None if data is None else data.view(np.uint8), flags)
+        if binding is not None:
+            self.bindBase(binding)
+
+    def bind(self) -> None:
+        glBindBuffer(self.target, self.buffer_id)
+
+    def unbind(self) -> None:
+        glBindBuffer(self.target, 0)
+
+    def bindBase(self, index: int) -> None:
+        glBindBufferBase(self.target, index, self.buffer_id)
+
+    def bindRange(self, index: int, offset: int, size: int) -> None:
+        glBindBufferRange(self.target, index, self.buffer_id, offset, size)
+
+    def delete(self) -> None:
+        if self.mapped is not None:
+            self.unmap()
+        if glIsBuffer(self.buffer_id):
+            glDeleteBuffers(1, self.buffer_id)
+
+    def elementRange(self, first: int, count: int) -> tuple[int, int]:
+        # (offset, size) in bytes of count elements from first, None counts to the end
+        count = self.count - first if count is None else count
+        if first < 0 or count < 0 or first + count > self.count:
+            raise ValueError("elements %d to %d are outside of the %d elements of the buffer"
+                             % (first, first + count, self.count))
+        return first * self.dtype.itemsize, count * self.dtype.itemsize
+
+    def write(self, data: np.ndarray, first: int = 0) -> None:
+        # needs GL_DYNAMIC_STORAGE_BIT
+        data = np.ascontiguousarray(data, dtype=self.dtype.base)
+        offset, size = self.elementRange(first, len(data))
+        glNamedBufferSubData(self.buffer_id, offset, size, data.view(np.uint8))
+
+    def read(self, first: int = 0, count: int = None) -> np.ndarray:
+        # a copy of the elements, waits until the GPU wrote them
+        offset, size = self.elementRange(first, count)
+        data = np.empty(size // self.dtype.itemsize, dtype=self.dtype)
+        glGetNamedBufferSubData(self.buffer_id, offset, size, data.view(np.uint8))
+        return data
+
+    def map(self, first: int = 0, count: int = None, access: int = GL_MAP_READ_BIT) -> np.ndarray:
+        # the elements without a copy, the view is invalid after unmap(), and the GPU can not use
+        # the buffer while it is mapped, unless it was created and mapped with GL_MAP_PERSISTENT_BIT
+        if self.mapped is not None:
+            raise RuntimeError("the buffer is already mapped, unmap() it first")
+        offset, size = self.elementRange(first, count)
+        pointer = glMapNamedBufferRange(self.buffer_id, offset, size, access)
+        if not pointer:
+            raise RuntimeError("glMapNamedBufferRange failed to map %d bytes at %d" % (size, offset))
+        self.mapped = np.frombuffer((c_ubyte * size).from_address(pointer), dtype=self.dtype)
+        return self.mapped
+
+    def unmap(self) -> None:
+        self.mapped = None
+        glUnmapNamedBuffer(self.buffer_id)
+
+    def clear(self, value=0, offset: int = 0, size: int = None) -> None:
+        # fills a byte range with a repeated value on the GPU, nothing is uploaded,
+        # scalar buffers repeat their own type, structured buffers repeat a uint32 or a float32
+        size = self.nbytes - offset if size is None else size
+        if self.dtype.base.fields is None and self.dtype.base in CLEAR_FORMATS:
+            dtype = self.dtype.base
+        else:
+            dtype = np.dtype(np.float32 if isinstance(value, float) else np.uint32)
+        internalFormat, pixelFormat, pixelType = CLEAR_FORMATS[dtype]
+        if offset % dtype.itemsize or size % dtype.itemsize:
+            raise ValueError("a %s clear needs a range aligned to %d bytes" % (dtype, dtype.itemsize))
+        glClearNamedBufferSubData(self.buffer_id, internalFormat, offset, size, pixelFormat, pixelType,
+                                  np.array([value], dtype=dtype))
+
+
+class ShaderStorageBuffer(StorageBuffer):
+    def __init__(self, data: np.ndarray = None, dtype: np.dtype = None, count: int = 0, binding: int = None,
+                 flags: int = GL_DYNAMIC_STORAGE_BIT | GL_MAP_READ_BIT) -> None:
+        super().__init__(GL_SHADER_STORAGE_BUFFER, data, dtype, count, binding, flags)
+        self.ssbo_id = self.buffer_id
+
+
+class AtomicCounterBuffer(StorageBuffer):
+    # count uint counters by default, any dtype works as long as the counters are its 4-byte aligned uints,
+    # e.g. the instanceCount of a draw command, see GPUCuller
+    def __init__(self, count: int = 1, binding: int = None, data: np.ndarray = None,
+                 flags: int = GL_DYNAMIC_STORAGE_BIT | GL_MAP_READ_BIT) -> None:
+        dtype = None if data is not None else np.uint32
+        super().__init__(GL_ATOMIC_COUNTER_BUFFER, data, dtype, count, binding, flags)
+        self.acbo_id = self.buffer_id
+        if data is None:
+            self.reset()
+
+    def reset(self, value: int = 0) -> None:
+        self.clear(value)
@@ -0,0 +1,118 @@
+# refer to https://registry.khronos.org/OpenGL/specs/gl/glspec46.core.pdf
+# refer to https://www.khronos.org/opengl/wiki/Buffer_Object_Streaming
+# A persistently mapped buffer split into N ring segments, each segment is guarded by a fence,
+# so the CPU writes the next segment while the GPU still reads the previous ones
+from ctypes import c_uint, c_ubyte, c_void_p, POINTER, cast
+
+from OpenGL.GL import glCreateBuffers, glBindBuffer, glBindBufferRange, glNamedBufferStorage, glMapNamedBufferRange, \
+    glUnmapNamedBuffer, glIsBuffer, glDeleteBuffers, glFenceSync, glClientWaitSync, glDeleteSync, \
+    GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER, GL_MAP_WRITE_BIT, GL_MAP_PERSISTENT_BIT, \
+    GL_MAP_COHERENT_BIT, GL_SYNC_GPU_COMMANDS_COMPLETE, GL_SYNC_FLUSH_COMMANDS_BIT, \
+    GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED, GL_WAIT_FAILED
+import numpy as np
+
+# segment offsets are kept aligned, so any vertex/index type and uniform/storage ranges can start there
+SEGMENT_ALIGNMENT = 256
+# nanoseconds to wait for one segment before flushing again
+FENCE_TIMEOUT = 1000000000
+
+
+class StreamingBuffer:
+    def __init__(self, target: c_uint, segment_size: int, segments: int = 3) -> None:
+        if segments < 1:
+            raise ValueError("StreamingBuffer needs at least one segment")
+        self.buffer_id = c_uint()
+        self.target = target
+        self.segment_size = (segment_size + SEGMENT_ALIGNMENT - 1) // SEGMENT_ALIGNMENT * SEGMENT_ALIGNMENT
+        self.segments = segments
+        self.size = self.segment_size * segments
+        self.index = segments - 1
+        self.fences = [None] * segments
+        # how many times the CPU had to wait for the GPU, should stay 0 with enough segments
+        self.stalls = 0
+        flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+        glCreateBuffers(1, self.buffer_id)
+        glNamedBufferStorage(self.buffer_id, self.size, None, flags)
+        pointer = glMapNamedBufferRange(self.buffer_id, 0, self.size, flags)
+        if not pointer:
+            self.delete()
+            raise RuntimeError("glMapNamedBufferRange failed to map the streaming buffer")
+        self.memory = np.ctypeslib.as_array(
+            cast(c_void_p(pointer), POINTER(c_ubyte)), shape=(self.size,))
+
+    @property
+    def offset(self) -> int:
+        # byte offset of the current segment, pass it to setVertexBuffer or the draw call
+        return self.index * self.segment_size
+
+    def bind(self) -> None:
+        glBindBuffer(self.target, self.buffer_id)
+
+    def unbind(self) -> None:
+        glBindBuffer(self.target, 0)
+
+    def bindRange(self, index: int, offset: int, size: int) -> None:
+        # for indexed targets, e.g. a segment holding uniform or shader storage data
+        glBindBufferRange(self.target, index, self.buffer_id, offset, size)
+
+    def delete(self) -> None:
+        for fence in self.fences:
+            if fence is not None:
+                glDeleteSync(fence)
+        self.fences = [None] * self.segments
+        self.memory = None
+        if glIsBuffer(self.buffer_id):
+            glUnmapNamedBuffer(self.buffer_id)
+            glDeleteBuffers(1, self.buffer_id)
+
+    def nextSegment(self, dtype: np.dtype = np.uint8) -> np.ndarray:
+        # advance the ring, wait until the GPU released that segment and return it as a writable view
+        self.index = (self.index + 1) % self.segments
+        self.waitSegment(self.index)
+        start = self.offset
+        return self.memory[start:start + self.segment_size].view(dtype)
+
+    def write(self, data: np.ndarray) -> int:
+        # copy data into the next segment, return the byte offset to use for binding or drawing
+        if data.nbytes > self.segment_size:
+            raise ValueError(
+                "data (%d bytes) does not fit into a segment (%d bytes)" % (data.nbytes, self.segment_size))
+        segment = self.nextSegment()
+        segment[:data.nbytes] = np.frombuffer(np.ascontiguousarray(data), dtype=np.uint8)
+        return self.offset
+
+    def lockSegment(self) -> None:
+        # call after the draw calls which read the current segment were issued
+        fence = self.fences[self.index]
+        if fence is not None:
+            glDeleteSync(fence)
+        self.fences[self.index] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+
+    def waitSegment(self, index: int) -> None:
+        fence = self.fences[index]
+        if fence is None:
+            return
+        flags = 0
+        while True:
+            result = glClientWaitSync(fence, flags, 0 if flags == 0 else FENCE_TIMEOUT)
+            if result in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            if result == GL_WAIT_FAILED:
+                raise RuntimeError("glClientWaitSync failed while waiting for a streaming segment")
+            if flags == 0:
+                self.stalls += 1
+            flags = GL_SYNC_FLUSH_COMMANDS_BIT
+        glDeleteSync(fence)
+        self.fences[index] = None
+
+
+class StreamingVertexBuffer(StreamingBuffer):
+    def __init__(self, segment_size: int, segments: int = 3) -> None:
+        super().__init__(GL_ARRAY_BUFFER, segment_size, segments)
+        self.vbo_id = self.buffer_id
+
+
+class StreamingElementBuffer(StreamingBuffer):
+    def __init__(self, segment_size: int, segments: int = 3) -> None:
+        super().__init__(GL_ELEMENT_ARRAY_BUFFER, segment_size, segments)
+        self.ebo_id = self.buffer_id
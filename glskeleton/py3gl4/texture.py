@@ -1,73 +1,196 @@
 # refer to https://registry.khronos.org/OpenGL/specs/gl/glspec46.core.pdf
 from ctypes import c_uint, c_int
+from functools import lru_cache
 from pathlib import Path
 
-from OpenGL.GL import glCreateTextures, glBindTextureUnit, glDeleteTextures, glIsTexture, \
-    GL_TEXTURE_2D, glTextureStorage2D, glTextureParameteri, GL_TEXTURE_MIN_FILTER, \
+from OpenGL.GL import glCreateTextures, glDeleteTextures, glIsTexture, \
+    GL_TEXTURE_2D, GL_TEXTURE_2D_ARRAY, glTextureStorage2D, glTextureStorage3D, glTextureSubImage3D, glTextureParameteri, GL_TEXTURE_MIN_FILTER, \
     GL_TEXTURE_MAG_FILTER, GL_TEXTURE_WRAP_S, GL_TEXTURE_WRAP_T, glBindImageTexture, \
-    GL_FALSE, GL_RGBA32F, GL_RED, GL_RGB, GL_RGBA, GL_LINEAR, GL_NEAREST, GL_REPEAT, \
-    glTextureSubImage2D, GL_UNSIGNED_BYTE, glGenerateTextureMipmap, GL_R32F, GL_RGB32F
+    GL_FALSE, GL_RGBA32F, GL_RGBA, GL_FLOAT, GL_LINEAR, GL_NEAREST, GL_REPEAT, glTextureSubImage2D, glGenerateTextureMipmap, \
+    glPixelStorei, GL_UNPACK_ALIGNMENT, GL_LINEAR_MIPMAP_LINEAR, GL_NEAREST_MIPMAP_NEAREST, glTextureParameterf, \
+    glGetFloatv, GL_TEXTURE_MAX_ANISOTROPY, GL_MAX_TEXTURE_MAX_ANISOTROPY
+import numpy as np
 from PIL import Image
 
+from py3gl4.statecache import stateCache
+from py3gl4.textureformat import LINEAR, MODE_TYPES, imageFormat, convertPixels, pixelType, formatName, textureSize, \
+    isFilterable, mipLevels, mipChain
+
+
+def decodeImage(file_path: str, usage: str = LINEAR, mode: str = None) -> tuple[int, int, int, int, int, np.ndarray]:
+    # needs no OpenGL context, so TextureLoader runs it on worker threads, returns
+    # (width, height, pixel format, pixel type, internal format, pixels),
+    # rows are returned bottom to top as glTextureSubImage2D expects them,
+    # mode forces a Pillow mode, e.g. when several images share one texture
+    with Image.open(Path(file_path)) as image:
+        mode, pixelFormat, internalFormat = imageFormat(mode or image.mode, usage)
+        if image.mode != mode:
+            image = image.convert(mode)
+        width, height = image.size
+        pixels = np.frombuffer(image.tobytes("raw", mode, 0, -1), dtype=MODE_TYPES[mode])
+    pixels = convertPixels(pixels, usage)
+    return width, height, pixelFormat, pixelType(pixels), internalFormat, pixels
+
+
+@lru_cache(maxsize=None)
+def maxAnisotropy() -> float:
+    # requires a current context, core since OpenGL 4.6
+    return float(glGetFloatv(GL_MAX_TEXTURE_MAX_ANISOTROPY))
+
+
+def memoryReport(textures: dict[str, "Texture"]) -> str:
+    lines = []
+    total = 0
+    for name, texture in textures.items():
+        size = texture.memorySize()
+        total += size
+        layers = f"x{texture.layers}" if isinstance(texture, Texture2DArray) else ""
+        lines.append(f"{name}: {texture.width}x{texture.height}{layers} {formatName(texture.internalFormat)} "
+                     f"{texture.levels} level(s) {size / 1024:.1f} KiB")
+    lines.append(f"total: {total / 1024:.1f} KiB")
+    return "\n".join(lines)
+
 
 class Texture:
     def __init__(self, target: c_uint) -> None:
         self.tex_id = c_uint()
+        self.target = target
         glCreateTextures(target, 1, self.tex_id)
 
     def bind(self, index: c_uint) -> None:
-        glBindTextureUnit(index, self.tex_id)
+        stateCache().bindTextureUnit(index, self.tex_id, self.target)
 
     def unbind(self, index: c_uint) -> None:
-        glBindTextureUnit(index, 0)
+        stateCache().bindTextureUnit(index, 0, self.target)
 
     def delete(self) -> None:
         if glIsTexture(self.tex_id):
             glDeleteTextures(1, self.tex_id)
+            stateCache().invalidate()
 
     def SetFiltering(self, min_filter: c_int, mag_filter: c_int) -> None:
         glTextureParameteri(self.tex_id, GL_TEXTURE_MIN_FILTER, min_filter)
         glTextureParameteri(self.tex_id, GL_TEXTURE_MAG_FILTER, mag_filter)
 
+    def setMipmapFiltering(self) -> None:
+        if isFilterable(self.internalFormat):
+            self.SetFiltering(GL_LINEAR_MIPMAP_LINEAR, GL_NEAREST)
+        else:
+            self.SetFiltering(GL_NEAREST_MIPMAP_NEAREST, GL_NEAREST)
+
+    def setAnisotropy(self, anisotropy: float) -> float:
+        # 1.0 turns it off, the value is clamped to what the driver supports and returned
+        anisotropy = min(max(anisotropy, 1.0), maxAnisotropy())
+        glTextureParameterf(self.tex_id, GL_TEXTURE_MAX_ANISOTROPY, anisotropy)
+        return anisotropy
+
+    def setWrapMode(self, wrap_s: c_int, wrap_t: c_int) -> None:
+        glTextureParameteri(self.tex_id, GL_TEXTURE_WRAP_S, wrap_s)
+        glTextureParameteri(self.tex_id, GL_TEXTURE_WRAP_T, wrap_t)
+
 
 class Texture2D(Texture):
-    def __init__(self, level: c_int=1, internalFormat: c_int=GL_RGBA32F, width: c_uint=1, height: c_uint=1, file_path:str=None) -> None:
+    def __init__(self, level: c_int=1, internalFormat: c_int=GL_RGBA32F, width: c_uint=1, height: c_uint=1, file_path:str=None,
+                 usage: str = LINEAR, mipmaps: bool = True, cpu_mipmaps: bool = False) -> None:
+        # usage picks the internal format of file textures, see py3gl4.textureformat,
+        # file textures get a full mipmap chain unless mipmaps is False
         super().__init__(GL_TEXTURE_2D)
         if file_path is None:
-            self.internalFormat = internalFormat
-            glTextureStorage2D(self.tex_id, level, internalFormat, width, height)
+            self.allocate(level, internalFormat, width, height)
         else:
-            filename = Path(file_path)
-            # image = Image.open(filename).transpose(Image.FLIP_TOP_BOTTOM)
-            image = Image.open(filename)
-            if image is not None:
-                self.bind(0)
-                width, height = image.size
-                mode = image.mode
-                image = image.tobytes("raw", mode, 0, -1)
-                if mode == "L":
-                    self.pixelFormat = GL_RED
-                    self.internalFormat = GL_R32F
-                elif mode == "RGB":
-                    self.pixelFormat = GL_RGB
-                    self.internalFormat = GL_RGB32F
-                elif mode == "RGBA":
-                    self.pixelFormat = GL_RGBA
-                    self.internalFormat = GL_RGBA32F
-                else:
-                    self.pixelFormat = GL_RGBA
-                    self.internalFormat = GL_RGBA32F
-                glTextureStorage2D(self.tex_id, 1, self.internalFormat, width, height)
-                self.SetFiltering(GL_LINEAR, GL_NEAREST)
-                self.setWrapMode(GL_REPEAT, GL_REPEAT)
-                glTextureSubImage2D(self.tex_id, 0, 0, 0, width, height, self.pixelFormat, GL_UNSIGNED_BYTE, image)
-                # glGenerateTextureMipmap(self.tex_id)
-                self.unbind(0)
+            width, height, self.pixelFormat, self.pixelType, internalFormat, pixels = decodeImage(file_path, usage)
+            self.bind(0)
+            self.allocate(mipLevels(width, height) if mipmaps else 1, internalFormat, width, height)
+            self.SetFiltering(GL_LINEAR, GL_NEAREST)
+            self.setWrapMode(GL_REPEAT, GL_REPEAT)
+            self.uploadLevel(0, width, height, pixels)
+            if mipmaps:
+                self.generateMipmap(pixels if cpu_mipmaps or not isFilterable(internalFormat) else None)
+            self.unbind(0)
 
-    def setWrapMode(self, wrap_s: c_int, wrap_t: c_int) -> None:
-        glTextureParameteri(self.tex_id, GL_TEXTURE_WRAP_S, wrap_s)
-        glTextureParameteri(self.tex_id, GL_TEXTURE_WRAP_T, wrap_t)
+    def allocate(self, levels: int, internalFormat: int, width: int, height: int) -> None:
+        self.levels = levels
+        self.internalFormat = internalFormat
+        self.width = width
+        self.height = height
+        glTextureStorage2D(self.tex_id, levels, internalFormat, width, height)
+
+    def uploadLevel(self, level: int, width: int, height: int, pixels: np.ndarray) -> None:
+        # RGB is padded to RGBA, single and two channel rows can still be unaligned
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTextureSubImage2D(self.tex_id, level, 0, 0, width, height, self.pixelFormat, self.pixelType, pixels)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+
+    def uploadRegion(self, x: int, y: int, pixels: np.ndarray, pixelFormat: int = GL_RGBA,
+                     pixelType: int = GL_FLOAT) -> None:
+        # pixels is the (height, width, channels) rectangle of level 0 at (x, y), e.g. a tile computed on the CPU
+        height, width = pixels.shape[:2]
+        glTextureSubImage2D(self.tex_id, 0, x, y, width, height, pixelFormat, pixelType, np.ascontiguousarray(pixels))
+
+    def generateMipmap(self, pixels: np.ndarray = None) -> None:
+        # fills the levels 1 and up from level 0, the GPU filters unless the level 0 pixels are passed,
+        # formats the GPU cannot filter, e.g. integer formats, need them for a box filter on the CPU
+        if self.levels == 1:
+            return
+        if pixels is None and not isFilterable(self.internalFormat):
+            raise ValueError("%s can not be filtered by glGenerateTextureMipmap, pass the level 0 pixels"
+                             % formatName(self.internalFormat))
+        if pixels is None:
+            glGenerateTextureMipmap(self.tex_id)
+        else:
+            self.uploadMipChain(mipChain(pixels, self.width, self.height, self.levels))
+        self.setMipmapFiltering()
+
+    def uploadMipChain(self, chain: list[tuple[np.ndarray, int, int]]) -> None:
+        for level, (pixels, width, height) in enumerate(chain, 1):
+            self.uploadLevel(level, width, height, pixels)
+
+    def memorySize(self) -> int:
+        return textureSize(self.internalFormat, self.width, self.height, self.levels)
 
     def bingImage(self, index: c_uint, level: c_int, access: c_uint) -> None:
         glBindImageTexture(index, self.tex_id, level,
                            GL_FALSE, 0, access, self.internalFormat)
+
+
+# refer to https://www.khronos.org/opengl/wiki/Array_Texture
+# all layers share size, format and sampler state, so one bind serves every image stored in it
+class Texture2DArray(Texture):
+    def __init__(self, levels: c_int, internalFormat: c_int, width: c_uint, height: c_uint, layers: c_uint,
+                 pixelFormat: c_uint = None, pixelType: c_uint = None) -> None:
+        # pixelFormat and pixelType describe the pixels later passed to uploadLayer
+        super().__init__(GL_TEXTURE_2D_ARRAY)
+        self.levels = levels
+        self.internalFormat = internalFormat
+        self.width = width
+        self.height = height
+        self.layers = layers
+        self.pixelFormat = pixelFormat
+        self.pixelType = pixelType
+        glTextureStorage3D(self.tex_id, levels, internalFormat, width, height, layers)
+
+    def uploadLayer(self, layer: int, pixels: np.ndarray, level: int = 0, width: int = None, height: int = None) -> None:
+        # the whole layer of level 0 unless the size of a smaller level is given
+        width = self.width if width is None else width
+        height = self.height if height is None else height
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTextureSubImage3D(self.tex_id, level, 0, 0, layer, width, height, 1, self.pixelFormat, self.pixelType, pixels)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+
+    def generateMipmap(self, layer_pixels: list[np.ndarray] = None) -> None:
+        # like Texture2D.generateMipmap, layer_pixels holds the level 0 pixels of every layer
+        if self.levels == 1:
+            return
+        if layer_pixels is None and not isFilterable(self.internalFormat):
+            raise ValueError("%s can not be filtered by glGenerateTextureMipmap, pass the level 0 pixels"
+                             % formatName(self.internalFormat))
+        if layer_pixels is None:
+            glGenerateTextureMipmap(self.tex_id)
+        else:
+            for layer, pixels in enumerate(layer_pixels):
+                for level, (data, width, height) in enumerate(mipChain(pixels, self.width, self.height, self.levels), 1):
+                    self.uploadLayer(layer, data, level, width, height)
+        self.setMipmapFiltering()
+
+    def memorySize(self) -> int:
+        return textureSize(self.internalFormat, self.width, self.height, self.levels, self.layers)
@@ -0,0 +1,122 @@
+# refer to https://www.khronos.org/opengl/wiki/Array_Texture
+# Many small images are packed into the layers of one Texture2DArray with shelf packing, a shader maps
+# the texture coordinates of an image with its row of the remap table:
+#   vec3(offset + uv * scale, layer)
+# images do not repeat inside the atlas, and each image is surrounded by a copy of its edge texels,
+# so bilinear filtering and the mipmap levels kept by the atlas do not bleed into the neighbours
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenGL.GL import GL_LINEAR, GL_CLAMP_TO_EDGE
+import numpy as np
+
+from py3gl4.texture import Texture2DArray, decodeImage
+from py3gl4.textureformat import LINEAR, isFilterable
+
+
+class AtlasRegion:
+    def __init__(self, name: str, index: int, layer: int, x: int, y: int, width: int, height: int) -> None:
+        self.name = name
+        # row in remapTable() and layerTable()
+        self.index = index
+        self.layer = layer
+        # texels of the image itself, without the padding around it
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+def packRectangles(sizes: list[tuple[int, int]], width: int, height: int) -> tuple[list[tuple[int, int, int]], int]:
+    # shelf packing, the tallest rectangles go first and every shelf is as tall as its first rectangle,
+    # returns (layer, x, y) of every rectangle in the order of sizes and the number of layers used
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    placements = [None] * len(sizes)
+    layer, x, y, shelf = 0, 0, 0, 0
+    for i in order:
+        w, h = sizes[i]
+        if w > width or h > height:
+            raise ValueError("a %dx%d rectangle does not fit into a %dx%d layer" % (w, h, width, height))
+        if x + w > width:
+            x, y, shelf = 0, y + shelf, 0
+        if y + h > height:
+            layer, x, y, shelf = layer + 1, 0, 0, 0
+        placements[i] = (layer, x, y)
+        x += w
+        shelf = max(shelf, h)
+    return placements, layer + 1 if sizes else 0
+
+
+class TextureAtlas:
+    def __init__(self, width: int = 1024, height: int = 1024, padding: int = 4, usage: str = LINEAR,
+                 workers: int = 4) -> None:
+        self.width = width
+        self.height = height
+        # texels of edge copies around every image, mipmap levels stop where the padding shrinks below 1 texel
+        self.padding = padding
+        self.levels = max(padding.bit_length(), 1)
+        self.usage = usage
+        self.workers = workers
+        self.files: dict[str, str] = {}
+        self.regions: dict[str, AtlasRegion] = {}
+        self.layers = 0
+
+    def add(self, name: str, file_path: str) -> None:
+        self.files[name] = file_path
+
+    def __getitem__(self, name: str) -> AtlasRegion:
+        return self.regions[name]
+
+    def build(self) -> Texture2DArray:
+        # decodes every image on a thread pool, packs them and uploads the layers, requires a current context
+        names = list(self.files)
+        if not names:
+            raise ValueError("the atlas has no images, add() some before build()")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            images = list(executor.map(lambda name: decodeImage(self.files[name], self.usage, "RGBA"), names))
+        # sizes are rounded up to the last mipmap level, so the padding of every image stays on its own texels
+        alignment = 1 << (self.levels - 1)
+        sizes = []
+        for width, height, *_ in images:
+            sizes.append(((width + 2 * self.padding + alignment - 1) // alignment * alignment,
+                          (height + 2 * self.padding + alignment - 1) // alignment * alignment))
+        placements, self.layers = packRectangles(sizes, self.width, self.height)
+
+        # every image was converted to RGBA with the same usage, so they share the formats
+        _, _, pixelFormat, pixelType, internalFormat, first = images[0]
+        layer_pixels = [np.zeros((self.height, self.width, 4), dtype=first.dtype) for _ in range(self.layers)]
+        self.regions = {}
+        for index, (name, (width, height, _, _, _, pixels), (layer, x, y)) in enumerate(zip(names, images, placements)):
+            image = np.pad(pixels.reshape(height, width, 4), ((self.padding,) * 2, (self.padding,) * 2, (0, 0)),
+                           mode="edge")
+            layer_pixels[layer][y:y + image.shape[0], x:x + image.shape[1]] = image
+            self.regions[name] = AtlasRegion(name, index, layer, x + self.padding, y + self.padding, width, height)
+
+        texture = Texture2DArray(self.levels, internalFormat, self.width, self.height, self.layers,
+                                 pixelFormat, pixelType)
+        for layer, pixels in enumerate(layer_pixels):
+            texture.uploadLayer(layer, pixels.reshape(-1))
+        texture.SetFiltering(GL_LINEAR, GL_LINEAR)
+        texture.setWrapMode(GL_CLAMP_TO_EDGE, GL_CLAMP_TO_EDGE)
+        texture.generateMipmap(None if isFilterable(internalFormat) else [pixels.reshape(-1) for pixels in layer_pixels])
+        return texture
+
+    def remapTable(self) -> np.ndarray:
+        # one vec4 (offset u, offset v, scale u, scale v) per image, ready for a uniform or storage buffer
+        table = np.zeros((len(self.regions), 4), dtype=np.float32)
+        for region in self.regions.values():
+            table[region.index] = (region.x / self.width, region.y / self.height,
+                                   region.width / self.width, region.height / self.height)
+        return table
+
+    def layerTable(self) -> np.ndarray:
+        table = np.zeros(len(self.regions), dtype=np.int32)
+        for region in self.regions.values():
+            table[region.index] = region.layer
+        return table
+
+    def report(self) -> str:
+        # call after build()
+        used = sum(region.width * region.height for region in self.regions.values())
+        capacity = self.width * self.height * self.layers
+        return (f"{len(self.regions)} images in {self.layers} layer(s) of {self.width}x{self.height}, "
+                f"{100.0 * used / capacity:.1f}% of the texels used")
@@ -0,0 +1,132 @@
+# refer to https://www.khronos.org/opengl/wiki/Image_Format
+# refer to https://www.khronos.org/opengl/wiki/Pixel_Transfer#Pixel_layout
+# The internal format is picked from the Pillow mode of the image and what the texture is used for,
+# 8-bit images stay 8-bit on the GPU, RGB is padded to RGBA so every row is 4-byte aligned
+from OpenGL.GL import GL_RED, GL_RG, GL_RGBA, GL_UNSIGNED_BYTE, GL_UNSIGNED_SHORT, GL_HALF_FLOAT, \
+    GL_FLOAT, GL_R8, GL_RG8, GL_RGB8, GL_RGBA8, GL_SRGB8, GL_SRGB8_ALPHA8, GL_R16, GL_R16F, GL_RG16F, \
+    GL_RGB16F, GL_RGBA16F, GL_R32F, GL_RG32F, GL_RGB32F, GL_RGBA32F, GL_DEPTH24_STENCIL8, GL_R8UI, GL_R16UI, \
+    GL_R32UI, GL_R32I, GL_RG8UI, GL_RGBA8UI, GL_RGBA16UI, GL_RGBA32UI
+import numpy as np
+
+# what the texels mean, chosen by the caller
+# LINEAR: 8-bit values sampled as they are stored, e.g. normal, roughness or data maps
+# SRGB: color images, the sampler converts sRGB to linear so lighting is done in linear space
+# HALF: 16-bit float storage for values which are written or filtered beyond 8-bit precision
+LINEAR = "linear"
+SRGB = "srgb"
+HALF = "half"
+
+# bytes per texel of the internal formats used in py3gl4, RGB formats are counted as stored,
+# drivers are free to pad them to 4 components
+TEXEL_SIZES = {
+    GL_R8: 1, GL_RG8: 2, GL_RGB8: 3, GL_RGBA8: 4, GL_SRGB8: 3, GL_SRGB8_ALPHA8: 4,
+    GL_R16: 2, GL_R16F: 2, GL_RG16F: 4, GL_RGB16F: 6, GL_RGBA16F: 8,
+    GL_R32F: 4, GL_RG32F: 8, GL_RGB32F: 12, GL_RGBA32F: 16, GL_DEPTH24_STENCIL8: 4,
+    GL_R8UI: 1, GL_R16UI: 2, GL_R32UI: 4, GL_R32I: 4, GL_RG8UI: 2, GL_RGBA8UI: 4, GL_RGBA16UI: 8, GL_RGBA32UI: 16,
+}
+# integer textures are never filtered, glGenerateTextureMipmap rejects them
+INTEGER_FORMATS = frozenset({GL_R8UI, GL_R16UI, GL_R32UI, GL_R32I, GL_RG8UI, GL_RGBA8UI, GL_RGBA16UI, GL_RGBA32UI})
+
+FORMAT_NAMES = {
+    GL_R8: "GL_R8", GL_RG8: "GL_RG8", GL_RGB8: "GL_RGB8", GL_RGBA8: "GL_RGBA8", GL_SRGB8: "GL_SRGB8",
+    GL_SRGB8_ALPHA8: "GL_SRGB8_ALPHA8", GL_R16: "GL_R16", GL_R16F: "GL_R16F", GL_RG16F: "GL_RG16F",
+    GL_RGB16F: "GL_RGB16F", GL_RGBA16F: "GL_RGBA16F", GL_R32F: "GL_R32F", GL_RG32F: "GL_RG32F",
+    GL_RGB32F: "GL_RGB32F", GL_RGBA32F: "GL_RGBA32F", GL_DEPTH24_STENCIL8: "GL_DEPTH24_STENCIL8",
+    GL_R8UI: "GL_R8UI", GL_R16UI: "GL_R16UI", GL_R32UI: "GL_R32UI", GL_R32I: "GL_R32I", GL_RG8UI: "GL_RG8UI",
+    GL_RGBA8UI: "GL_RGBA8UI", GL_RGBA16UI: "GL_RGBA16UI", GL_RGBA32UI: "GL_RGBA32UI",
+}
+
+# Pillow mode: (upload mode, pixel format, {usage: internal format}), RGB is uploaded as RGBA,
+# single and two channel images have no sRGB format in core OpenGL and stay linear
+IMAGE_FORMATS = {
+    "L": ("L", GL_RED, {LINEAR: GL_R8, SRGB: GL_R8, HALF: GL_R16F}),
+    "LA": ("LA", GL_RG, {LINEAR: GL_RG8, SRGB: GL_RG8, HALF: GL_RG16F}),
+    "RGB": ("RGBA", GL_RGBA, {LINEAR: GL_RGBA8, SRGB: GL_SRGB8_ALPHA8, HALF: GL_RGBA16F}),
+    "RGBA": ("RGBA", GL_RGBA, {LINEAR: GL_RGBA8, SRGB: GL_SRGB8_ALPHA8, HALF: GL_RGBA16F}),
+    "I;16": ("I;16", GL_RED, {LINEAR: GL_R16, SRGB: GL_R16, HALF: GL_R16F}),
+    "F": ("F", GL_RED, {LINEAR: GL_R32F, SRGB: GL_R32F, HALF: GL_R16F}),
+}
+# data type of the decoded pixels of every upload mode
+MODE_TYPES = {"L": np.uint8, "LA": np.uint8, "RGBA": np.uint8, "I;16": np.uint16, "F": np.float32}
+PIXEL_TYPES = {np.dtype(np.uint8): GL_UNSIGNED_BYTE, np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+               np.dtype(np.float16): GL_HALF_FLOAT, np.dtype(np.float32): GL_FLOAT}
+
+
+def imageFormat(mode: str, usage: str = LINEAR) -> tuple[str, int, int]:
+    # returns (mode to convert the image to, pixel format, internal format),
+    # modes without an entry, e.g. palette or CMYK images, are converted to RGBA
+    if usage not in (LINEAR, SRGB, HALF):
+        raise ValueError("unknown texture usage %s" % usage)
+    upload_mode, pixelFormat, internalFormats = IMAGE_FORMATS.get(mode, IMAGE_FORMATS["RGBA"])
+    return upload_mode, pixelFormat, internalFormats[usage]
+
+
+def convertPixels(pixels: np.ndarray, usage: str) -> np.ndarray:
+    # HALF textures are uploaded as half floats, so the driver does not convert on the GL thread
+    if usage == HALF and pixels.dtype != np.float16:
+        scale = np.iinfo(pixels.dtype).max if pixels.dtype.kind in "ui" else 1.0
+        return (pixels / scale).astype(np.float16)
+    return pixels
+
+
+def pixelType(pixels: np.ndarray) -> int:
+    return PIXEL_TYPES[pixels.dtype]
+
+
+def isFilterable(internalFormat: int) -> bool:
+    return internalFormat not in INTEGER_FORMATS
+
+
+def formatName(internalFormat: int) -> str:
+    return FORMAT_NAMES.get(internalFormat, hex(int(internalFormat)))
+
+
+def textureSize(internalFormat: int, width: int, height: int, levels: int = 1, layers: int = 1) -> int:
+    # bytes of the storage, every mipmap level halves both sides down to 1x1
+    size = 0
+    for _ in range(levels):
+        size += width * height * layers
+        width, height = max(width // 2, 1), max(height // 2, 1)
+    return size * TEXEL_SIZES[internalFormat]
+
+
+def mipLevels(width: int, height: int) -> int:
+    # a full chain goes down to 1x1
+    return max(width, height).bit_length()
+
+
+def halve(image: np.ndarray, axis: int) -> np.ndarray:
+    # averages pairs along axis, an odd last element is folded into the last pair,
+    # so the result has the floor(n / 2) size OpenGL expects for the next level
+    size = image.shape[axis]
+    if size == 1:
+        return image
+    half = size // 2
+    even = np.take(image, range(0, 2 * half, 2), axis=axis)
+    odd = np.take(image, range(1, 2 * half, 2), axis=axis)
+    result = (even + odd) * 0.5
+    if size % 2:
+        last = [slice(None)] * image.ndim
+        last[axis] = slice(half - 1, half)
+        extra = np.take(image, [size - 1], axis=axis)
+        result[tuple(last)] = (result[tuple(last)] * 2.0 + extra) / 3.0
+    return result
+
+
+def downsample(pixels: np.ndarray, width: int, height: int) -> tuple[np.ndarray, int, int]:
+    # box filter of tightly packed rows from one level to the next
+    channels = pixels.size // (width * height)
+    image = pixels.reshape(height, width, channels).astype(np.float32)
+    image = halve(halve(image, 0), 1)
+    if pixels.dtype.kind in "ui":
+        image = np.rint(image)
+    return image.astype(pixels.dtype).reshape(-1), max(width // 2, 1), max(height // 2, 1)
+
+
+def mipChain(pixels: np.ndarray, width: int, height: int, levels: int) -> list[tuple[np.ndarray, int, int]]:
+    # (pixels, width, height) of the levels 1 to levels - 1
+    chain = []
+    for _ in range(1, levels):
+        pixels, width, height = downsample(pixels, width, height)
+        chain.append((pixels, width, height))
+    return chain
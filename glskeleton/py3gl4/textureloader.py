@@ -0,0 +1,186 @@
+# refer to https://www.khronos.org/opengl/wiki/Pixel_Buffer_Object
+# refer to https://www.khronos.org/opengl/wiki/Buffer_Object_Streaming
+# Images are decoded by Pillow on worker threads, the GL thread copies the decoded rows into a
+# persistently mapped pixel unpack buffer and uploads them from there a few rows per frame,
+# each texture shows a placeholder until its last row arrived
+from concurrent.futures import ThreadPoolExecutor, Future
+from ctypes import c_void_p
+import logging
+from typing import Callable
+
+from OpenGL.GL import glPixelStorei, glTextureSubImage2D, GL_PIXEL_UNPACK_BUFFER, GL_UNPACK_ALIGNMENT, \
+    GL_UNSIGNED_BYTE, GL_RGBA, GL_RGBA8, GL_LINEAR, GL_NEAREST, GL_REPEAT
+import numpy as np
+
+from py3gl4.texture import Texture2D, decodeImage
+from py3gl4.textureformat import LINEAR, isFilterable, mipLevels, mipChain
+from py3gl4.streamingbuffer import StreamingBuffer
+
+logger = logging.getLogger(__name__)
+
+# 2x2 magenta and black checker, easy to spot while the real image is still loading
+PLACEHOLDER_PIXELS = np.array([
+    255, 0, 255, 255, 0, 0, 0, 255,
+    0, 0, 0, 255, 255, 0, 255, 255], dtype=np.uint8)
+# bytes of one staging segment, the upload of a texture is split into chunks of whole rows
+STAGING_SEGMENT_SIZE = 4 * 1024 * 1024
+
+
+def decodeMipmaps(file_path: str, usage: str, mipmaps: bool, cpu_mipmaps: bool) -> tuple:
+    # runs on a worker thread, the CPU mipmap chain is built there as well
+    width, height, pixelFormat, pixelType, internalFormat, pixels = decodeImage(file_path, usage)
+    levels = mipLevels(width, height) if mipmaps else 1
+    cpu_mipmaps = cpu_mipmaps or not isFilterable(internalFormat)
+    chain = mipChain(pixels, width, height, levels) if cpu_mipmaps else None
+    return width, height, pixelFormat, pixelType, internalFormat, pixels, levels, chain
+
+
+class TextureUpload:
+    def __init__(self, texture: Texture2D, future: Future, callback: Callable[[Texture2D], None],
+                 anisotropy: float = None) -> None:
+        self.texture = texture
+        self.future = future
+        self.callback = callback
+        self.anisotropy = anisotropy
+        # (pixels, width, height) of the levels 1 and up, None lets the GPU generate them
+        self.chain: list[tuple[np.ndarray, int, int]] = None
+        # the texture receiving the rows, swapped into texture once all rows are uploaded
+        self.target: Texture2D = None
+        self.width = 0
+        self.height = 0
+        self.pixelFormat = 0
+        self.pixelType = 0
+        self.pixels: np.ndarray = None
+        self.row_size = 0
+        self.row = 0
+
+
+class TextureLoader:
+    def __init__(self, workers: int = 2, segment_size: int = STAGING_SEGMENT_SIZE, segments: int = 3,
+                 budget: int = None) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="TextureLoader")
+        self.staging = StreamingBuffer(GL_PIXEL_UNPACK_BUFFER, segment_size, segments)
+        # bytes uploaded per update() call, one segment by default
+        self.budget = budget if budget is not None else self.staging.segment_size
+        self.uploads: list[TextureUpload] = []
+        # (file path, error message) of every image which failed to load, the message is logged as well
+        self.errors: list[tuple[str, str]] = []
+
+    def load(self, file_path: str, callback: Callable[[Texture2D], None] = None, usage: str = LINEAR,
+             mipmaps: bool = True, cpu_mipmaps: bool = False, anisotropy: float = None) -> Texture2D:
+        # returns at once with a placeholder texture, callback(texture) runs in update() when the image is in,
+        # the arguments after callback mean the same as for Texture2D(file_path=...)
+        texture = Texture2D(1, GL_RGBA8, 2, 2)
+        glTextureSubImage2D(texture.tex_id, 0, 0, 0, 2, 2, GL_RGBA, GL_UNSIGNED_BYTE, PLACEHOLDER_PIXELS)
+        texture.SetFiltering(GL_NEAREST, GL_NEAREST)
+        texture.setWrapMode(GL_REPEAT, GL_REPEAT)
+        texture.file_path = file_path
+        texture.loaded = False
+        future = self.executor.submit(decodeMipmaps, file_path, usage, mipmaps, cpu_mipmaps)
+        self.uploads.append(TextureUpload(texture, future, callback, anisotropy))
+        return texture
+
+    def isDone(self) -> bool:
+        return not self.uploads
+
+    def update(self) -> list[Texture2D]:
+        # call with the context current once per frame, never waits for a decode,
+        # returns the textures which were completed with this call
+        completed = []
+        budget = self.budget
+        for upload in list(self.uploads):
+            if upload.target is None:
+                if not upload.future.done():
+                    continue
+                if not self.prepare(upload):
+                    self.uploads.remove(upload)
+                    continue
+            budget -= self.uploadRows(upload, budget)
+            if upload.row == upload.height:
+                self.uploads.remove(upload)
+                self.finish(upload)
+                completed.append(upload.texture)
+            if budget <= 0:
+                break
+        return completed
+
+    def prepare(self, upload: TextureUpload) -> bool:
+        try:
+            (width, height, upload.pixelFormat, upload.pixelType, internalFormat, upload.pixels,
+             levels, upload.chain) = upload.future.result()
+        except Exception as error:
+            # keep the placeholder, a broken asset must not stop the application
+            self.reportError(upload, str(error))
+            return False
+        # rows are copied byte by byte, whatever the pixel type is
+        upload.pixels = upload.pixels.view(np.uint8)
+        upload.row_size = upload.pixels.nbytes // height
+        if upload.row_size > self.staging.segment_size:
+            self.reportError(upload, f"a row of {upload.row_size} bytes does not fit into a staging segment "
+                                     f"of {self.staging.segment_size} bytes")
+            return False
+        upload.width = width
+        upload.height = height
+        upload.target = Texture2D(levels, internalFormat, width, height)
+        upload.target.pixelFormat = upload.pixelFormat
+        upload.target.pixelType = upload.pixelType
+        return True
+
+    def reportError(self, upload: TextureUpload, message: str) -> None:
+        self.errors.append((upload.texture.file_path, message))
+        logger.warning("%s: %s", upload.texture.file_path, message)
+
+    def uploadRows(self, upload: TextureUpload, budget: int) -> int:
+        # copy whole rows into the next staging segments and upload them from there, returns the bytes used
+        chunk_rows = self.staging.segment_size // upload.row_size
+        used = 0
+        self.staging.bind()
+        # decoded rows are tightly packed, L and LA rows are not always a multiple of 4 bytes
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        while upload.row < upload.height and used < budget:
+            rows = min(chunk_rows, upload.height - upload.row)
+            start = upload.row * upload.row_size
+            offset = self.staging.write(upload.pixels[start:start + rows * upload.row_size])
+            glTextureSubImage2D(upload.target.tex_id, 0, 0, upload.row, upload.width, rows,
+                                upload.pixelFormat, upload.pixelType, c_void_p(offset))
+            self.staging.lockSegment()
+            upload.row += rows
+            used += rows * upload.row_size
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+        self.staging.unbind()
+        return used
+
+    def finish(self, upload: TextureUpload) -> None:
+        texture, target = upload.texture, upload.target
+        target.SetFiltering(GL_LINEAR, GL_NEAREST)
+        target.setWrapMode(GL_REPEAT, GL_REPEAT)
+        # level 0 went through the staging buffer, the smaller levels are a third of it at most
+        if upload.chain is not None:
+            target.uploadMipChain(upload.chain)
+            target.setMipmapFiltering()
+        else:
+            target.generateMipmap()
+        if upload.anisotropy is not None:
+            target.setAnisotropy(upload.anisotropy)
+        # take over the name of the uploaded texture, so the caller keeps its Texture2D object
+        texture.delete()
+        texture.tex_id = target.tex_id
+        texture.levels = target.levels
+        texture.internalFormat = target.internalFormat
+        texture.width = target.width
+        texture.height = target.height
+        texture.pixelFormat = upload.pixelFormat
+        texture.pixelType = upload.pixelType
+        texture.loaded = True
+        upload.pixels = None
+        upload.chain = None
+        if upload.callback is not None:
+            upload.callback(texture)
+
+    def delete(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for upload in self.uploads:
+            if upload.target is not None:
+                upload.target.delete()
+        self.uploads = []
+        self.staging.delete()
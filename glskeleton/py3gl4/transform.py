@@ -0,0 +1,180 @@
+# refer to https://www.khronos.org/opengl/wiki/Vertex_Transformation
+# refer to https://glm.g-truc.net/0.9.9/api/a00665.html
+# Transforms of many objects as NumPy arrays of shape (N, 4, 4), indexed [object, row, column] like
+# UniformBuffer, the transpose of glm's [column][row], columnMajor() lays them out for upload.
+# One call replaces a Python loop of glm.translate/glm.rotate/glm.scale per object.
+# The camera matrices match glm.perspective and glm.lookAt (right handed, clip depth -1 to 1)
+import numpy as np
+
+
+def identity(count: int) -> np.ndarray:
+    return np.broadcast_to(np.eye(4, dtype=np.float32), (count, 4, 4)).copy()
+
+
+def translation(offsets: np.ndarray) -> np.ndarray:
+    # offsets is (N, 3)
+    offsets = np.asarray(offsets, dtype=np.float32).reshape(-1, 3)
+    matrices = identity(len(offsets))
+    matrices[:, :3, 3] = offsets
+    return matrices
+
+
+def scaling(factors: np.ndarray) -> np.ndarray:
+    # factors is (N,) for uniform or (N, 3) for per axis scaling
+    factors = np.asarray(factors, dtype=np.float32)
+    factors = np.broadcast_to(factors.reshape(len(factors), -1), (len(factors), 3))
+    matrices = identity(len(factors))
+    matrices[:, [0, 1, 2], [0, 1, 2]] = factors
+    return matrices
+
+
+def rotation(angles: np.ndarray, axis: np.ndarray) -> np.ndarray:
+    # angles in radians is (N,), axis is one (3,) axis for all objects or (N, 3), counterclockwise like glm.rotate
+    angles = np.asarray(angles, dtype=np.float32).reshape(-1)
+    axis = np.asarray(axis, dtype=np.float32)
+    axis = np.broadcast_to(axis / np.linalg.norm(axis, axis=-1, keepdims=True), (len(angles), 3))
+    x, y, z = axis[:, 0], axis[:, 1], axis[:, 2]
+    c, s = np.cos(angles), np.sin(angles)
+    t = 1.0 - c
+    matrices = identity(len(angles))
+    matrices[:, 0, 0] = c + x * x * t
+    matrices[:, 0, 1] = x * y * t - z * s
+    matrices[:, 0, 2] = x * z * t + y * s
+    matrices[:, 1, 0] = y * x * t + z * s
+    matrices[:, 1, 1] = c + y * y * t
+    matrices[:, 1, 2] = y * z * t - x * s
+    matrices[:, 2, 0] = z * x * t - y * s
+    matrices[:, 2, 1] = z * y * t + x * s
+    matrices[:, 2, 2] = c + z * z * t
+    return matrices
+
+
+def compose(*matrices: np.ndarray) -> np.ndarray:
+    # compose(T, R, S) is T * R * S for every object, single (4, 4) matrices are applied to all of them
+    result = matrices[0]
+    for matrix in matrices[1:]:
+        result = np.matmul(result, matrix)
+    return result
+
+
+def transformPoints(matrices: np.ndarray, points: np.ndarray) -> np.ndarray:
+    # (N, 4, 4) applied to (N, 3) points, the w of the result is dropped
+    points = np.asarray(points, dtype=np.float32)
+    return np.einsum("nij,nj->ni", matrices[:, :3, :3], points) + matrices[:, :3, 3]
+
+
+def normalMatrices(models: np.ndarray) -> np.ndarray:
+    # (N, 3, 3) inverse transpose of the upper 3x3, keeps normals perpendicular under non-uniform scaling
+    return np.linalg.inv(models[:, :3, :3]).swapaxes(-1, -2).astype(np.float32)
+
+
+def columnMajor(matrices: np.ndarray) -> np.ndarray:
+    # the memory order of mat4 vertex attributes and glUniformMatrix4fv with transpose=GL_FALSE
+    return np.ascontiguousarray(np.swapaxes(matrices, -1, -2), dtype=np.float32)
+
+
+def perspective(fovy: float, aspect: float, near: float, far: float) -> np.ndarray:
+    f = 1.0 / np.tan(fovy / 2.0)
+    matrix = np.zeros((4, 4), dtype=np.float32)
+    matrix[0, 0] = f / aspect
+    matrix[1, 1] = f
+    matrix[2, 2] = (far + near) / (near - far)
+    matrix[2, 3] = 2.0 * far * near / (near - far)
+    matrix[3, 2] = -1.0
+    return matrix
+
+
+def tileMatrix(x: int, y: int, width: int, height: int, image_width: int, image_height: int) -> np.ndarray:
+    # maps the clip space of an image_width x image_height frame to the one of its width x height tile at
+    # (x, y), tileMatrix @ projection renders that tile alone, e.g. to render a frame larger than a framebuffer
+    matrix = np.eye(4, dtype=np.float32)
+    matrix[0, 0] = image_width / width
+    matrix[1, 1] = image_height / height
+    matrix[0, 3] = (image_width - 2.0 * x - width) / width
+    matrix[1, 3] = (image_height - 2.0 * y - height) / height
+    return matrix
+
+
+def lookAt(eye: np.ndarray, center: np.ndarray, up: np.ndarray) -> np.ndarray:
+    eye, center, up = (np.asarray(v, dtype=np.float32) for v in (eye, center, up))
+    forward = center - eye
+    forward /= np.linalg.norm(forward)
+    side = np.cross(forward, up)
+    side /= np.linalg.norm(side)
+    upward = np.cross(side, forward)
+    matrix = np.eye(4, dtype=np.float32)
+    matrix[0, :3] = side
+    matrix[1, :3] = upward
+    matrix[2, :3] = -forward
+    matrix[:3, 3] = -matrix[:3, :3] @ eye
+    return matrix
+
+
+def frustumPlanes(view_projection: np.ndarray) -> np.ndarray:
+    # (6, 4) planes (left, right, bottom, top, near, far) with normals pointing inside and unit length,
+    # a sphere is outside when dot(plane.xyz, center) + plane.w < -radius for any of them
+    rows = np.asarray(view_projection, dtype=np.float32)
+    planes = np.array([rows[3] + rows[0], rows[3] - rows[0], rows[3] + rows[1],
+                       rows[3] - rows[1], rows[3] + rows[2], rows[3] - rows[2]], dtype=np.float32)
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+class Camera:
+    # view, projection and their product are computed when they are read after a change,
+    # revision grows with every change, so a widget uploads its camera block only when it differs
+    def __init__(self, fovy: float, aspect: float = 1.0, near: float = 0.1, far: float = 100.0,
+                 view: np.ndarray = None) -> None:
+        self.fovy = fovy
+        self.aspect = aspect
+        self.near = near
+        self.far = far
+        self.view_matrix = np.eye(4, dtype=np.float32) if view is None else np.asarray(view, dtype=np.float32)
+        self.revision = 0
+        self.cache: dict[str, np.ndarray] = {}
+
+    def invalidate(self) -> None:
+        self.cache = {}
+        self.revision += 1
+
+    def resize(self, width: int, height: int) -> None:
+        # call from resizeGL
+        aspect = float(width) / max(height, 1)
+        if aspect != self.aspect:
+            self.aspect = aspect
+            self.invalidate()
+
+    def setPerspective(self, fovy: float, near: float, far: float) -> None:
+        if (fovy, near, far) != (self.fovy, self.near, self.far):
+            self.fovy, self.near, self.far = fovy, near, far
+            self.invalidate()
+
+    def setView(self, view: np.ndarray) -> None:
+        view = np.asarray(view, dtype=np.float32)
+        if not np.array_equal(view, self.view_matrix):
+            self.view_matrix = view
+            self.invalidate()
+
+    def lookAt(self, eye: np.ndarray, center: np.ndarray, up: np.ndarray) -> None:
+        self.setView(lookAt(eye, center, up))
+
+    @property
+    def view(self) -> np.ndarray:
+        return self.view_matrix
+
+    @property
+    def projection(self) -> np.ndarray:
+        if "projection" not in self.cache:
+            self.cache["projection"] = perspective(self.fovy, self.aspect, self.near, self.far)
+        return self.cache["projection"]
+
+    @property
+    def viewProjection(self) -> np.ndarray:
+        if "viewProjection" not in self.cache:
+            self.cache["viewProjection"] = self.projection @ self.view_matrix
+        return self.cache["viewProjection"]
+
+    @property
+    def frustumPlanes(self) -> np.ndarray:
+        if "frustumPlanes" not in self.cache:
+            self.cache["frustumPlanes"] = frustumPlanes(self.viewProjection)
+        return self.cache["frustumPlanes"]
@@ -55,3 +55,7 @@ class Uniform:
 
     def setFloatList(self, value:np.ndarray)-> None:
         glUniform1fv(self.location, value.size, value)
+
+    def setVec4List(self, value: np.ndarray) -> None:
+        # (N, 4) values of a vec4 array
+        glUniform4fv(self.location, value.size // 4, value)
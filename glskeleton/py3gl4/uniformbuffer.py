@@ -0,0 +1,139 @@
+# refer to https://www.khronos.org/opengl/wiki/Uniform_Buffer_Object
+# refer to https://www.khronos.org/opengl/wiki/Interface_Block_(GLSL)#Memory_layout
+# std140 rules are in section 7.6.2.2 of https://registry.khronos.org/OpenGL/specs/gl/glspec46.core.pdf
+from ctypes import c_uint
+
+from OpenGL.GL import glCreateBuffers, glBindBuffer, glBindBufferBase, glBindBufferRange, \
+    glNamedBufferStorage, glNamedBufferSubData, glIsBuffer, glDeleteBuffers, \
+    GL_UNIFORM_BUFFER, GL_DYNAMIC_STORAGE_BIT, GL_FLOAT, GL_FLOAT_VEC2, GL_FLOAT_VEC3, GL_FLOAT_VEC4, \
+    GL_INT, GL_INT_VEC2, GL_INT_VEC3, GL_INT_VEC4, GL_UNSIGNED_INT, GL_UNSIGNED_INT_VEC2, \
+    GL_UNSIGNED_INT_VEC3, GL_UNSIGNED_INT_VEC4, GL_BOOL, GL_BOOL_VEC2, GL_BOOL_VEC3, GL_BOOL_VEC4, \
+    GL_FLOAT_MAT2, GL_FLOAT_MAT3, GL_FLOAT_MAT4, GL_FLOAT_MAT2x3, GL_FLOAT_MAT2x4, GL_FLOAT_MAT3x2, \
+    GL_FLOAT_MAT3x4, GL_FLOAT_MAT4x2, GL_FLOAT_MAT4x3
+import numpy as np
+
+# GLSL type: (scalar type, rows, columns), matrices are column-major
+UNIFORM_TYPES = {
+    GL_FLOAT: (np.float32, 1, 1),
+    GL_FLOAT_VEC2: (np.float32, 2, 1),
+    GL_FLOAT_VEC3: (np.float32, 3, 1),
+    GL_FLOAT_VEC4: (np.float32, 4, 1),
+    GL_INT: (np.int32, 1, 1),
+    GL_INT_VEC2: (np.int32, 2, 1),
+    GL_INT_VEC3: (np.int32, 3, 1),
+    GL_INT_VEC4: (np.int32, 4, 1),
+    GL_UNSIGNED_INT: (np.uint32, 1, 1),
+    GL_UNSIGNED_INT_VEC2: (np.uint32, 2, 1),
+    GL_UNSIGNED_INT_VEC3: (np.uint32, 3, 1),
+    GL_UNSIGNED_INT_VEC4: (np.uint32, 4, 1),
+    GL_BOOL: (np.int32, 1, 1),
+    GL_BOOL_VEC2: (np.int32, 2, 1),
+    GL_BOOL_VEC3: (np.int32, 3, 1),
+    GL_BOOL_VEC4: (np.int32, 4, 1),
+    GL_FLOAT_MAT2: (np.float32, 2, 2),
+    GL_FLOAT_MAT3: (np.float32, 3, 3),
+    GL_FLOAT_MAT4: (np.float32, 4, 4),
+    GL_FLOAT_MAT2x3: (np.float32, 3, 2),
+    GL_FLOAT_MAT2x4: (np.float32, 4, 2),
+    GL_FLOAT_MAT3x2: (np.float32, 2, 3),
+    GL_FLOAT_MAT3x4: (np.float32, 4, 3),
+    GL_FLOAT_MAT4x2: (np.float32, 2, 4),
+    GL_FLOAT_MAT4x3: (np.float32, 3, 4),
+}
+
+
+def blockLayout(members: list[tuple[str, int, int, int, int, int]], size: int) -> np.dtype:
+    # members are (name, type, array size, offset, array stride, matrix stride) as reported by OpenGL,
+    # vec3 and matrix columns keep their padding, so the structured array matches the buffer byte by byte
+    names, formats, offsets, matrices = [], [], [], []
+    for name, type, count, offset, array_stride, matrix_stride in members:
+        scalar, rows, columns = UNIFORM_TYPES[type]
+        itemsize = np.dtype(scalar).itemsize
+        if columns > 1:
+            shape = (columns, matrix_stride // itemsize)
+            matrices.append(name)
+        elif rows > 1:
+            shape = (rows,)
+        else:
+            shape = ()
+        if count > 1 or array_stride > 0:
+            element = array_stride // itemsize
+            shape = (count,) + (shape if columns > 1 else (element,))
+        names.append(name)
+        formats.append((scalar, shape) if shape else scalar)
+        offsets.append(offset)
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": size},
+                    metadata={"matrices": tuple(matrices)})
+
+
+def std140Layout(members: list[tuple[str, int, int]]) -> np.dtype:
+    # members are (name, type, array size) in declaration order, use it to build
+    # a block layout without a linked program, e.g. to share one buffer across programs
+    described = []
+    offset = 0
+    for name, type, count in members:
+        scalar, rows, columns = UNIFORM_TYPES[type]
+        if columns > 1 or count > 1:
+            # matrices and arrays are laid out as arrays of vec4 aligned elements
+            alignment = 16
+            stride = 16 * columns
+            size = stride * count
+        else:
+            alignment = 4 * (4 if rows == 3 else rows)
+            stride = 0
+            size = 4 * rows
+        offset = (offset + alignment - 1) // alignment * alignment
+        described.append((name, type, count, offset,
+                          stride if count > 1 else 0, 16 if columns > 1 else 0))
+        offset += size
+    return blockLayout(described, (offset + 15) // 16 * 16)
+
+
+class UniformBuffer:
+    def __init__(self, layout: np.dtype, binding: int = None) -> None:
+        self.ubo_id = c_uint()
+        self.data = np.zeros(1, dtype=layout)
+        self.matrices = (layout.metadata or {}).get("matrices", ())
+        self.dirty = True
+        glCreateBuffers(1, self.ubo_id)
+        glNamedBufferStorage(self.ubo_id, self.data.nbytes, self.data.view(np.uint8), GL_DYNAMIC_STORAGE_BIT)
+        if binding is not None:
+            self.bindBase(binding)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        field = self.data[name].reshape(self.data.dtype[name].shape)
+        if name in self.matrices:
+            # matrices are uploaded column-major, index them as [row, column] like NumPy,
+            # glm indexes [column][row], the transpose
+            field = field.swapaxes(-1, -2)
+        return field
+
+    def __setitem__(self, name: str, value) -> None:
+        field = self[name]
+        value = np.asarray(value, dtype=field.dtype)
+        # std140 pads vec3 and matrix columns to vec4, only fill the leading components
+        value = value.reshape(value.shape + (1,) * (field.ndim - value.ndim))
+        field[tuple(slice(0, n) for n in value.shape)] = value
+        self.dirty = True
+
+    def bind(self) -> None:
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo_id)
+
+    def unbind(self) -> None:
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def bindBase(self, index: int) -> None:
+        glBindBufferBase(GL_UNIFORM_BUFFER, index, self.ubo_id)
+
+    def bindRange(self, index: int, offset: int, size: int) -> None:
+        glBindBufferRange(GL_UNIFORM_BUFFER, index, self.ubo_id, offset, size)
+
+    def delete(self) -> None:
+        if glIsBuffer(self.ubo_id):
+            glDeleteBuffers(1, self.ubo_id)
+
+    def upload(self) -> None:
+        # the whole block goes to the GPU in one call, and only if a field changed since the last upload
+        if self.dirty:
+            glNamedBufferSubData(self.ubo_id, 0, self.data.nbytes, self.data.view(np.uint8))
+            self.dirty = False
@@ -2,11 +2,12 @@
 # Vertex array objects are container objects including references to buffer objects
 from ctypes import c_uint
 
-from OpenGL.GL import glCreateVertexArrays, glBindVertexArray, glDeleteVertexArrays, \
+from OpenGL.GL import glCreateVertexArrays, glDeleteVertexArrays, \
     glVertexArrayElementBuffer, glVertexArrayVertexBuffer, glEnableVertexArrayAttrib, \
-    glVertexArrayAttribFormat, glVertexArrayAttribBinding, glIsVertexArray
+    glVertexArrayAttribFormat, glVertexArrayAttribBinding, glIsVertexArray, glVertexArrayBindingDivisor
 
 from py3gl4.vertexbufferobject import VertexBufferObject
+from py3gl4.statecache import stateCache
 from py3gl4.elementbufferobject import ElementBufferObject
 
 
@@ -26,14 +27,15 @@ class VertexArrayObject:
         glCreateVertexArrays(1, self.vao_id)
 
     def bind(self) -> None:
-        glBindVertexArray(self.vao_id)
+        stateCache().bindVertexArray(self.vao_id)
 
     def unbind(self) -> None:
-        glBindVertexArray(0)
+        stateCache().bindVertexArray(0)
 
     def delete(self) -> None:
         if glIsVertexArray(self.vao_id):
             glDeleteVertexArrays(1, self.vao_id)
+            stateCache().invalidate()
 
     def setElementBuffer(self, buffer: ElementBufferObject) -> None:
         glVertexArrayElementBuffer(self.vao_id, buffer.ebo_id)
@@ -47,3 +49,7 @@ class VertexArrayObject:
         glVertexArrayAttribFormat(
             self.vao_id, attrib.index, attrib.size, attrib.type, attrib.normalized, attrib.offset)
         glVertexArrayAttribBinding(self.vao_id, attrib.index, bindingindex)
+
+    def setBindingDivisor(self, bindingindex: int, divisor: int) -> None:
+        # 1 advances the vertex buffer of the binding once per instance instead of once per vertex
+        glVertexArrayBindingDivisor(self.vao_id, bindingindex, divisor)
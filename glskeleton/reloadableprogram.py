@@ -0,0 +1,142 @@
+import os
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, Signal
+
+from py3gl4.program import Program
+from py3gl4.shader import Shader, errorMessage
+from py3gl4.preprocessor import ShaderPreprocessor
+
+
+# a program built from shader files, which recompiles the edited stages in the background and
+# swaps the linked program between frames, a broken edit keeps the last working program,
+# files pulled in with #include are watched as well
+class ReloadableProgram(QObject):
+    sourceChanged = Signal(str)
+
+    def __init__(self, stages: list[tuple[type, str]], name: str = "program",
+                 preprocessor: ShaderPreprocessor = None, defines: dict = None) -> None:
+        # stages are (shader class, file path) pairs, e.g. (ComputeShader, "shaders/fractal.comp")
+        super().__init__()
+        self.name = name
+        self.preprocessor = preprocessor if preprocessor is not None else ShaderPreprocessor()
+        self.defines = defines
+        self.stages = [(shader_class, os.path.abspath(path)) for shader_class, path in stages]
+        # stage path -> every file the stage was expanded from
+        self.dependencies: dict[str, set[str]] = {path: {path} for _, path in self.stages}
+        self.shaders: dict[str, Shader] = {}
+        self.program: Program = None
+        # (program, recompiled stages) which the driver is still compiling and linking
+        self.pending: tuple[Program, dict[str, Shader]] = None
+        self.changed: set[str] = {path for _, path in self.stages}
+        self.error: str = None
+        self.watcher = QFileSystemWatcher([path for _, path in self.stages])
+        self.watcher.fileChanged.connect(self.onFileChanged)
+        self.submit()
+
+    @property
+    def program_id(self) -> int:
+        return self.program.program_id
+
+    @property
+    def uniforms(self) -> dict:
+        return self.program.uniforms
+
+    def isReady(self) -> bool:
+        return self.program is not None
+
+    def isPending(self) -> bool:
+        # an edit waits to be compiled or linked, update() swaps it in once done
+        return self.pending is not None or bool(self.changed)
+
+    def onFileChanged(self, path: str) -> None:
+        # no OpenGL context is current here, only remember the stage and compile in update()
+        self.changed.add(path)
+        # editors which save by rename remove the file from the watcher
+        if path not in self.watcher.files() and os.path.exists(path):
+            self.watcher.addPath(path)
+        self.sourceChanged.emit(path)
+
+    def submit(self) -> None:
+        # compile the stages which depend on a changed file and link without waiting for the driver,
+        # stages without a working shader, e.g. after a failed first build, are compiled again as well
+        changed, self.changed = self.changed, set()
+        compiled: dict[str, Shader] = {}
+        try:
+            for shader_class, path in self.stages:
+                if path not in self.shaders or self.dependencies[path] & changed:
+                    source = self.preprocessor.load(path, self.defines)
+                    self.watchDependencies(path)
+                    compiled[path] = shader_class(source, check=False)
+            shaders = [compiled[path] if path in compiled else self.shaders[path] for _, path in self.stages]
+            self.pending = (Program(shaders, check=False), compiled)
+        except (OSError, RuntimeError) as error:
+            for shader in compiled.values():
+                shader.delete()
+            self.reportError(error)
+
+    def watchDependencies(self, path: str) -> None:
+        self.dependencies[path] = self.preprocessor.dependencies(path)
+        watched = self.watcher.files()
+        for dependency in self.dependencies[path]:
+            if dependency not in watched:
+                self.watcher.addPath(dependency)
+
+    def reportError(self, error: Exception) -> None:
+        self.error = f"{self.name}: {self.preprocessor.translateLog(errorMessage(error))}"
+        print(self.error)
+
+    def update(self) -> bool:
+        # call with the context current before the program is used in a frame,
+        # return True when a new program was swapped in
+        if self.pending is None:
+            if not self.changed:
+                return False
+            self.submit()
+            if self.pending is None:
+                return False
+        program, compiled = self.pending
+        if not program.isCompleted():
+            return False
+        self.pending = None
+        try:
+            for shader in compiled.values():
+                shader.checkStatus()
+            program.checkStatus()
+        except RuntimeError as error:
+            for shader in compiled.values():
+                shader.delete()
+            program.delete()
+            self.reportError(error)
+            return False
+        for path, shader in compiled.items():
+            if path in self.shaders:
+                self.shaders[path].delete()
+            self.shaders[path] = shader
+        if self.program is not None:
+            for uniform in self.program.uniforms.values():
+                program.addUniform(uniform)
+            program.attributes = self.program.attributes
+            self.program.delete()
+            print(f"{self.name}: reloaded {', '.join(os.path.basename(path) for path in compiled)}")
+        self.program = program
+        self.error = None
+        return True
+
+    def use(self) -> None:
+        self.program.use()
+
+    def addUniform(self, uniform) -> None:
+        self.program.addUniform(uniform)
+
+    def delete(self) -> None:
+        self.watcher.fileChanged.disconnect(self.onFileChanged)
+        if self.pending is not None:
+            program, compiled = self.pending
+            for shader in compiled.values():
+                shader.delete()
+            program.delete()
+            self.pending = None
+        for shader in self.shaders.values():
+            shader.delete()
+        if self.program is not None:
+            self.program.delete()
@@ -0,0 +1,87 @@
+from PySide6.QtCore import QObject, QEvent
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
+
+# render modes
+# repaint after every swap, the swap interval of the surface format paces the loop to the display
+CONTINUOUS = "continuous"
+# repaint once per event loop pass after invalidate() or an input event, idle otherwise
+ON_DEMAND = "on demand"
+# never repaint, invalidations are kept until the mode changes
+PAUSED = "paused"
+
+# events which change what an on demand widget shows, e.g. imgui hover and drags or the mouse controls
+INPUT_EVENTS = {QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick,
+                QEvent.MouseMove, QEvent.Wheel, QEvent.KeyPress, QEvent.KeyRelease, QEvent.Enter, QEvent.Leave}
+
+
+# decides when the registered widgets repaint instead of a timer per widget, a widget which is not visible,
+# e.g. in an inactive tab of a QTabWidget or a closed tab, never repaints, its pending invalidation is
+# kept and drawn once it is shown again, requests are coalesced by QWidget.update(), so any number of
+# invalidations and input events between two frames cost one paintGL
+class RenderScheduler(QObject):
+    def __init__(self) -> None:
+        super().__init__()
+        self.modes: dict[QOpenGLWidget, str] = {}
+        # widgets invalidated while they could not repaint
+        self.dirty: set[QOpenGLWidget] = set()
+
+    def register(self, widget: QOpenGLWidget, mode: str = ON_DEMAND) -> None:
+        # call in __init__ of the widget, instead of startTimer
+        self.modes[widget] = mode
+        widget.installEventFilter(self)
+        widget.frameSwapped.connect(lambda: self.onFrameSwapped(widget))
+        widget.destroyed.connect(lambda: self.unregister(widget))
+        if mode == ON_DEMAND:
+            # imgui needs the mouse position without a pressed button
+            widget.setMouseTracking(True)
+
+    def unregister(self, widget: QOpenGLWidget) -> None:
+        self.modes.pop(widget, None)
+        self.dirty.discard(widget)
+
+    def mode(self, widget: QOpenGLWidget) -> str:
+        return self.modes[widget]
+
+    def setMode(self, widget: QOpenGLWidget, mode: str) -> None:
+        self.modes[widget] = mode
+        if mode == ON_DEMAND:
+            widget.setMouseTracking(True)
+        if mode != PAUSED:
+            self.invalidate(widget)
+
+    def invalidate(self, widget: QOpenGLWidget) -> None:
+        # the widget shows something outdated, e.g. a loaded texture, a reloaded shader or a changed setting,
+        # safe to call from paintGL to get the next frame, e.g. while programs are still linking
+        if widget not in self.modes:
+            return
+        if self.modes[widget] == PAUSED or not widget.isVisible():
+            self.dirty.add(widget)
+            return
+        self.dirty.discard(widget)
+        widget.update()
+
+    def onFrameSwapped(self, widget: QOpenGLWidget) -> None:
+        # a hidden or minimized widget does not paint, so it does not swap and the loop stops by itself
+        if self.modes.get(widget) == CONTINUOUS:
+            self.invalidate(widget)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        mode = self.modes.get(watched)
+        if event.type() == QEvent.Show:
+            # restart the loop of a continuous widget, draw what was invalidated while hidden
+            if mode == CONTINUOUS or watched in self.dirty:
+                self.invalidate(watched)
+        elif event.type() in INPUT_EVENTS and mode == ON_DEMAND:
+            self.invalidate(watched)
+        return False
+
+
+_render_scheduler: RenderScheduler = None
+
+
+def renderScheduler() -> RenderScheduler:
+    # the scheduler of the application, created on first use after the QApplication
+    global _render_scheduler
+    if _render_scheduler is None:
+        _render_scheduler = RenderScheduler()
+    return _render_scheduler
@@ -0,0 +1,7 @@
+// shared by every stage which reads the camera, the widgets bind it to binding point 0
+layout (std140, binding = 0) uniform Camera
+{
+    mat4 view;
+    mat4 proj;
+    mat4 vp;
+};
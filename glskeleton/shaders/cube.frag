@@ -0,0 +1,7 @@
+in vec2 outText;
+out vec4 outColor;
+uniform sampler2D renderedTexture;
+void main()
+{
+    outColor = texture(renderedTexture, outText);
+}
@@ -0,0 +1,20 @@
+in layout(location = 0) vec3 position;
+in layout(location = 1) vec2 textCoords;
+#include "camera.glsl"
+#ifdef INSTANCED
+// one model matrix per cube from the per-instance buffer, a mat4 takes the locations 2 to 5
+in layout(location = 2) mat4 instanceModel;
+#define model instanceModel
+#elif defined(MULTI_DRAW)
+// one draw per cube from a MeshPool, each finds its model matrix at gl_DrawID
+#include "drawdata.glsl"
+#define model drawModel
+#else
+uniform mat4 model;
+#endif
+out vec2 outText;
+void main()
+{
+    gl_Position =  vp * model * vec4(position, 1.0f);
+    outText = textCoords;
+}
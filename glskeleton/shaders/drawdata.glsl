@@ -0,0 +1,6 @@
+// per-draw data of a MeshPool, filled by MeshPool.draw() at binding point 1, one entry per indirect command
+layout (std430, binding = 1) readonly buffer DrawData
+{
+    mat4 drawModels[];
+};
+#define drawModel drawModels[gl_DrawID]
@@ -1,4 +1,3 @@
-#version 460 core
 const vec4 vertices[4] = {
     { -1, -1, 0, 1 },
     {  1, -1, 0, 1 },
@@ -0,0 +1,8 @@
+// real is float unless the program is built with the DOUBLE_PRECISION define
+#ifdef DOUBLE_PRECISION
+#define real double
+#define real2 dvec2
+#else
+#define real float
+#define real2 vec2
+#endif
@@ -0,0 +1,31 @@
+layout (location = 0) out vec4  FragColor;
+in GE_OUT
+{
+  vec3 FacetNormal;
+  vec3 PatchDistance;
+  vec3 TriDistance;
+}ge_out;
+layout (std140, binding = 1) uniform Light
+{
+  vec4 diffuseMat;
+  vec4 ambientMat;
+  vec3 lightDir;
+};
+float amplify(float d, float scale, float offset)
+{
+  d = scale * d + offset;
+  d = clamp(d, 0, 1);
+  d = 1 - exp2(-2 * d * d);
+  return d;
+}
+void main(void)
+{
+  vec3 N = normalize(ge_out.FacetNormal);
+  vec3 L = lightDir;
+  float df = max(0.0f, dot(N, L) );
+  vec4 color = ambientMat + df * diffuseMat;// + pow(sp, 32) * diffuseMat;
+  float d1 = min(min(ge_out.TriDistance.x, ge_out.TriDistance.y), ge_out.TriDistance.z);
+  float d2 = min(min(ge_out.PatchDistance.x, ge_out.PatchDistance.y), ge_out.PatchDistance.z);
+  color = amplify(d1, 40, -0.5) * amplify(d2, 60, -0.5) * color;
+  FragColor = color;
+}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the demos import their modules from the glskeleton directory, e.g. "from py3gl4.transform import perspective"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "glskeleton"))
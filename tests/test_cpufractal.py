@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from cpufractal import mandelbrot, mapColor, CHANNELS
+
+
+def naiveMandelbrot(x: int, y: int, width: int, height: int, center: tuple[float, float], scale: float,
+                    max_iter: int) -> np.ndarray:
+    # one pixel at a time in float32, the order of the operations of shaders/fractal.comp
+    scale = np.float32(scale)
+    pixels = np.zeros((height, width, CHANNELS), dtype=np.float32)
+    pixels[:, :, 3] = 1.0
+    for row in range(height):
+        for column in range(width):
+            cx = scale * (np.float32(x + column) - np.float32(center[0]))
+            cy = scale * (np.float32(y + row) - np.float32(center[1]))
+            zx = zy = np.float32(0.0)
+            for i in range(max_iter):
+                xx, yy = zx * zx, zy * zy
+                if xx + yy >= 4:
+                    pixels[row, column, :3] = mapColor(np.array([i]), np.array([xx]), np.array([yy]), max_iter)[0]
+                    break
+                zx, zy = xx - yy + cx, np.float32(2) * zx * zy + cy
+    return pixels
+
+
+def test_mandelbrot_matches_a_naive_loop():
+    # the initial view of GLFractalWidget at 48x32 pixels, a tile starting at (8, 4)
+    width, height = 48, 32
+    center, scale = (width * 0.75, height * 0.5), 2.0 / height
+    pixels, spent = mandelbrot(8, 4, 32, 24, center, scale, 100)
+    expected = naiveMandelbrot(8, 4, 32, 24, center, scale, 100)
+    assert pixels.shape == (24, 32, CHANNELS)
+    np.testing.assert_allclose(pixels, expected, rtol=1e-5, atol=1e-6)
+    # both the escaped and the interior pixels are in the tile
+    interior = (pixels[:, :, :3] == 0.0).all(axis=2)
+    assert interior.any() and not interior.all()
+    assert spent > 0
+
+
+def test_interior_tile_spends_no_iterations():
+    # a tile inside the main cardioid is skipped entirely
+    pixels, spent = mandelbrot(0, 0, 8, 8, (4.0, 4.0), 0.01, 1000)
+    assert spent == 0
+    np.testing.assert_array_equal(pixels[:, :, :3], 0.0)
+    np.testing.assert_array_equal(pixels[:, :, 3], 1.0)
+
+
+@pytest.mark.parametrize("root", [complex(-1.25, 0.0), complex(-0.125, 0.649519052838329), complex(0.25, 0.0)])
+@pytest.mark.parametrize("scale", [1e-4, 1e-6, 1e-9])
+def test_periodicity_keeps_slowly_escaping_points(root, scale):
+    # the roots of the period 4 and 3 bulbs and the cusp, the points around them escape after thousands of
+    # iterations, the periodicity check may only take the pixels which never escape
+    size = 8
+    center = (size / 2 - root.real / scale, size / 2 - root.imag / scale)
+    pixels, _ = mandelbrot(0, 0, size, size, center, scale, 20000, np.float64)
+    plain, _ = mandelbrot(0, 0, size, size, center, scale, 20000, np.float64, periodicity=False)
+    np.testing.assert_array_equal(pixels, plain)
+
+
+def test_periodicity_skips_interior_iterations():
+    # the middle of the period 3 bulb is not caught by the cardioid and bulb test
+    pixels, spent = mandelbrot(0, 0, 8, 8, (4.0 + 0.1226 / 1e-3, 4.0 - 0.7449 / 1e-3), 1e-3, 5000)
+    plain, plain_spent = mandelbrot(0, 0, 8, 8, (4.0 + 0.1226 / 1e-3, 4.0 - 0.7449 / 1e-3), 1e-3, 5000,
+                                    periodicity=False)
+    np.testing.assert_array_equal(pixels, plain)
+    assert spent < plain_spent / 10
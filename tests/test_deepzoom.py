@@ -0,0 +1,107 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+pytest.importorskip("OpenGL")
+
+import deepzoom
+from deepzoom import ReferenceOrbit, toFixed, referenceOrbit, seriesApproximation, precisionBits, hasPrecision
+
+
+def directOrbit(c: complex, count: int) -> np.ndarray:
+    z = 0j
+    orbit = []
+    for _ in range(count):
+        orbit.append(z)
+        z = z * z + c
+    return np.array(orbit)
+
+
+def test_to_fixed_is_exact():
+    assert toFixed(0.75, 8) == 192
+    assert toFixed(-0.3, 64) == int(Fraction(-0.3) * 2 ** 64 // 1)
+    bits = precisionBits(1e-30)
+    assert Fraction(toFixed(1e-30, bits), 2 ** bits) <= Fraction(1e-30) < Fraction(toFixed(1e-30, bits) + 1, 2 ** bits)
+
+
+def test_precision_bits():
+    assert precisionBits(1.0) == 64
+    assert precisionBits(2.0 ** -100) == 164
+    assert hasPrecision(2.0 ** -100, 164)
+    # an origin is kept until half of the spare bits are used up
+    assert hasPrecision(2.0 ** -132, 164)
+    assert not hasPrecision(2.0 ** -133, 164)
+
+
+def test_reference_orbit_matches_double_iteration():
+    c = complex(-0.7453, 0.1127)
+    bits = precisionBits(1e-7)
+    orbit = referenceOrbit(toFixed(c.real, bits), toFixed(c.imag, bits), bits, 1000)
+    # the point escapes, the orbit ends with the first |Z| > 2
+    assert len(orbit) < 1001
+    assert abs(orbit[-1]) > 2.0 and (np.abs(orbit[:-1]) <= 2.0).all()
+    np.testing.assert_allclose(orbit[:60], directOrbit(c, 60), rtol=0, atol=1e-12)
+
+
+def test_reference_orbit_of_an_interior_point_runs_to_max_iter():
+    c = complex(-0.5, 0.1)
+    orbit = referenceOrbit(toFixed(c.real, 64), toFixed(c.imag, 64), 64, 200)
+    assert len(orbit) == 201
+    np.testing.assert_allclose(orbit, directOrbit(c, 201), rtol=0, atol=1e-12)
+
+
+def test_reference_orbit_escape():
+    orbit = referenceOrbit(toFixed(1.0, 64), 0, 64, 100)
+    np.testing.assert_array_equal(orbit, [0.0, 1.0, 2.0, 5.0])
+
+
+@pytest.mark.parametrize("c", [complex(-0.7453, 0.1127), complex(-0.5, 0.1)])
+def test_series_matches_double_iteration(c):
+    # shallow enough for doubles to iterate every pixel directly
+    scale, radius = 1e-7, 20.0
+    bits = precisionBits(scale)
+    orbit = referenceOrbit(toFixed(c.real, bits), toFixed(c.imag, bits), bits, 500)
+    skip, a, b, cubic = seriesApproximation(orbit, scale, radius)
+    assert 0 < skip < len(orbit)
+    rng = np.random.default_rng(1)
+    for dc in rng.uniform(-radius / np.sqrt(2.0), radius / np.sqrt(2.0), (20, 2)) @ np.array([1.0, 1.0j]):
+        z = 0j
+        for _ in range(skip):
+            z = z * z + c + scale * dc
+        # d in pixels after skip iterations, what the shader starts from
+        d = (z - orbit[skip]) / scale
+        assert abs(a * dc + b * dc ** 2 + cubic * dc ** 3 - d) <= 1e-5 * abs(d)
+
+
+def test_series_skips_nothing_without_an_orbit():
+    assert seriesApproximation(np.zeros(1, dtype=np.complex128), 1e-7, 10.0) == (0, 0j, 0j, 0j)
+
+
+class WrittenBuffer:
+    # records the orbit update() writes instead of creating a GL buffer
+    def __init__(self, dtype, count, flags) -> None:
+        self.count = count
+        self.writes = 0
+
+    def write(self, data) -> None:
+        self.writes += 1
+
+    def delete(self) -> None:
+        pass
+
+
+def test_reference_series_follows_the_scale(monkeypatch):
+    monkeypatch.setattr(deepzoom, "ShaderStorageBuffer", WrittenBuffer)
+    bits = 64
+    x, y = toFixed(Fraction(-1, 2), bits), toFixed(Fraction(1, 2), bits)
+    reference = ReferenceOrbit()
+    reference.update(x, y, bits, 1e-6, 200, 100.0)
+    view_series = reference.series
+    # an export renders the same reference with smaller pixels, only the series is recomputed
+    reference.update(x, y, bits, 1e-7, 200, 100.0)
+    assert reference.buffer.writes == 1
+    assert reference.series == seriesApproximation(reference.orbit, 1e-7, 100.0)
+    assert reference.series != view_series
+    reference.update(x, y, bits, 1e-6, 200, 100.0)
+    assert reference.series == view_series
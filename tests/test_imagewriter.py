@@ -0,0 +1,79 @@
+import struct
+
+import numpy as np
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from imagewriter import openImageWriter
+
+
+def pattern(width: int, height: int) -> np.ndarray:
+    # every pixel differs from its neighbours, so swapped rows or channels show up
+    y, x = np.mgrid[0:height, 0:width]
+    return np.stack(((x * 7 + y) % 256, (y * 13 + x * 3) % 256, (x * y) % 256), axis=2).astype(np.uint8)
+
+
+@pytest.mark.parametrize("name", ["image.png", "image.tif", "image.TIFF"])
+def test_round_trip(tmp_path, name):
+    # an odd width and bands of uneven height, the file is written band by band from the top like the exporter
+    width, height = 37, 29
+    pixels = pattern(width, height)
+    path = tmp_path / name
+    writer = openImageWriter(str(path), width, height)
+    for top in range(0, height, 8):
+        writer.writeRows(pixels[top:top + 8])
+    writer.close()
+    with Image.open(path) as image:
+        assert image.size == (width, height)
+        assert image.mode == "RGB"
+        np.testing.assert_array_equal(np.asarray(image), pixels)
+
+
+def test_png_header(tmp_path):
+    path = tmp_path / "image.png"
+    writer = openImageWriter(str(path), 3, 2)
+    writer.writeRows(pattern(3, 2))
+    writer.close()
+    data = path.read_bytes()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    assert data[8:16] == struct.pack(">I", 13) + b"IHDR"
+    assert struct.unpack(">IIBBBBB", data[16:29]) == (3, 2, 8, 2, 0, 0, 0)
+    assert data[-12:] == struct.pack(">I", 0) + b"IEND" + struct.pack(">I", 0xAE426082)
+
+
+def test_tiff_header(tmp_path):
+    path = tmp_path / "image.tif"
+    pixels = pattern(3, 2)
+    writer = openImageWriter(str(path), 3, 2)
+    writer.writeRows(pixels)
+    writer.close()
+    data = path.read_bytes()
+    assert data[:4] == b"II*\x00"
+    # the pixels follow the header uncompressed, the IFD follows the pixels
+    assert data[8:8 + pixels.size] == pixels.tobytes()
+    assert struct.unpack("<I", data[4:8])[0] >= 8 + pixels.size
+
+
+def test_unknown_extension_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        openImageWriter(str(tmp_path / "image.jpg"), 4, 4)
+    assert not list(tmp_path.iterdir())
+
+
+def test_rows_must_fit(tmp_path):
+    writer = openImageWriter(str(tmp_path / "image.png"), 4, 2)
+    with pytest.raises(ValueError):
+        writer.writeRows(pattern(5, 1))
+    with pytest.raises(ValueError):
+        writer.writeRows(pattern(4, 3))
+    writer.abort()
+
+
+def test_missing_rows_remove_the_file(tmp_path):
+    path = tmp_path / "image.tif"
+    writer = openImageWriter(str(path), 4, 4)
+    writer.writeRows(pattern(4, 3))
+    with pytest.raises(ValueError):
+        writer.close()
+    assert not path.exists()
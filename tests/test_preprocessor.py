@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("OpenGL")
+
+from py3gl4.preprocessor import ShaderPreprocessor
+
+
+@pytest.fixture
+def shaders(tmp_path):
+    (tmp_path / "common.glsl").write_text("float square(float x) {\n    return x * x;\n}")
+    (tmp_path / "main.comp").write_text(
+        '#version 460 core\nlayout(local_size_x = 8) in;\n#include "common.glsl"\nvoid main() {\n}')
+    return tmp_path
+
+
+def test_include_is_expanded(shaders):
+    preprocessor = ShaderPreprocessor(str(shaders))
+    source = preprocessor.load(str(shaders / "main.comp"))
+    assert "#include" not in source
+    assert "float square(float x) {" in source
+    assert preprocessor.dependencies(str(shaders / "main.comp")) == {
+        str(shaders / "main.comp"), str(shaders / "common.glsl")}
+
+
+def test_line_directives_point_at_the_original_files(shaders):
+    preprocessor = ShaderPreprocessor(str(shaders))
+    lines = preprocessor.load(str(shaders / "main.comp")).split("\n")
+    main = preprocessor.files.index(str(shaders / "main.comp"))
+    common = preprocessor.files.index(str(shaders / "common.glsl"))
+    # the line after a "#line n file" directive is line n of that file
+    assert lines[lines.index("#line 2 %d" % main) + 1] == "layout(local_size_x = 8) in;"
+    assert lines[lines.index("#line 1 %d" % common) + 1] == "float square(float x) {"
+    assert lines[lines.index("#line 4 %d" % main) + 1] == "void main() {"
+
+
+def test_translate_log_names_the_files(shaders):
+    preprocessor = ShaderPreprocessor(str(shaders))
+    preprocessor.load(str(shaders / "main.comp"))
+    common = preprocessor.files.index(str(shaders / "common.glsl"))
+    assert preprocessor.translateLog("%d:2(5): error: syntax error" % common) == "common.glsl:2(5): error: syntax error"
+
+
+def test_defines_follow_the_version(shaders):
+    preprocessor = ShaderPreprocessor(str(shaders))
+    lines = preprocessor.load(str(shaders / "main.comp"), {"INSTANCED": None, "TILE": 16}).split("\n")
+    assert lines[:4] == ["#version 460 core", "#define INSTANCED", "#define TILE 16",
+                         "#line 2 %d" % preprocessor.files.index(str(shaders / "main.comp"))]
+
+
+def test_version_is_added_when_missing():
+    preprocessor = ShaderPreprocessor()
+    lines = preprocessor.process("void main() {}", {"DEBUG": True}).split("\n")
+    assert lines == ["#version 460 core", "#define DEBUG", "#line 1 0", "void main() {}"]
+
+
+def test_permutations_share_the_reads(shaders):
+    preprocessor = ShaderPreprocessor(str(shaders))
+    preprocessor.load(str(shaders / "main.comp"))
+    preprocessor.load(str(shaders / "main.comp"), {"INSTANCED": None})
+    assert preprocessor.reads == 2
+
+
+def test_include_cycle_is_reported(tmp_path):
+    (tmp_path / "a.glsl").write_text('#include "b.glsl"')
+    (tmp_path / "b.glsl").write_text('#include "a.glsl"')
+    preprocessor = ShaderPreprocessor(str(tmp_path))
+    with pytest.raises(RuntimeError, match="#include cycle"):
+        preprocessor.load(str(tmp_path / "a.glsl"))
+
+
+def test_missing_include_is_reported(tmp_path):
+    (tmp_path / "main.frag").write_text('#include "missing.glsl"')
+    preprocessor = ShaderPreprocessor(str(tmp_path))
+    with pytest.raises(FileNotFoundError, match=r"main.frag\(1\)"):
+        preprocessor.load(str(tmp_path / "main.frag"))
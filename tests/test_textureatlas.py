@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("OpenGL")
+Image = pytest.importorskip("PIL.Image")
+import numpy as np
+
+from py3gl4 import textureatlas
+from py3gl4.textureatlas import TextureAtlas, packRectangles
+
+
+def overlaps(a: tuple, b: tuple) -> bool:
+    # (layer, x, y, width, height)
+    return a[0] == b[0] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3] and a[2] < b[2] + b[4] and b[2] < a[2] + a[4]
+
+
+def test_rectangles_do_not_overlap():
+    rng = np.random.default_rng(7)
+    sizes = [tuple(int(v) for v in size) for size in rng.integers(1, 40, size=(60, 2))]
+    placements, layers = packRectangles(sizes, 128, 128)
+    boxes = [(layer, x, y, w, h) for (layer, x, y), (w, h) in zip(placements, sizes)]
+    for layer, x, y, w, h in boxes:
+        assert 0 <= layer < layers and x + w <= 128 and y + h <= 128
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1:]:
+            assert not overlaps(a, b)
+
+
+def test_overflow_goes_to_the_next_layer():
+    placements, layers = packRectangles([(64, 64)] * 5, 128, 128)
+    assert layers == 2
+    assert [layer for layer, _, _ in placements] == [0, 0, 0, 0, 1]
+    assert placements[4] == (1, 0, 0)
+
+
+def test_too_large_rectangle_is_rejected():
+    with pytest.raises(ValueError):
+        packRectangles([(129, 8)], 128, 128)
+
+
+def test_no_rectangles_use_no_layers():
+    assert packRectangles([], 128, 128) == ([], 0)
+
+
+class UploadedArray:
+    # records the layers build() uploads instead of creating a GL texture
+    def __init__(self, levels, internalFormat, width, height, layers, pixelFormat, pixelType) -> None:
+        self.layer_pixels = [None] * layers
+
+    def uploadLayer(self, layer, pixels, level=0, width=None, height=None) -> None:
+        self.layer_pixels[layer] = pixels
+
+    def SetFiltering(self, *args) -> None:
+        pass
+
+    def setWrapMode(self, *args) -> None:
+        pass
+
+    def generateMipmap(self, layer_pixels=None) -> None:
+        pass
+
+
+def test_remap_table_and_padding(tmp_path, monkeypatch):
+    monkeypatch.setattr(textureatlas, "Texture2DArray", UploadedArray)
+    rng = np.random.default_rng(3)
+    atlas = TextureAtlas(64, 64, padding=2)
+    images = {}
+    for name, (width, height) in {"a": (20, 12), "b": (30, 30), "c": (9, 40), "d": (50, 20)}.items():
+        images[name] = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+        Image.fromarray(images[name], "RGBA").save(tmp_path / f"{name}.png")
+        atlas.add(name, str(tmp_path / f"{name}.png"))
+    texture = atlas.build()
+    assert atlas.layers == len(texture.layer_pixels) == 2
+
+    remap, layers = atlas.remapTable(), atlas.layerTable()
+    for name, pixels in images.items():
+        region = atlas[name]
+        height, width = pixels.shape[:2]
+        layer = texture.layer_pixels[layers[region.index]].reshape(64, 64, 4)
+        # uv (0, 0) and (1, 1) of the image land on its corners in the atlas
+        offset_u, offset_v, scale_u, scale_v = remap[region.index]
+        assert (offset_u * 64, offset_v * 64) == (region.x, region.y)
+        assert ((offset_u + scale_u) * 64, (offset_v + scale_v) * 64) == (region.x + width, region.y + height)
+        # the rows are uploaded bottom to top
+        inside = layer[region.y:region.y + height, region.x:region.x + width]
+        np.testing.assert_array_equal(inside, pixels[::-1])
+        # the padding repeats the edge texels
+        padded = layer[region.y - 2:region.y + height + 2, region.x - 2:region.x + width + 2]
+        np.testing.assert_array_equal(padded, np.pad(pixels[::-1], ((2, 2), (2, 2), (0, 0)), mode="edge"))
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from py3gl4.transform import identity, translation, scaling, rotation, compose, transformPoints, \
+    normalMatrices, columnMajor, perspective, lookAt, tileMatrix, frustumPlanes, Camera
+
+
+def rows(matrix) -> np.ndarray:
+    # glm matrices are indexed [column][row]
+    return np.array([[matrix[column][row] for column in range(4)] for row in range(4)], dtype=np.float32)
+
+
+def test_perspective_reference_values():
+    # fovy 90 degrees, so f = 1
+    expected = np.array([[0.5, 0.0, 0.0, 0.0],
+                         [0.0, 1.0, 0.0, 0.0],
+                         [0.0, 0.0, -11.0 / 9.0, -20.0 / 9.0],
+                         [0.0, 0.0, -1.0, 0.0]], dtype=np.float32)
+    np.testing.assert_allclose(perspective(np.pi / 2.0, 2.0, 1.0, 10.0), expected, rtol=1e-6, atol=1e-7)
+
+
+def test_perspective_maps_near_and_far_to_the_clip_range():
+    projection = perspective(np.radians(60.0), 1.5, 0.5, 50.0)
+    for depth, ndc in ((-0.5, -1.0), (-50.0, 1.0)):
+        clip = projection @ np.array([0.0, 0.0, depth, 1.0], dtype=np.float32)
+        assert clip[2] / clip[3] == pytest.approx(ndc, abs=1e-5)
+
+
+def test_look_at_reference_values():
+    view = lookAt((0.0, 0.0, 5.0), (0.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    np.testing.assert_allclose(view, translation([(0.0, 0.0, -5.0)])[0], atol=1e-7)
+    # looking down the x axis turns +x into -z
+    view = lookAt((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    np.testing.assert_allclose(view[:3, :3] @ np.array([1.0, 0.0, 0.0]), (0.0, 0.0, -1.0), atol=1e-7)
+
+
+def test_rotation_is_counterclockwise():
+    matrix = rotation([np.pi / 2.0], (0.0, 0.0, 1.0))[0]
+    np.testing.assert_allclose(matrix[:3, :3] @ np.array([1.0, 0.0, 0.0]), (0.0, 1.0, 0.0), atol=1e-7)
+
+
+def test_batched_transforms_match_glm():
+    glm = pytest.importorskip("glm")
+    rng = np.random.default_rng(5)
+    count = 16
+    offsets = rng.uniform(-10.0, 10.0, (count, 3)).astype(np.float32)
+    angles = rng.uniform(-np.pi, np.pi, count).astype(np.float32)
+    axes = rng.normal(size=(count, 3)).astype(np.float32)
+    factors = rng.uniform(0.5, 2.0, (count, 3)).astype(np.float32)
+    models = compose(translation(offsets), rotation(angles, axes), scaling(factors))
+    for i in range(count):
+        model = glm.translate(glm.mat4(1.0), glm.vec3(*offsets[i].tolist()))
+        model = glm.rotate(model, float(angles[i]), glm.normalize(glm.vec3(*axes[i].tolist())))
+        model = glm.scale(model, glm.vec3(*factors[i].tolist()))
+        np.testing.assert_allclose(models[i], rows(model), rtol=1e-5, atol=1e-5)
+
+
+def test_camera_matrices_match_glm():
+    glm = pytest.importorskip("glm")
+    np.testing.assert_allclose(perspective(np.radians(45.0), 16.0 / 9.0, 0.1, 100.0),
+                               rows(glm.perspective(np.radians(45.0), 16.0 / 9.0, 0.1, 100.0)), rtol=1e-5)
+    eye, center, up = (3.0, 2.0, 5.0), (0.5, -1.0, 0.0), (0.0, 1.0, 0.0)
+    np.testing.assert_allclose(lookAt(eye, center, up), rows(glm.lookAt(glm.vec3(eye), glm.vec3(center),
+                                                                         glm.vec3(up))), atol=1e-6)
+
+
+def test_points_and_normals():
+    models = compose(translation([(1.0, 2.0, 3.0)]), scaling([(2.0, 1.0, 1.0)]))
+    np.testing.assert_allclose(transformPoints(models, [(1.0, 1.0, 1.0)]), [(3.0, 3.0, 4.0)])
+    # a normal of the plane x = y stays perpendicular to it after the scaling
+    normal = normalMatrices(models)[0] @ np.array([1.0, -1.0, 0.0])
+    np.testing.assert_allclose(normal @ np.array([2.0, 1.0, 0.0]), 0.0, atol=1e-6)
+
+
+def test_column_major_order():
+    matrix = translation([(1.0, 2.0, 3.0)])
+    np.testing.assert_array_equal(columnMajor(matrix)[0, 3, :3], (1.0, 2.0, 3.0))
+    np.testing.assert_array_equal(columnMajor(identity(2)), identity(2))
+
+
+def test_tile_matrix_renders_a_part_of_the_frame():
+    projection = perspective(np.radians(50.0), 800.0 / 600.0, 0.1, 100.0)
+    point = np.array([0.7, -0.4, -3.0, 1.0], dtype=np.float32)
+    clip = projection @ point
+    # pixel of the point in the whole frame and in the 200x150 tile at (400, 150)
+    frame = (clip[:2] / clip[3] * 0.5 + 0.5) * (800.0, 600.0)
+    clip = tileMatrix(400, 150, 200, 150, 800, 600) @ projection @ point
+    tile = (clip[:2] / clip[3] * 0.5 + 0.5) * (200.0, 150.0)
+    np.testing.assert_allclose(tile, frame - (400.0, 150.0), atol=1e-3)
+
+
+def test_frustum_planes_and_camera():
+    camera = Camera(np.radians(60.0), 1.0, 0.1, 10.0)
+    revision = camera.revision
+    camera.lookAt((0.0, 0.0, 5.0), (0.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    assert camera.revision == revision + 1
+    planes = camera.frustumPlanes
+    np.testing.assert_allclose(planes, frustumPlanes(camera.projection @ camera.view))
+    inside = np.array([0.0, 0.0, 0.0, 1.0])
+    behind = np.array([0.0, 0.0, 6.0, 1.0])
+    assert (planes @ inside >= 0.0).all()
+    assert (planes @ behind < 0.0).any()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+GL = pytest.importorskip("OpenGL.GL")
+
+from py3gl4.uniformbuffer import std140Layout
+from py3gl4.storagebuffer import std430Layout
+
+
+def offsets(layout: np.dtype) -> dict[str, int]:
+    return {name: layout.fields[name][1] for name in layout.names}
+
+
+def test_std140_vec3_is_followed_by_a_float():
+    layout = std140Layout([("lightDir", GL.GL_FLOAT_VEC3, 1), ("intensity", GL.GL_FLOAT, 1),
+                           ("diffuse", GL.GL_FLOAT_VEC3, 1), ("ambient", GL.GL_FLOAT_VEC4, 1)])
+    assert offsets(layout) == {"lightDir": 0, "intensity": 12, "diffuse": 16, "ambient": 32}
+    assert layout.itemsize == 48
+
+
+def test_std140_arrays_and_matrices():
+    layout = std140Layout([("a", GL.GL_FLOAT, 1), ("weights", GL.GL_FLOAT, 3), ("model", GL.GL_FLOAT_MAT4, 1),
+                           ("normal", GL.GL_FLOAT_MAT3, 1), ("uv", GL.GL_FLOAT_VEC2, 1)])
+    # scalar arrays and matrix columns are rounded up to 16 bytes
+    assert offsets(layout) == {"a": 0, "weights": 16, "model": 64, "normal": 128, "uv": 176}
+    assert layout.itemsize == 192
+    assert layout["weights"].shape == (3, 4)
+    assert layout["model"].shape == (4, 4)
+    assert layout["normal"].shape == (3, 4)
+    assert layout.metadata["matrices"] == ("model", "normal")
+
+
+def test_std140_values_land_on_their_offsets():
+    layout = std140Layout([("a", GL.GL_FLOAT, 1), ("weights", GL.GL_FLOAT, 3), ("model", GL.GL_FLOAT_MAT4, 1)])
+    block = np.zeros(1, dtype=layout)
+    block["weights"][0, :, 0] = (1.0, 2.0, 3.0)
+    block["model"][0] = np.arange(16, dtype=np.float32).reshape(4, 4)
+    data = block.view(np.float32)
+    np.testing.assert_array_equal(data[4:16:4], (1.0, 2.0, 3.0))
+    np.testing.assert_array_equal(data[16:32], np.arange(16, dtype=np.float32))
+
+
+def test_std430_struct_of_vec3_and_float():
+    layout = std430Layout([("position", GL.GL_FLOAT_VEC3, 1), ("life", GL.GL_FLOAT, 1)])
+    assert offsets(layout) == {"position": 0, "life": 12}
+    assert layout.itemsize == 16
+
+
+def test_std430_arrays_are_not_rounded_up():
+    layout = std430Layout([("a", GL.GL_FLOAT, 1), ("weights", GL.GL_FLOAT, 3), ("uv", GL.GL_FLOAT_VEC2, 2),
+                           ("model", GL.GL_FLOAT_MAT4, 1), ("normal", GL.GL_FLOAT_MAT3, 1)])
+    assert offsets(layout) == {"a": 0, "weights": 4, "uv": 16, "model": 32, "normal": 96}
+    assert layout["weights"].shape == (3, 1)
+    assert layout["uv"].shape == (2, 2)
+    # vec3 columns keep their padding
+    assert layout["normal"].shape == (3, 4)
+    assert layout.itemsize == 144
+
+
+def test_std430_element_is_aligned_to_its_largest_member():
+    layout = std430Layout([("a", GL.GL_FLOAT, 1), ("b", GL.GL_FLOAT_VEC2, 1)])
+    assert offsets(layout) == {"a": 0, "b": 8}
+    assert layout.itemsize == 16
+    assert std430Layout([("a", GL.GL_FLOAT, 1), ("b", GL.GL_UNSIGNED_INT, 1)]).itemsize == 8